@@ -0,0 +1,138 @@
+"""
+爬蟲冷啟動時間量測
+在資料已是最新的工作目錄中執行各爬蟲入口，以 -X importtime 統計匯入耗時，
+並檢查快速路徑沒有載入 pandas、requests、lxml 等重量級模組
+
+用法:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --budget-ms 100 --record benchmarks/results/import_time.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from taifex_manifest import taipei_now, taipei_today, write_manifest
+
+# 要量測的入口腳本
+ENTRY_POINTS = ['taifex_pc_ratio_crawler.py', 'taifex_institutional_crawler.py', 'taifex_crawl_all.py']
+
+# 快速路徑不應載入的模組
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'lxml', 'pyarrow', 'asyncio']
+
+# -X importtime 輸出格式: import time: self [us] | cumulative | imported package
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def prepare_fresh_dir(path):
+    """在 path 建立所有資料集都是今日資料的清單，讓入口腳本走快速路徑"""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        for dataset in ('pc_ratio', 'institutional'):
+            write_manifest(dataset, [{'Date': taipei_today().isoformat()}])
+    finally:
+        os.chdir(cwd)
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 輸出
+
+    Returns:
+        tuple: (頂層模組累計匯入微秒數總和, 載入過的模組名稱集合)
+    """
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        modules.add(name.split('.')[0])
+        # 縮排只有一個空白者為頂層匯入，子模組已包含在累計時間中
+        if len(indent) == 1:
+            total += cumulative
+    return total, modules
+
+
+def run_once(args, cwd):
+    """執行一次並回傳 (牆鐘秒數, 匯入微秒數, 載入模組集合)"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+    import_us, modules = parse_importtime(completed.stderr)
+    return wall, import_us, modules
+
+
+def measure(args, cwd, repeat):
+    walls = []
+    imports = []
+    modules = set()
+    for _ in range(repeat):
+        wall, import_us, loaded = run_once(args, cwd)
+        walls.append(wall)
+        imports.append(import_us)
+        modules |= loaded
+    return statistics.median(walls), statistics.median(imports), modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='爬蟲冷啟動時間量測')
+    parser.add_argument('--repeat', type=int, default=5, help='每個入口重複執行次數')
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help='快速路徑相對於空白直譯器啟動可增加的毫秒數上限')
+    parser.add_argument('--record', help='將結果附加到 JSON Lines 檔案，追蹤歷次變化')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_fresh_dir(workdir)
+        bare_wall, _, _ = measure(['-c', 'pass'], workdir, args.repeat)
+
+        results = []
+        print(f"{'入口':<36}{'中位數(ms)':>12}{'扣除啟動(ms)':>14}{'匯入(ms)':>10}  重量級模組")
+        for script in ENTRY_POINTS:
+            wall, import_us, modules = measure([os.path.join(ROOT, script)], workdir, args.repeat)
+            heavy = sorted(set(HEAVY_MODULES) & modules)
+            overhead_ms = (wall - bare_wall) * 1000
+            results.append({
+                'entry': script,
+                'wallMs': round(wall * 1000, 2),
+                'overheadMs': round(overhead_ms, 2),
+                'importMs': round(import_us / 1000, 2),
+                'heavyModules': heavy
+            })
+            print(f"{script:<36}{wall * 1000:>12.1f}{overhead_ms:>14.1f}{import_us / 1000:>10.1f}  {', '.join(heavy) or '-'}")
+
+    print(f'空白直譯器啟動: {bare_wall * 1000:.1f} ms')
+
+    if args.record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'recordedAt': taipei_now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'bareMs': round(bare_wall * 1000, 2),
+                'results': results
+            }, ensure_ascii=False) + '\n')
+
+    over_budget = [item for item in results if item['overheadMs'] > args.budget_ms or item['heavyModules']]
+    for item in over_budget:
+        print(f"超出預算: {item['entry']} 增加 {item['overheadMs']:.1f} ms，重量級模組: {item['heavyModules']}")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
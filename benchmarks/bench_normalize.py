@@ -0,0 +1,83 @@
+"""
+欄位標準化效能比較
+比較原本逐筆資料的 Python 迴圈與 taifex_normalize 整欄向量化運算在多年回補資料量下的耗時
+
+用法:
+    python benchmarks/bench_normalize.py --rows 200000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from taifex_institutional_crawler import INT_COLUMNS
+from taifex_normalize import normalize_frame, to_records
+
+
+def synthetic_frame(rows):
+    """產生民國年日期與千分位字串數字的三大法人資料表 (約等於 rows / 60 個交易日)"""
+    data = {'Date': [f'{100 + i // 15000}/{(i // 1250) % 12 + 1:02d}/{(i // 60) % 28 + 1:02d}' for i in range(rows)]}
+    for offset, column in enumerate(INT_COLUMNS):
+        data[column] = [f'{(i * 7919 + offset) % 10_000_000:,}' for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+def row_loop(df):
+    """原本的做法：轉為字典列表後逐筆處理日期與千分位逗號 (數字仍為字串)"""
+    data = df.to_dict('records')
+    for item in data:
+        if 'Date' in item and isinstance(item['Date'], str) and '/' in item['Date']:
+            date_parts = item['Date'].split('/')
+            if len(date_parts) == 3:
+                try:
+                    roc_year = int(date_parts[0])
+                    if roc_year < 1911:
+                        item['Date'] = f"{roc_year + 1911}/{date_parts[1]}/{date_parts[2]}"
+                except ValueError:
+                    pass
+        for key in INT_COLUMNS:
+            if key in item and isinstance(item[key], str):
+                item[key] = item[key].replace(',', '')
+    return data
+
+
+def vectorized(df):
+    """整欄向量化轉換並輸出真正的數字"""
+    return to_records(normalize_frame(df, int_columns=INT_COLUMNS))
+
+
+def measure(func, df, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(df)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='欄位標準化效能比較')
+    parser.add_argument('--rows', type=int, default=200000, help='資料筆數')
+    parser.add_argument('--repeat', type=int, default=3, help='重複執行次數')
+    args = parser.parse_args(argv)
+
+    df = synthetic_frame(args.rows)
+    baseline = measure(row_loop, df, args.repeat)
+    print(f'{"方式":<14}{"筆數":>10}{"中位數(ms)":>12}{"筆/秒":>14}')
+    print(f'{"row_loop":<14}{args.rows:>10}{baseline * 1000:>12.1f}{args.rows / baseline:>14,.0f}')
+
+    # 標準化本身 (不含轉為字典列表) 與含輸出的完整路徑分開計時
+    normalize_only = measure(lambda frame: normalize_frame(frame, int_columns=INT_COLUMNS), df, args.repeat)
+    full = measure(vectorized, df, args.repeat)
+    print(f'{"normalize":<14}{args.rows:>10}{normalize_only * 1000:>12.1f}{args.rows / normalize_only:>14,.0f}')
+    print(f'{"normalize+out":<14}{args.rows:>10}{full * 1000:>12.1f}{args.rows / full:>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
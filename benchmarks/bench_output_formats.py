@@ -0,0 +1,96 @@
+"""
+輸出格式比較
+對每種輸出格式 (taifex_output_formats) 量測檔案大小與序列化時間，作為各使用端選擇格式的依據
+
+資料來源預設為 taifex_synthetic 產生、再經爬蟲 CSV 解析器轉換的三大法人資料；
+也可用 --input 指定既有的 *_latest.json
+
+用法:
+    python benchmarks/bench_output_formats.py --days 250 --contracts 12
+    python benchmarks/bench_output_formats.py --input data/institutional_latest.json
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taifex_output_formats import COMPRESSIONS, LAYOUTS, format_name, serialize
+
+# 比較的格式：所有版型，以及各版型的壓縮版本
+FORMATS = [(layout, None) for layout in LAYOUTS] + [
+    (layout, compression) for layout in ('compact', 'columnar') for compression in COMPRESSIONS
+]
+
+
+def synthetic_records(days, contracts):
+    """以合成 CSV 經實際解析器轉換，取得與爬蟲輸出相同型別的資料"""
+    from taifex_institutional_crawler import parse_institutional_csv
+    from taifex_synthetic import render, weekdays
+
+    end = date(2024, 12, 31)
+    trading_days = weekdays(end - timedelta(days=days * 7 // 5 + 7), end)[-days:]
+    data, _ = parse_institutional_csv(render('institutional_csv', trading_days, contracts))
+    return data
+
+
+def measure(records, fmt, repeat):
+    """回傳 (位元組數, 最佳序列化秒數)；缺少選用套件時回傳 None"""
+    best = None
+    payload = b''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            payload = serialize(records, fmt)
+        except ImportError as e:
+            print(f'{format_name(fmt)}: {str(e)}')
+            return None
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(payload), best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='輸出格式大小與序列化時間比較')
+    parser.add_argument('--input', help='既有的 JSON 輸出檔案 (字典列表)')
+    parser.add_argument('--days', type=int, default=250, help='合成資料的交易日數')
+    parser.add_argument('--contracts', type=int, default=12, help='合成資料的契約數')
+    parser.add_argument('--repeat', type=int, default=5, help='每種格式重複序列化次數')
+    args = parser.parse_args(argv)
+
+    # 爬蟲的解析日誌會干擾計時
+    logging.disable(logging.WARNING)
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        source = args.input
+    else:
+        records = synthetic_records(args.days, args.contracts)
+        source = f'合成 {args.days} 日 x {args.contracts} 契約'
+
+    serializer = 'orjson' if importlib.util.find_spec('orjson') else 'json'
+    print(f'資料: {source}，{len(records)} 筆，compact/columnar 序列化: {serializer}')
+
+    results = [(fmt, measure(records, fmt, args.repeat)) for fmt in FORMATS]
+    baseline = next(result for fmt, result in results if fmt == ('pretty', None))
+    print(f"{'格式':<18}{'大小(KiB)':>12}{'相對 pretty':>12}{'序列化(ms)':>12}{'MB/s':>10}")
+    for fmt, result in results:
+        if result is None:
+            continue
+        size, seconds = result
+        raw_mb = baseline[0] / 1024 / 1024
+        print(
+            f'{format_name(fmt):<18}{size / 1024:>12.1f}{size / baseline[0]:>12.1%}'
+            f'{seconds * 1000:>12.2f}{raw_mb / seconds:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+爬蟲處理流程效能基準
+以本機替身伺服器 (taifex_fake_server) 提供回應，量測兩支爬蟲 fetch → decode → parse → normalize → serialize
+各階段的耗時、每秒筆數與 RSS 峰值，並與 benchmarks/baselines/pipeline.json 比較
+
+資料來源:
+    fixture            benchmarks/fixtures/ 中從期交所錄製的 pcRatioExcel.html、futContractsDateExcel.html、
+                       futContractsDateDown.csv (2024 年 1 月的查詢結果，目前未附)
+    synthetic_fixture  benchmarks/fixtures/synthetic_*：taifex_synthetic 產生的 2024 年 1 月合成資料，
+                       沿用合成頁面的版型 (含 選單 外框表格) 並排除元旦，不是期交所的實際回應；
+                       以 --write-fixtures 重新產生
+    synthetic_<N>y     替身伺服器即時產生的多年份資料表 (--years)
+
+錄製檔案存在時以 fixture 量測，否則以合成檔案量測；兩者的基準分開記錄
+
+階段計時沿用爬蟲本身的執行報告 (taifex_run_report)，因此量測的是實際的解析與標準化程式碼；
+耗時或 RSS 峰值超過基準值的 --threshold 比例時回傳非零結束碼
+
+用法:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --years 5 --repeat 5 --threshold 0.25
+    python benchmarks/bench_pipeline.py --update-baseline
+    python benchmarks/bench_pipeline.py --write-fixtures
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import taifex_run_report
+import taifex_institutional_crawler as institutional
+import taifex_pc_ratio_crawler as pc_ratio
+from taifex_fake_server import ENDPOINTS, FakeTaifexServer
+from taifex_http import get_client
+from taifex_manifest import taipei_now
+from taifex_run_report import STAGES, RunReport
+
+FIXTURE_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baselines', 'pipeline.json')
+
+# 固定檔案涵蓋的查詢區間，替身伺服器以此區間重播
+FIXTURE_START = date(2024, 1, 1)
+FIXTURE_END = date(2024, 1, 31)
+
+# 合成固定檔案排除的休市日 (2024 年 1 月只有元旦)
+FIXTURE_HOLIDAYS = {date(2024, 1, 1)}
+
+# 合成固定檔案的檔名前綴，與錄製檔案區分
+SYNTHETIC_PREFIX = 'synthetic_'
+
+# 合成資料的「今日」，固定日期讓每次產生的資料表相同
+SYNTHETIC_TODAY = date(2024, 12, 31)
+
+# 各流程: (名稱, 資料集, 端點路徑)
+PIPELINES = [
+    ('pc_ratio_html', 'pc_ratio', '/cht/3/pcRatioExcel'),
+    ('institutional_html', 'institutional', '/cht/3/futContractsDateExcel'),
+    ('institutional_csv', 'institutional', '/cht/3/futContractsDateDown')
+]
+
+# 預設納入回歸檢查的階段；fetch 走本機迴路，波動大只列出不比較
+GATED_STAGES = ['decode', 'parse', 'normalize', 'serialize']
+
+
+def current_rss():
+    """目前的常駐記憶體 (bytes)；沒有 /proc 時退回 ru_maxrss"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class RssSampler:
+    """背景執行緒定期取樣 RSS，記錄自上次 reset 以來的峰值"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def reset(self):
+        self.peak = current_rss()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class TrackingReport(RunReport):
+    """在執行報告的每個階段額外記錄 RSS 峰值"""
+
+    def __init__(self, sampler):
+        super().__init__()
+        self.sampler = sampler
+        self.rss = {}
+
+    @contextmanager
+    def stage(self, dataset, name):
+        self.sampler.reset()
+        with super().stage(dataset, name):
+            yield
+        peak = max(self.sampler.peak, current_rss())
+        key = (dataset, name)
+        self.rss[key] = max(self.rss.get(key, 0), peak)
+
+
+def run_pipeline(base_url, dataset, path, start_date, end_date, sampler):
+    """
+    執行一次完整流程
+
+    Returns:
+        tuple: (解析筆數, {階段: 秒數}, {階段: RSS 峰值 bytes})
+    """
+    report = TrackingReport(sampler)
+    taifex_run_report._report = report
+    form = {'queryStartDate': start_date.strftime('%Y/%m/%d'), 'queryEndDate': end_date.strftime('%Y/%m/%d')}
+
+    with report.stage(dataset, 'fetch'):
+        content = get_client().post(base_url + path, data=form)
+
+    kind = ENDPOINTS[path][1]
+    if dataset == 'pc_ratio':
+        data = pc_ratio.parse_pc_ratio(content)
+    elif kind == 'html':
+        data = institutional.parse_institutional_html(content)
+    else:
+        data, _ = institutional.parse_institutional_csv(content)
+    if not data:
+        raise RuntimeError(f'{path} {start_date} ~ {end_date} 沒有解析出資料')
+
+    with report.stage(dataset, 'serialize'):
+        json.dumps(data, ensure_ascii=False, indent=2)
+
+    stages = report.to_dict()['datasets'][dataset]['stages']
+    seconds = {name: stage['seconds'] for name, stage in stages.items()}
+    rss = {name: peak for (_, name), peak in report.rss.items()}
+    return len(data), seconds, rss
+
+
+def measure_case(server, start_date, end_date, repeat, sampler):
+    """每個流程重複 repeat 次，耗時取最佳值 (較不受其他程序干擾)、RSS 取最大值"""
+    results = {}
+    for name, dataset, path in PIPELINES:
+        runs = [run_pipeline(server.base_url, dataset, path, start_date, end_date, sampler) for _ in range(repeat)]
+        rows = runs[0][0]
+        stages = {}
+        for stage in STAGES:
+            durations = [seconds[stage] for _, seconds, _ in runs if stage in seconds]
+            if not durations:
+                continue
+            best = min(durations)
+            stages[stage] = {
+                'seconds': round(best, 6),
+                'rowsPerSecond': round(rows / best) if best > 0 else None,
+                'peakRssMiB': round(max(rss[stage] for _, _, rss in runs) / 1024 / 1024, 1)
+            }
+        results[name] = {'rows': rows, 'stages': stages}
+    return results
+
+
+def fixture_name(path, prefix=''):
+    kind = ENDPOINTS[path][1]
+    return prefix + path.rsplit('/', 1)[-1] + ('.csv' if kind == 'csv' else '.html')
+
+
+def fixture_recordings(prefix=''):
+    """將固定檔案對應到替身伺服器的重播索引，prefix 為 SYNTHETIC_PREFIX 時使用合成檔案"""
+    recordings = {}
+    for path, (dataset, kind) in ENDPOINTS.items():
+        fixture = os.path.join(FIXTURE_DIR, fixture_name(path, prefix))
+        if os.path.exists(fixture):
+            recordings[(dataset, kind, FIXTURE_START.isoformat(), FIXTURE_END.isoformat())] = fixture
+    return recordings
+
+
+def write_fixtures():
+    """以 taifex_synthetic 重新產生合成固定檔案 (交易日排除 FIXTURE_HOLIDAYS)"""
+    from taifex_synthetic import KINDS, render, weekdays
+
+    days = [day for day in weekdays(FIXTURE_START, FIXTURE_END) if day not in FIXTURE_HOLIDAYS]
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for kind, (endpoint, extension) in KINDS.items():
+        path = os.path.join(FIXTURE_DIR, f'{SYNTHETIC_PREFIX}{endpoint}.{extension}')
+        with open(path, 'wb') as f:
+            f.write(render(kind, days))
+        print(f'已產生 {path} ({len(days)} 個交易日)')
+
+
+def compare(results, baseline, threshold, min_ms, stages):
+    """
+    與基準比較，回傳超出門檻的項目說明列表
+    耗時差距小於 min_ms 毫秒時視為量測雜訊
+    """
+    regressions = []
+    for case, pipelines in results.items():
+        for name, entry in pipelines.items():
+            expected = baseline.get(case, {}).get(name, {}).get('stages', {})
+            for stage in stages:
+                if stage not in entry['stages'] or stage not in expected:
+                    continue
+                current, previous = entry['stages'][stage], expected[stage]
+                limit = previous['seconds'] * (1 + threshold)
+                if current['seconds'] > limit and (current['seconds'] - previous['seconds']) * 1000 > min_ms:
+                    regressions.append(
+                        f"{case}/{name}/{stage} 耗時 {current['seconds'] * 1000:.1f} ms，"
+                        f"基準 {previous['seconds'] * 1000:.1f} ms (+{current['seconds'] / previous['seconds'] - 1:.0%})"
+                    )
+                if current['peakRssMiB'] > previous['peakRssMiB'] * (1 + threshold):
+                    regressions.append(
+                        f"{case}/{name}/{stage} RSS 峰值 {current['peakRssMiB']:.1f} MiB，"
+                        f"基準 {previous['peakRssMiB']:.1f} MiB"
+                    )
+    return regressions
+
+
+def print_results(results):
+    print(f"{'資料':<20}{'流程':<22}{'階段':<12}{'筆數':>8}{'耗時(ms)':>12}{'筆/秒':>14}{'RSS峰值(MiB)':>14}")
+    for case, pipelines in results.items():
+        for name, entry in pipelines.items():
+            for stage, metrics in entry['stages'].items():
+                rate = f"{metrics['rowsPerSecond']:,}" if metrics['rowsPerSecond'] else '-'
+                print(
+                    f"{case:<20}{name:<22}{stage:<12}{entry['rows']:>8}"
+                    f"{metrics['seconds'] * 1000:>12.2f}{rate:>14}{metrics['peakRssMiB']:>14.1f}"
+                )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='爬蟲處理流程效能基準')
+    parser.add_argument('--years', type=int, default=5, help='合成資料涵蓋的年數')
+    parser.add_argument('--repeat', type=int, default=5, help='每個流程重複執行次數')
+    parser.add_argument('--threshold', type=float, default=0.25, help='相對基準可容許的退步比例')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='小於此毫秒數的耗時差距不視為退步')
+    parser.add_argument('--stages', default=','.join(GATED_STAGES), help='納入回歸檢查的階段 (逗號分隔)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基準檔案路徑')
+    parser.add_argument('--update-baseline', action='store_true', help='以本次結果覆寫基準檔案')
+    parser.add_argument('--write-fixtures', action='store_true', help='重新產生合成固定檔案後結束')
+    args = parser.parse_args(argv)
+
+    if args.write_fixtures:
+        write_fixtures()
+        return 0
+
+    # 爬蟲的解析日誌會干擾計時
+    logging.disable(logging.WARNING)
+
+    cases = {}
+    fixture_case = 'fixture'
+    recordings = fixture_recordings()
+    if not recordings:
+        fixture_case = 'synthetic_fixture'
+        recordings = fixture_recordings(SYNTHETIC_PREFIX)
+    sampler = RssSampler().start()
+    try:
+        if recordings:
+            with FakeTaifexServer(recordings=recordings, today=FIXTURE_END) as server:
+                cases[fixture_case] = measure_case(server, FIXTURE_START, FIXTURE_END, args.repeat, sampler)
+        else:
+            print(f'找不到固定檔案 ({FIXTURE_DIR})，只量測合成資料')
+
+        start = date(SYNTHETIC_TODAY.year - args.years + 1, 1, 1)
+        with FakeTaifexServer(today=SYNTHETIC_TODAY) as server:
+            cases[f'synthetic_{args.years}y'] = measure_case(server, start, SYNTHETIC_TODAY, args.repeat, sampler)
+    finally:
+        sampler.stop()
+        get_client().close()
+
+    print_results(cases)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'recordedAt': taipei_now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'results': cases
+            }, f, ensure_ascii=False, indent=2)
+        print(f'基準已更新: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'找不到基準檔案 {args.baseline}，請先以 --update-baseline 建立')
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('platform') != platform.platform():
+        print(f"注意: 基準建立於 {baseline.get('platform')}，與目前環境不同，比較結果僅供參考")
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    regressions = compare(cases, baseline.get('results', {}), args.threshold, args.min_ms, stages)
+    for item in regressions:
+        print(f'效能退步: {item}')
+    if not regressions:
+        print(f'所有階段皆在基準的 {args.threshold:.0%} 以內')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+表格擷取效能比較
+比較 taifex_table_extractor.extract_table 與原本 pd.read_html 路徑的解析時間與記憶體峰值
+原本路徑與改寫前的爬蟲相同，取 read_html 的第一個表格；合成頁面只能比較相對差異，
+代表正式環境的數字需以 --page 指定從期交所錄製的頁面 (輸出的頁面欄會標示 synthetic 或檔名)
+
+用法:
+    python benchmarks/bench_table_extractor.py
+    python benchmarks/bench_table_extractor.py --page pc_ratio=recorded/pcRatioExcel.html --page institutional=recorded/futContractsDateExcel.html
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from taifex_table_extractor import INSTITUTIONAL_LAYOUT, PC_RATIO_LAYOUT, extract_table
+
+LAYOUTS = {
+    'pc_ratio': PC_RATIO_LAYOUT,
+    'institutional': INSTITUTIONAL_LAYOUT
+}
+
+
+def synthetic_page(layout, rows):
+    """
+    產生只含資料表的合成頁面，讓 read_html 的 tables[0] 與 XPath 擷取同一個表格，
+    兩種方式解析的是相同內容
+    """
+    header = ''.join(f'<th>{name}</th>' for name in layout['columns'])
+    body = []
+    for i in range(rows):
+        cells = []
+        for name in layout['columns']:
+            if name == '日期':
+                cells.append(f'2024/{i % 12 + 1:02d}/{i % 28 + 1:02d}')
+            elif name in layout['int_columns']:
+                cells.append(f'{(i * 7919) % 10_000_000:,}')
+            elif name in layout['float_columns']:
+                cells.append(f'{(i % 300) + 0.25:.2f}')
+            else:
+                cells.append('臺股期貨 TX' if name == '契約' else '外資及陸資')
+        body.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+    return (
+        '<html><head><meta charset="utf-8"></head><body>'
+        f'<table class="table_f"><tr>{header}</tr>{"".join(body)}</table>'
+        '</body></html>'
+    ).encode('utf-8')
+
+
+def read_html_path(content, layout):
+    """原本爬蟲的解析方式：pd.read_html 後取第一個表格 (tables[0])，與改寫前的正式程式相同"""
+    tables = pd.read_html(io.BytesIO(content), encoding='utf-8')
+    return tables[0]
+
+
+def measure(func, content, layout, repeat):
+    """回傳 (中位數秒數, 記憶體峰值 bytes, 資料筆數)"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = func(content, layout)
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func(content, layout)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(durations), peak, len(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='表格擷取效能比較')
+    parser.add_argument('--page', action='append', default=[], help='從期交所錄製的頁面，格式為 資料集=檔案路徑')
+    parser.add_argument('--rows', type=int, default=5000, help='未指定錄製頁面時，合成頁面的資料筆數')
+    parser.add_argument('--repeat', type=int, default=5, help='每種方式重複執行次數')
+    args = parser.parse_args(argv)
+
+    pages = []
+    for item in args.page:
+        dataset, path = item.split('=', 1)
+        with open(path, 'rb') as f:
+            pages.append((dataset, path, f.read()))
+    if not pages:
+        for dataset, layout in LAYOUTS.items():
+            pages.append((dataset, f'synthetic:{args.rows}', synthetic_page(layout, args.rows)))
+
+    print(f"{'資料集':<14}{'頁面':<28}{'方式':<14}{'筆數':>8}{'中位數(ms)':>12}{'記憶體峰值(KiB)':>16}")
+    for dataset, source, content in pages:
+        layout = LAYOUTS[dataset]
+        counts = []
+        for name, func in (('read_html', read_html_path), ('xpath', extract_table)):
+            seconds, peak, rows = measure(func, content, layout, args.repeat)
+            counts.append(rows)
+            print(f'{dataset:<14}{os.path.basename(source):<28}{name:<14}{rows:>8}{seconds * 1000:>12.2f}{peak / 1024:>16.0f}')
+        if counts[0] != counts[1]:
+            # 原本路徑取到的不是資料表，兩者的耗時不可直接比較
+            print(f'{dataset:<14}注意: read_html 的 tables[0] 有 {counts[0]} 筆，與資料表的 {counts[1]} 筆不同')
+
+
+if __name__ == '__main__':
+    main()
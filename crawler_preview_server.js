@@ -9,6 +9,7 @@ const path = require('path');
 const app = express();
 const port = process.env.PORT || 3001;
 const { spawn } = require('child_process');
+const readline = require('readline');
 
 // 設置靜態文件目錄
 app.use('/data', express.static(path.join(__dirname, 'data')));
@@ -20,17 +21,119 @@ const crawlerTypes = {
     script: 'taifex_pc_ratio_crawler.py',
     importScript: 'import_taifex_data.js',
     importType: 'pcRatio',
-    filePattern: /^pc_ratio.*\.json$/
+    // 只列出資料檔 (最新檔與舊版時間戳檔)，排除清單、CSV 與欄式等其他輸出
+    filePattern: /^pc_ratio_(latest|\d{14})\.json$/
   },
   'institutional': {
     name: '三大法人期貨淨部位',
     script: 'taifex_institutional_crawler.py',
     importScript: 'import_taifex_data.js',
     importType: 'institutional',
-    filePattern: /^institutional.*\.json$/
+    filePattern: /^institutional_(latest|\d{14})\.json$/
   }
 };
 
+// 常駐 Python 爬蟲服務 (taifex_crawler_daemon.py)
+// 只在第一次爬取時啟動，之後重用已載入的 pandas/lxml 與 HTTP 連線池；服務結束時下一次爬取會重新啟動
+// 服務無法使用 (啟動失敗、已結束、寫入 stdin 失敗) 時，等待中的請求以 daemonUnavailable 錯誤拒絕
+const crawlerDaemon = {
+  process: null,
+  nextId: 1,
+  pending: new Map(),
+
+  start() {
+    const child = spawn('python', ['taifex_crawler_daemon.py'], {
+      cwd: __dirname,
+      stdio: ['pipe', 'pipe', 'inherit']
+    });
+    this.process = child;
+
+    // 每行一個 JSON-RPC 回應，依 id 交給等待中的請求
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (error) {
+        console.error(`無法解析爬蟲服務回應: ${line}`);
+        return;
+      }
+      const callbacks = this.pending.get(message.id);
+      if (!callbacks) {
+        return;
+      }
+      this.pending.delete(message.id);
+      if (message.error) {
+        callbacks.reject(new Error(message.error.message));
+      } else {
+        callbacks.resolve(message.result);
+      }
+    });
+
+    const fail = (error) => {
+      error.daemonUnavailable = true;
+      if (this.process === child) {
+        this.process = null;
+      }
+      for (const callbacks of this.pending.values()) {
+        callbacks.reject(error);
+      }
+      this.pending.clear();
+    };
+    child.on('error', fail);
+    child.on('exit', (code) => fail(new Error(`爬蟲服務已結束 (代碼: ${code})`)));
+    // 服務結束後寫入 stdin 會產生 EPIPE，未處理的 'error' 事件會讓預覽伺服器當掉
+    child.stdin.on('error', (error) => {
+      fail(new Error(`無法傳送請求給爬蟲服務: ${error.message}`));
+      child.kill();
+    });
+    return child;
+  },
+
+  call(method, params = {}) {
+    let child = this.process;
+    if (!child || !child.stdin.writable) {
+      child = this.start();
+    }
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+    });
+  },
+
+  stop() {
+    if (this.process) {
+      this.process.stdin.end(JSON.stringify({ jsonrpc: '2.0', id: 0, method: 'shutdown' }) + '\n');
+    }
+  }
+};
+
+process.on('exit', () => crawlerDaemon.stop());
+
+// 直接啟動單一爬蟲腳本，爬蟲服務無法使用時的備援
+function runCrawlerScript(script) {
+  return new Promise((resolve, reject) => {
+    const startedAt = Date.now();
+    const crawler = spawn('python', [script], { cwd: __dirname });
+    let output = '';
+    crawler.stdout.on('data', (data) => {
+      output += data.toString();
+    });
+    crawler.stderr.on('data', (data) => {
+      output += `錯誤: ${data.toString()}`;
+    });
+    crawler.on('error', reject);
+    crawler.on('close', (code) => {
+      if (code === 0) {
+        resolve({ seconds: ((Date.now() - startedAt) / 1000).toFixed(1) });
+      } else {
+        console.error(output);
+        reject(new Error(`代碼: ${code}`));
+      }
+    });
+  });
+}
+
 // 中間件：檢查數據目錄
 app.use((req, res, next) => {
   const dataDir = path.join(__dirname, 'data');
@@ -338,30 +441,25 @@ app.get('/crawl/:type', (req, res) => {
       return res.redirect('/?status=error&message=' + encodeURIComponent(`未知的爬蟲類型: ${type}`));
     }
     
-    const { script } = crawlerTypes[type];
+    const { name, script } = crawlerTypes[type];
     
-    // 執行 Python 爬蟲腳本
-    const crawler = spawn('python', [script]);
-    
-    let output = '';
-    
-    crawler.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-    
-    crawler.stderr.on('data', (data) => {
-      output += `錯誤: ${data.toString()}`;
-    });
-    
-    crawler.on('close', (code) => {
-      if (code === 0) {
+    // 交由常駐 Python 爬蟲服務執行，不必每次重新啟動直譯器；服務無法使用時改為直接執行爬蟲腳本
+    crawlerDaemon.call('crawl', { type, force: req.query.force === '1' })
+      .catch((error) => {
+        if (!error.daemonUnavailable) {
+          throw error;
+        }
+        console.warn(`${error.message}，改為直接執行 ${script}`);
+        return runCrawlerScript(script);
+      })
+      .then((result) => {
         // 成功執行
-        res.redirect('/?status=success&message=' + encodeURIComponent(`${crawlerTypes[type].name}爬蟲執行成功`));
-      } else {
+        res.redirect('/?status=success&message=' + encodeURIComponent(`${name}爬蟲執行成功 (${result.seconds} 秒)`));
+      })
+      .catch((error) => {
         // 執行失敗
-        res.redirect('/?status=error&message=' + encodeURIComponent(`${crawlerTypes[type].name}爬蟲執行失敗 (代碼: ${code})`));
-      }
-    });
+        res.redirect('/?status=error&message=' + encodeURIComponent(`${name}爬蟲執行失敗：${error.message}`));
+      });
   } catch (error) {
     res.redirect('/?status=error&message=' + encodeURIComponent(`執行爬蟲時發生錯誤：${error.message}`));
   }
@@ -124,6 +124,26 @@ function standardizeDate(dateStr) {
   return dateStr;
 }
 
+/**
+ * 將爬蟲輸出的數值欄位轉為數字
+ * Python 爬蟲已輸出數字型別，舊版資料則可能是含千分位逗號的字串
+ * 
+ * @param {number|string} value 原始數值
+ * @param {boolean} isInteger 是否轉為整數
+ * @returns {number} 轉換後的數字，無法轉換時為 NaN
+ */
+function toNumber(value, isInteger = false) {
+  if (typeof value === 'number') {
+    return value;
+  }
+  const text = String(value).replace(/,/g, '');
+  return isInteger ? parseInt(text, 10) : parseFloat(text);
+}
+
+// 三大法人資料的契約名稱 (小型臺指在 HTML 與 CSV 中的名稱可能不同)
+const TX_CONTRACT = '臺股期貨';
+const MTX_CONTRACTS = ['小型臺指期貨', '小型臺指'];
+
 /**
  * 處理 PCR 比率資料
  * 將原始資料轉換為更易使用的格式
@@ -157,12 +177,12 @@ function processPutCallRatio(data) {
     const result = {
       date: standardizedDate,
       pcRatio: {
-        putVolume: parseInt(latestData.PutVolume.replace(/,/g, ''), 10) || 0,
-        callVolume: parseInt(latestData.CallVolume.replace(/,/g, ''), 10) || 0,
-        volumeRatio: parseFloat(latestData['PutCallVolumeRatio%'].replace(/,/g, '')) || 0,
-        putOI: parseInt(latestData.PutOI.replace(/,/g, ''), 10) || 0,
-        callOI: parseInt(latestData.CallOI.replace(/,/g, ''), 10) || 0,
-        oiRatio: parseFloat(latestData['PutCallOIRatio%'].replace(/,/g, '')) || 0
+        putVolume: toNumber(latestData.PutVolume, true) || 0,
+        callVolume: toNumber(latestData.CallVolume, true) || 0,
+        volumeRatio: toNumber(latestData['PutCallVolumeRatio%']) || 0,
+        putOI: toNumber(latestData.PutOI, true) || 0,
+        callOI: toNumber(latestData.CallOI, true) || 0,
+        oiRatio: toNumber(latestData['PutCallOIRatio%']) || 0
       }
     };
     
@@ -218,16 +238,32 @@ function processInstitutionalData(data) {
       }
     };
     
+    // 爬蟲輸出包含所有契約：買賣超取自臺股期貨，小型臺指只記錄外資未平倉與增減
+    let mtxForeign = null;
+    
     // 處理各類投資人資料
     for (const item of latestData) {
       if (!item.InvestorType) continue;
       
+      if (MTX_CONTRACTS.includes(item.ContractName)) {
+        if (item.InvestorType === '外資及陸資') {
+          mtxForeign = {
+            mtxOI: toNumber(item.NetOIVolume, true) || 0,
+            mtxChange: toNumber(item.NetTradeVolume, true) || 0
+          };
+        }
+        continue;
+      }
+      
+      // 其他契約不列入買賣超 (沒有商品名稱的舊資料視為臺股期貨)
+      if (item.ContractName && item.ContractName !== TX_CONTRACT) continue;
+      
       // 根據投資人類型分類處理
       switch (item.InvestorType) {
         case '外資及陸資':
           // 轉換為數值並處理千分位逗號
-          const netTradeValue = parseFloat(String(item.NetTradeValue).replace(/,/g, '')) || 0;
-          const netOIVolume = parseInt(String(item.NetOIVolume).replace(/,/g, '')) || 0;
+          const netTradeValue = toNumber(item.NetTradeValue) || 0;
+          const netOIVolume = toNumber(item.NetOIVolume, true) || 0;
           
           result.institutionalInvestors.foreign = {
             netBuySell: netTradeValue / 100000 || 0, // 轉換為億元
@@ -235,39 +271,43 @@ function processInstitutionalData(data) {
           };
           
           // 如果是台指期，記錄額外資訊
-          if (item.ContractName === '臺股期貨') {
+          if (item.ContractName === TX_CONTRACT) {
             result.institutionalInvestors.foreign.txfOI = netOIVolume;
             
             // 若有 NetTradeVolume，也記錄為 txfChange
-            const netTradeVolume = parseInt(String(item.NetTradeVolume).replace(/,/g, '')) || 0;
+            const netTradeVolume = toNumber(item.NetTradeVolume, true) || 0;
             result.institutionalInvestors.foreign.txfChange = netTradeVolume;
           }
           break;
           
         case '投信':
-          const investmentNetTradeValue = parseFloat(String(item.NetTradeValue).replace(/,/g, '')) || 0;
+          const investmentNetTradeValue = toNumber(item.NetTradeValue) || 0;
           result.institutionalInvestors.investment = {
             netBuySell: investmentNetTradeValue / 100000 || 0 // 轉換為億元
           };
           break;
           
         case '自營商':
-          const dealerNetTradeValue = parseFloat(String(item.NetTradeValue).replace(/,/g, '')) || 0;
+          const dealerNetTradeValue = toNumber(item.NetTradeValue) || 0;
           result.institutionalInvestors.dealer.netBuySellTotal = dealerNetTradeValue / 100000 || 0; // 轉換為億元
           break;
           
         case '自營商(自行買賣)':
-          const selfNetTradeValue = parseFloat(String(item.NetTradeValue).replace(/,/g, '')) || 0;
+          const selfNetTradeValue = toNumber(item.NetTradeValue) || 0;
           result.institutionalInvestors.dealer.netBuySellSelf = selfNetTradeValue / 100000 || 0; // 轉換為億元
           break;
           
         case '自營商(避險)':
-          const hedgeNetTradeValue = parseFloat(String(item.NetTradeValue).replace(/,/g, '')) || 0;
+          const hedgeNetTradeValue = toNumber(item.NetTradeValue) || 0;
           result.institutionalInvestors.dealer.netBuySellHedge = hedgeNetTradeValue / 100000 || 0; // 轉換為億元
           break;
       }
     }
     
+    if (mtxForeign) {
+      Object.assign(result.institutionalInvestors.foreign, mtxForeign);
+    }
+    
     // 計算三大法人合計買賣超
     result.institutionalInvestors.totalNetBuySell = 
       (result.institutionalInvestors.foreign.netBuySell || 0) +
@@ -543,6 +583,32 @@ async function importInstitutionalData(filePath) {
   }
 }
 
+// 資料類型對應的 Python 爬蟲清單名稱
+const MANIFEST_DATASETS = {
+  pcRatio: 'pc_ratio',
+  institutional: 'institutional'
+};
+
+/**
+ * 檢查爬蟲清單是否標記期交所回應與上次相同
+ * 清單不存在或無法讀取時視為已變更，照常導入
+ *
+ * @param {string} type 資料類型
+ * @returns {boolean} 內容未變更時回傳 true
+ */
+function isUnchanged(type) {
+  const dataset = MANIFEST_DATASETS[type];
+  if (!dataset) return false;
+
+  const manifestPath = path.join(__dirname, 'data', `${dataset}_manifest.json`);
+  try {
+    const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+    return manifest.changed === false;
+  } catch (error) {
+    return false;
+  }
+}
+
 /**
  * 檢查並導入資料
  * 根據指定的資料類型，從對應的 JSON 文件導入資料到 MongoDB
@@ -595,6 +661,15 @@ async function main() {
     logger.info(`執行時間: ${new Date().toISOString()}`);
     logger.info(`處理資料類型: ${dataType}`);
     
+    // 爬蟲回報內容未變更時不需連接資料庫 (指定文件時一律導入)
+    if (!specificFile && isUnchanged(dataType)) {
+      logger.info(`${dataType} 資料未變更，略過導入`);
+      console.log('=============================');
+      console.log(`⏭️ ${dataType} 資料未變更，略過導入 MongoDB`);
+      console.log('=============================');
+      process.exit(0);
+    }
+    
     // 連接資料庫
     await connectDB();
     
@@ -0,0 +1,142 @@
+"""
+原子寫入與建議鎖
+輸出檔案先寫入同一目錄的暫存檔並 fsync，再以 os.replace 原子替換並 fsync 目錄，
+crawler_preview_server.js、import_taifex_data.js 等讀取端只會看到完整的舊檔或新檔，不需重試
+
+設定環境變數 TAIFEX_FILE_LOCK=1 (或呼叫時傳入 lock=True) 時，寫入前另以 <檔名>.lock 取得 flock 建議鎖，
+讓同時執行的多個爬蟲程序依序寫入；不支援 flock 的平台 (Windows) 略過鎖定
+暫存檔名為 .<檔名>.<亂數>.tmp，不會被預覽伺服器的 *.json 檔案列表列出
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 是否預設使用建議鎖
+LOCK_ENABLED = os.environ.get('TAIFEX_FILE_LOCK', '') == '1'
+
+# 輸出檔案權限 (mkstemp 預設只有擁有者可讀寫)
+FILE_MODE = 0o644
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    取得 path 的建議鎖 (鎖定 <path>.lock)，離開時釋放
+    shared 為 True 時取得共享鎖，供只讀取的程序使用
+    """
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _fsync_dir(directory):
+    """確保目錄項目 (替換後的檔名) 寫入磁碟；不支援開啟目錄的平台略過"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _mkstemp(path):
+    """在 path 的目錄建立唯一的暫存檔 (.<檔名>.<亂數>.tmp)，回傳 (檔案描述子, 暫存檔路徑)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+
+
+def replace_file(temp_path, path):
+    """
+    將已寫完的暫存檔 fsync 後原子替換到 path，供 to_parquet 等自行寫檔的函數使用
+    """
+    with open(temp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    供 to_parquet 等自行寫檔的函數使用：提供同一目錄下唯一的暫存檔路徑，
+    區塊正常結束時 fsync 並原子替換到 path，發生例外時刪除暫存檔
+    多個程序同時寫入同一檔案時各自使用不同的暫存檔，不會互相覆蓋
+
+    用法:
+        with atomic_output(path) as temp_path:
+            df.to_parquet(temp_path)
+    """
+    fd, temp_path = _mkstemp(path)
+    os.close(fd)
+    try:
+        yield temp_path
+        os.chmod(temp_path, FILE_MODE)
+        replace_file(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data, lock=None):
+    """
+    原子寫入檔案
+
+    Args:
+        path: 目標檔案路徑
+        data: 字串 (以 UTF-8 編碼) 或位元組
+        lock: 是否取得建議鎖，None 時依 TAIFEX_FILE_LOCK 環境變數
+
+    Returns:
+        str: 目標檔案路徑
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    lock = LOCK_ENABLED if lock is None else lock
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with file_lock(path) if lock else nullcontext():
+        fd, temp_path = _mkstemp(path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, FILE_MODE)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        _fsync_dir(directory)
+    return path
+
+
+def atomic_write_json(path, obj, lock=None):
+    """以與既有輸出相同的格式 (UTF-8、縮排 2) 原子寫入 JSON"""
+    return atomic_write(path, json.dumps(obj, ensure_ascii=False, indent=2), lock=lock)
@@ -0,0 +1,353 @@
+"""
+期交所歷史資料回補
+將日期區間切成期交所單次查詢可接受的最大視窗，透過有上限的工作執行緒池平行下載，
+再合併並去除重複資料
+--repair 模式比對歷史資料集與交易日曆，只下載缺少或不完整的交易日，相鄰的缺漏合併為同一個查詢區間
+
+用法:
+    python taifex_backfill.py --from 2015-01-01 --to today
+    python taifex_backfill.py --dataset pc_ratio --from 2024-01-01 --to 2024-06-30 --workers 4
+    python taifex_backfill.py --repair                  # 只補齊歷史資料集缺少或不完整的交易日
+"""
+
+import argparse
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import requests
+
+import taifex_pc_ratio_crawler as pc_ratio
+import taifex_institutional_crawler as institutional
+from taifex_history_store import CONTRACT_ALIASES, HISTORY_DIR, append_history
+from taifex_http import get_client
+from taifex_manifest import taipei_today
+from taifex_run_report import get_report
+
+logger = logging.getLogger('taifex_backfill')
+
+
+def _fetch_pc_ratio_window(start_date, end_date):
+    """下載並解析一個 PC Ratio 查詢視窗"""
+    content, _ = pc_ratio.fetch_pc_ratio(start_date, end_date)
+    return pc_ratio.parse_pc_ratio(content) or []
+
+
+def _fetch_institutional_window(start_date, end_date):
+    """以串流方式下載並解析一個三大法人 CSV 查詢視窗"""
+    return institutional.stream_institutional_csv(start_date, end_date) or []
+
+
+# 各資料集的回補設定
+# window_months: 期交所單次查詢可接受的最大月數
+# key: 去除重複資料時使用的自然鍵
+DATASETS = {
+    'pc_ratio': {
+        'window_months': 1,
+        'fetch': _fetch_pc_ratio_window,
+        'key': ['Date']
+    },
+    'institutional': {
+        'window_months': 1,
+        'fetch': _fetch_institutional_window,
+        'key': ['Date', 'ContractName', 'InvestorType']
+    }
+}
+
+
+def _first_of_next_months(day, months):
+    """回傳 day 所在月份往後 months 個月的第一天"""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def split_windows(start_date, end_date, window_months=1):
+    """
+    將日期區間依月份邊界切成查詢視窗
+
+    Returns:
+        list: (視窗起始日, 視窗結束日) 的列表
+    """
+    windows = []
+    current = start_date
+    while current <= end_date:
+        next_start = _first_of_next_months(current, window_months)
+        windows.append((current, min(next_start - timedelta(days=1), end_date)))
+        current = next_start
+    return windows
+
+
+def _fetch_with_retry(fetch, start_date, end_date, retries=2, backoff=2.0, dataset=None):
+    """
+    下載單一視窗，網路錯誤時以指數退避重試，重試次數記錄在執行報告中
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fetch(start_date, end_date)
+        except requests.RequestException as e:
+            if attempt == retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            logger.warning(f'視窗 {start_date} ~ {end_date} 下載失敗 ({str(e)})，{wait:.0f} 秒後重試')
+            if dataset:
+                get_report().count(dataset, 'retries')
+            time.sleep(wait)
+
+
+def merge_records(records, key):
+    """
+    合併多個視窗的資料，依自然鍵去除重複並依日期排序
+    商品名稱先套用歷史資料集的別名對應，不同視窗的同一契約 (如 小型臺指 與 小型臺指期貨) 視為同一筆
+
+    Returns:
+        pandas.DataFrame: 合併後的資料
+    """
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+    if 'ContractName' in df.columns:
+        df['ContractName'] = df['ContractName'].replace(CONTRACT_ALIASES)
+    key_columns = [column for column in key if column in df.columns]
+    # keep='last' 讓較晚下載的視窗覆蓋較早的資料
+    df = df.drop_duplicates(subset=key_columns or None, keep='last')
+    if key_columns:
+        df = df.sort_values(key_columns, kind='stable')
+    return df.reset_index(drop=True)
+
+
+def fetch_windows(dataset, windows, max_workers=4):
+    """
+    平行下載多個查詢視窗並合併
+
+    Returns:
+        tuple: (合併後的 DataFrame, 失敗視窗列表)
+    """
+    config = DATASETS[dataset]
+    records = []
+    failed_windows = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backfill') as executor:
+        futures = {
+            executor.submit(_fetch_with_retry, config['fetch'], window_start, window_end, dataset=dataset): (window_start, window_end)
+            for window_start, window_end in windows
+        }
+        for future in as_completed(futures):
+            window_start, window_end = futures[future]
+            try:
+                window_records = future.result()
+                records.extend(window_records)
+                logger.info(f'{dataset} 視窗 {window_start} ~ {window_end} 完成，{len(window_records)} 筆')
+            except Exception as e:
+                logger.error(f'{dataset} 視窗 {window_start} ~ {window_end} 失敗: {str(e)}')
+                logger.debug(traceback.format_exc())
+                failed_windows.append((window_start, window_end))
+
+    return merge_records(records, config['key']), sorted(failed_windows)
+
+
+def backfill(dataset, start_date, end_date, max_workers=4):
+    """
+    回補單一資料集在指定日期區間內的歷史資料
+
+    Returns:
+        tuple: (合併後的 DataFrame, 失敗視窗列表)
+    """
+    config = DATASETS[dataset]
+    windows = split_windows(start_date, end_date, config['window_months'])
+    logger.info(f'{dataset} 回補 {start_date} ~ {end_date}，共 {len(windows)} 個查詢視窗，{max_workers} 個工作執行緒')
+
+    df, failed_windows = fetch_windows(dataset, windows, max_workers)
+    logger.info(f'{dataset} 回補完成，合併後共 {len(df)} 筆，失敗視窗 {len(failed_windows)} 個')
+    return df, failed_windows
+
+
+def _partial_days(dataset, df):
+    """
+    找出已有資料但不完整的日期
+    pc_ratio: 任一數值欄位為空
+    institutional: 某契約的身份別少於該契約在區間內的最大身份別數，
+    或缺少前後兩個有資料的日期都有的契約
+    """
+    if df.empty:
+        return set()
+    df = df.assign(Day=df['Date'].dt.date)
+    if dataset == 'pc_ratio':
+        return set(df.loc[df.drop(columns=['Date', 'Day']).isna().any(axis=1), 'Day'])
+
+    partial = set()
+    investor_counts = df.groupby(['Day', 'ContractName'])['InvestorType'].nunique()
+    expected = investor_counts.groupby(level='ContractName').max()
+    for (day, contract), count in investor_counts.items():
+        if count < expected[contract]:
+            partial.add(day)
+
+    contracts_by_day = {day: set(group) for day, group in df.groupby('Day')['ContractName']}
+    days = sorted(contracts_by_day)
+    for previous_day, day, next_day in zip(days, days[1:], days[2:]):
+        if (contracts_by_day[previous_day] & contracts_by_day[next_day]) - contracts_by_day[day]:
+            partial.add(day)
+    return partial
+
+
+def find_gaps(dataset, start_date, end_date, holidays):
+    """
+    比對歷史資料集與交易日曆，找出缺少或不完整的交易日
+
+    Returns:
+        tuple: (缺少的交易日列表, 不完整的交易日列表)
+    """
+    from taifex_calendar import trading_days
+    from taifex_history_store import read_history
+
+    columns = ['InvestorType', 'ContractName'] if dataset == 'institutional' else None
+    df = read_history(dataset, start_date, end_date, columns=columns)
+    stored = set(df['Date'].dt.date) if not df.empty else set()
+    expected = trading_days(start_date, end_date, holidays)
+    missing = [day for day in expected if day not in stored]
+    partial = sorted(day for day in _partial_days(dataset, df) if start_date <= day <= end_date)
+    return missing, partial
+
+
+def group_gaps(days, start_date, end_date, holidays, window_months=1):
+    """
+    將缺漏日期依交易日曆合併為連續區間，中間沒有已存在交易日的缺漏合併為一次查詢，
+    再依期交所單次查詢的月數上限切成視窗
+
+    Returns:
+        list: (視窗起始日, 視窗結束日) 的列表
+    """
+    from taifex_calendar import trading_days
+
+    position = {day: index for index, day in enumerate(trading_days(start_date, end_date, holidays))}
+    ranges = []
+    for day in sorted(days):
+        if ranges and position.get(day) == position.get(ranges[-1][1], -2) + 1:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+
+    windows = []
+    for range_start, range_end in ranges:
+        windows.extend(split_windows(range_start, range_end, window_months))
+    return windows
+
+
+def repair(dataset, start_date=None, end_date=None, holidays=None, max_workers=4):
+    """
+    只下載歷史資料集缺少或不完整的交易日，並附加到歷史資料集
+
+    Args:
+        start_date: 檢查起始日期，預設為歷史資料集最早的日期
+        end_date: 檢查結束日期，預設為今日 (台北時間)
+        holidays: 休市日，預設讀取交易日曆；交易日曆中已確認沒有資料的日期一律排除
+
+    修補後仍沒有資料、且所屬視窗下載成功的過去日期記錄到交易日曆 (noData)，之後不再重新下載
+
+    Returns:
+        tuple: (合併後的 DataFrame, 失敗視窗列表, 修補後仍缺少的交易日列表)
+    """
+    from taifex_calendar import load_holidays, load_no_data, record_no_data
+    from taifex_history_store import read_history
+
+    holidays = load_holidays() if holidays is None else holidays
+    no_data = load_no_data(dataset)
+    if no_data:
+        holidays = {**holidays, **{day: '確認無資料' for day in no_data}}
+    end_date = end_date or taipei_today()
+    if start_date is None:
+        dates = read_history(dataset, columns=['Date'])['Date']
+        if dates.empty:
+            logger.warning(f'{dataset} 歷史資料集沒有資料，請先以 --from 執行回補')
+            return pd.DataFrame(), [], []
+        start_date = dates.min().date()
+
+    missing, partial = find_gaps(dataset, start_date, end_date, holidays)
+    report = get_report()
+    report.count(dataset, 'gap_missing_days', len(missing))
+    report.count(dataset, 'gap_partial_days', len(partial))
+    if not missing and not partial:
+        logger.info(f'{dataset} {start_date} ~ {end_date} 沒有缺漏的交易日')
+        return pd.DataFrame(), [], []
+
+    windows = group_gaps(missing + partial, start_date, end_date, holidays, DATASETS[dataset]['window_months'])
+    logger.info(
+        f'{dataset} {start_date} ~ {end_date} 缺少 {len(missing)} 個交易日、不完整 {len(partial)} 個交易日，'
+        f'合併為 {len(windows)} 個查詢視窗'
+    )
+    df, failed_windows = fetch_windows(dataset, windows, max_workers)
+    if not df.empty:
+        save_backfill(dataset, df)
+
+    remaining, _ = find_gaps(dataset, start_date, end_date, holidays)
+    for day in remaining:
+        logger.warning(f'{dataset} {day} 修補後仍無資料 (可能為臨時休市或尚未公布)')
+    # 下載失敗的視窗不能確認沒有資料，留待下次修補
+    confirmed = [
+        day for day in remaining
+        if not any(window_start <= day <= window_end for window_start, window_end in failed_windows)
+    ]
+    record_no_data(dataset, confirmed)
+    return df, failed_windows, remaining
+
+
+def save_backfill(dataset, df):
+    """
+    將回補結果附加到歷史資料集，回傳資料集目錄
+    """
+    append_history(dataset, df.to_dict('records'))
+    output_dir = os.path.join(HISTORY_DIR, dataset)
+    logger.info(f'{dataset} 回補資料已保存至 {output_dir}')
+    return output_dir
+
+
+def parse_date(value):
+    """解析命令列日期參數，支援 YYYY-MM-DD 與 today"""
+    if value == 'today':
+        return taipei_today()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='期交所歷史資料回補')
+    parser.add_argument('--from', dest='start', type=parse_date, help='起始日期 (YYYY-MM-DD)，--repair 時預設為歷史資料最早的日期')
+    parser.add_argument('--to', dest='end', type=parse_date, default=taipei_today(), help='結束日期 (YYYY-MM-DD 或 today)')
+    parser.add_argument('--dataset', choices=['all'] + list(DATASETS), default='all', help='要回補的資料集')
+    parser.add_argument('--workers', type=int, default=4, help='同時下載的視窗數')
+    parser.add_argument('--repair', action='store_true', help='比對交易日曆，只下載缺少或不完整的交易日')
+    parser.add_argument('--mongo', action='store_true', help='同時以 bulk_write 寫入 MongoDB (MONGODB_URI)')
+    args = parser.parse_args(argv)
+
+    if args.start is None and not args.repair:
+        parser.error('未指定 --repair 時必須提供 --from')
+    if args.start is not None and args.start > args.end:
+        parser.error('--from 不可晚於 --to')
+
+    datasets = list(DATASETS) if args.dataset == 'all' else [args.dataset]
+    has_failure = False
+    for dataset in datasets:
+        if args.repair:
+            df, failed_windows, remaining = repair(dataset, args.start, args.end, max_workers=args.workers)
+            if not df.empty:
+                print(f'RESULT_FILE={os.path.join(HISTORY_DIR, dataset)}')
+        else:
+            df, failed_windows = backfill(dataset, args.start, args.end, args.workers)
+            if not df.empty:
+                output_file = save_backfill(dataset, df)
+                print(f'RESULT_FILE={output_file}')
+        if failed_windows:
+            has_failure = True
+            for window_start, window_end in failed_windows:
+                logger.error(f'{dataset} 未完成的視窗: {window_start} ~ {window_end}')
+        if not df.empty and args.mongo:
+            from taifex_mongo_sink import sink
+            sink(dataset, df.to_dict('records'))
+
+    get_client().log_stats()
+    get_report().write()
+    return 1 if has_failure else 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,182 @@
+"""
+台灣市場交易日曆
+從證交所 OpenAPI 的休市日期表 (與 src/db/models/Holiday.js 使用相同來源) 建立交易日曆，
+並快取在 data/trading_calendar.json，同一週內不重複下載
+快取同時記錄回補修補後確認期交所沒有資料的日期 (noData，例如臨時休市)，之後的修補不再重新下載
+"""
+
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from taifex_atomic import atomic_write_json
+from taifex_manifest import taipei_now, taipei_today
+
+logger = logging.getLogger('taifex_calendar')
+
+# 證交所休市日期表
+HOLIDAY_SCHEDULE_URL = 'https://openapi.twse.com.tw/v1/holidaySchedule/holidaySchedule'
+
+# 交易日曆快取
+CALENDAR_FILE = 'data/trading_calendar.json'
+
+# 快取有效天數
+CACHE_DAYS = 7
+
+# 休市日期表也列出「開始交易日」、「最後交易日」等仍有交易的日期
+TRADING_NAME_MARKERS = ('開始交易', '最後交易')
+
+
+def parse_holiday_date(value):
+    """
+    解析休市日期表的日期，支援民國年 1140101、西元 20250101 與 2025-01-01 / 2025/01/01
+    無法解析時回傳 None
+    """
+    text = str(value).strip().replace('/', '-')
+    try:
+        if '-' in text:
+            year, month, day = (int(part) for part in text.split('-'))
+        elif len(text) == 7:
+            year, month, day = int(text[:3]) + 1911, int(text[3:5]), int(text[5:])
+        elif len(text) == 8:
+            year, month, day = int(text[:4]), int(text[4:6]), int(text[6:])
+        else:
+            return None
+        if year < 1911:
+            year += 1911
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def holidays_from_schedule(schedule):
+    """
+    將休市日期表轉為 {YYYY-MM-DD: 名稱}，排除仍有交易的日期
+
+    Args:
+        schedule: 證交所回傳的字典列表 (Date、Name、Weekday、Description)
+    """
+    holidays = {}
+    for item in schedule:
+        day = parse_holiday_date(item.get('Date', ''))
+        name = str(item.get('Name', '')).strip()
+        if day is None:
+            logger.warning(f'無法解析休市日期: {item}')
+            continue
+        if any(marker in name for marker in TRADING_NAME_MARKERS):
+            continue
+        holidays[day.isoformat()] = name
+    return holidays
+
+
+def fetch_holidays():
+    """下載休市日期表"""
+    from taifex_http import get_client
+
+    content = get_client().get(HOLIDAY_SCHEDULE_URL)
+    return holidays_from_schedule(json.loads(content))
+
+
+def _read_cache(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f'讀取交易日曆 {path} 時發生錯誤: {str(e)}')
+        return None
+
+
+def _cache_is_current(cache, today):
+    """快取在有效天數內且涵蓋今年時才使用"""
+    try:
+        fetched = datetime.fromisoformat(cache['fetchedAt']).date()
+    except (KeyError, TypeError, ValueError):
+        return False
+    years = {day[:4] for day in cache.get('holidays', {})}
+    return today - fetched < timedelta(days=CACHE_DAYS) and str(today.year) in years
+
+
+def load_holidays(path=CALENDAR_FILE, refresh=False):
+    """
+    讀取休市日，快取過期時重新下載；下載失敗時沿用舊快取，沒有快取則回傳空字典 (只排除週末)
+
+    Returns:
+        dict: {YYYY-MM-DD: 休市名稱}
+    """
+    today = taipei_today()
+    cache = _read_cache(path)
+    if cache is not None and not refresh and _cache_is_current(cache, today):
+        return cache['holidays']
+
+    try:
+        holidays = fetch_holidays()
+    except Exception as e:
+        logger.error(f'下載休市日期表時發生錯誤: {str(e)}')
+        if cache is not None:
+            logger.warning('沿用過期的交易日曆快取')
+            return cache.get('holidays', {})
+        logger.warning('沒有交易日曆快取，只排除週末')
+        return {}
+
+    # 保留舊快取中已過去年份的休市日，休市日期表只提供當年資料；noData 等其他欄位原樣保留
+    merged = dict(cache.get('holidays', {})) if cache else {}
+    merged.update(holidays)
+    atomic_write_json(path, {
+        **(cache or {}),
+        'fetchedAt': taipei_now().isoformat(timespec='seconds'),
+        'holidays': dict(sorted(merged.items()))
+    })
+    logger.info(f'交易日曆已更新，共 {len(merged)} 個休市日')
+    return merged
+
+
+def load_no_data(dataset, path=CALENDAR_FILE):
+    """
+    讀取已確認期交所沒有資料的日期
+
+    Returns:
+        dict: {YYYY-MM-DD: 確認時間}
+    """
+    cache = _read_cache(path) or {}
+    return dict(cache.get('noData', {}).get(dataset, {}))
+
+
+def record_no_data(dataset, days, path=CALENDAR_FILE):
+    """
+    記錄修補後確認沒有資料的日期 (datetime.date 列表)，回傳新記錄的日期數
+    只記錄今日 (台北時間) 以前的日期，今日的資料可能只是尚未公布
+    """
+    today = taipei_today()
+    days = [day.isoformat() for day in days if day < today]
+    cache = _read_cache(path) or {}
+    recorded = cache.setdefault('noData', {}).setdefault(dataset, {})
+    added = [day for day in days if day not in recorded]
+    if not added:
+        return 0
+
+    confirmed_at = taipei_now().isoformat(timespec='seconds')
+    for day in added:
+        recorded[day] = confirmed_at
+    cache['noData'][dataset] = dict(sorted(recorded.items()))
+    atomic_write_json(path, cache)
+    logger.info(f'{dataset} 記錄 {len(added)} 個確認沒有資料的日期，之後的修補不再下載')
+    return len(added)
+
+
+def is_trading_day(day, holidays):
+    """週一至週五且不在休市日中即為交易日"""
+    return day.weekday() < 5 and day.isoformat() not in holidays
+
+
+def trading_days(start_date, end_date, holidays):
+    """列出區間內的所有交易日 (含起訖日)"""
+    days = []
+    current = start_date
+    while current <= end_date:
+        if is_trading_day(current, holidays):
+            days.append(current)
+        current += timedelta(days=1)
+    return days
@@ -0,0 +1,207 @@
+"""
+資料目錄壓縮與保留期限
+舊版爬蟲每次執行都會在 data/ 產生 pc_ratio_<時間戳>.json、institutional_<時間戳>.json、
+institutional_csv_<時間戳>.json 與 institutional_raw_<時間戳>.csv，檔案數隨執行次數無限增加，
+拖慢 crawler_preview_server.js 的目錄列表與 GitHub Pages 部署
+
+本工具:
+    1. 將每次執行的 JSON 依時間戳順序合併到歷史資料集的年/月分區 (每月一個去重複的 Parquet 檔)，合併後刪除
+    2. 保留期限內的 institutional_raw_*.csv 轉存到原始回應快取 (依內容雜湊去重複)，超過期限的直接刪除
+    3. 原始回應快取套用保留期限並壓縮 index.jsonl (taifex_raw_cache.prune)
+    4. 寫入 data/compaction_manifest.json 記錄處理結果與處理後的檔案數
+
+目前的爬蟲已不再產生時間戳檔案，定期執行本工具即可讓 data/ 的檔案數維持固定
+
+保留期限與 --reparse:
+    由舊版 JSON 合併的資料列、以及原始回應已超過保留期限的日期，快取中沒有對應的原始回應；
+    --reparse 依自然鍵合併到歷史資料集，這些日期會保留原本的解析結果，不會被刪除，
+    但解析規則修正後無法再以新規則重新解析。需要完整重新解析能力時請加大 --raw-keep-days
+    每個 (資料集, 回應類型) 最新的一筆原始回應不受保留期限限制，--reparse 一定能重寫 *_latest.json
+
+用法:
+    python taifex_compact.py                     # 原始回應保留 90 天
+    python taifex_compact.py --raw-keep-days 30
+    python taifex_compact.py --dry-run           # 只列出會處理的檔案
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from taifex_atomic import atomic_write_json
+from taifex_manifest import taipei_now
+
+logger = logging.getLogger('taifex_compact')
+
+DATA_DIR = 'data'
+
+# 原始回應預設保留天數
+RAW_KEEP_DAYS = 90
+
+# 舊版每次執行的輸出檔案：檔名前綴對應的歷史資料集
+LEGACY_JSON_PATTERN = re.compile(r'^(pc_ratio|institutional_csv|institutional)_(\d{14})\.json$')
+LEGACY_RAW_PATTERN = re.compile(r'^institutional_raw_(\d{14})\.csv$')
+LEGACY_DATASETS = {
+    'pc_ratio': 'pc_ratio',
+    'institutional': 'institutional',
+    'institutional_csv': 'institutional'
+}
+
+
+def manifest_path():
+    return os.path.join(DATA_DIR, 'compaction_manifest.json')
+
+
+def _timestamp(value):
+    return datetime.strptime(value, '%Y%m%d%H%M%S')
+
+
+def find_legacy_files():
+    """
+    列出舊版每次執行產生的檔案
+
+    Returns:
+        tuple: ([(時間戳, 資料集, 路徑)], [(時間戳, 路徑)])，皆依時間戳排序
+    """
+    json_files = []
+    raw_files = []
+    if not os.path.isdir(DATA_DIR):
+        return json_files, raw_files
+    for name in os.listdir(DATA_DIR):
+        match = LEGACY_JSON_PATTERN.match(name)
+        if match:
+            prefix, stamp = match.groups()
+            json_files.append((_timestamp(stamp), LEGACY_DATASETS[prefix], os.path.join(DATA_DIR, name)))
+            continue
+        match = LEGACY_RAW_PATTERN.match(name)
+        if match:
+            raw_files.append((_timestamp(match.group(1)), os.path.join(DATA_DIR, name)))
+    return sorted(json_files), sorted(raw_files)
+
+
+def merge_legacy_json(json_files, dry_run=False):
+    """
+    依時間戳順序將每次執行的 JSON 合併到歷史資料集，同一自然鍵以較新的執行結果為準
+    無法讀取的檔案保留在原處並列入 failed
+    """
+    from taifex_history_store import append_history
+
+    records = defaultdict(list)
+    merged = defaultdict(list)
+    failed = []
+    for _, dataset, path in json_files:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'無法讀取 {path}，保留原檔: {str(e)}')
+            failed.append(os.path.basename(path))
+            continue
+        if not isinstance(data, list):
+            logger.warning(f'{path} 不是資料列表，保留原檔')
+            failed.append(os.path.basename(path))
+            continue
+        records[dataset].extend(data)
+        merged[dataset].append(path)
+
+    result = {}
+    for dataset, paths in merged.items():
+        rows = 0 if dry_run else append_history(dataset, records[dataset])
+        if not dry_run:
+            for path in paths:
+                os.remove(path)
+        result[dataset] = {'files': len(paths), 'records': len(records[dataset]), 'written': rows}
+        logger.info(f'{dataset} 合併 {len(paths)} 個舊版輸出檔案 ({len(records[dataset])} 筆資料)')
+    return result, failed
+
+
+def migrate_legacy_raw(raw_files, keep_days, dry_run=False):
+    """
+    保留期限內的舊版 CSV 原始內容以 Big5 轉存到原始回應快取 (查詢日期為執行日)，超過期限的刪除
+    舊版以 UTF-8 保存解碼後的內容，轉回 Big5 後與期交所原始回應相同，可供 --reparse 使用
+    """
+    from taifex_raw_cache import store_raw
+
+    cutoff = taipei_now().replace(tzinfo=None) - timedelta(days=keep_days)
+    result = {'cached': 0, 'expired': 0, 'kept': []}
+    for stamp, path in raw_files:
+        if stamp < cutoff:
+            result['expired'] += 1
+        else:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read().encode('big5')
+            except (OSError, UnicodeError) as e:
+                logger.warning(f'無法轉存 {path}，保留原檔: {str(e)}')
+                result['kept'].append(os.path.basename(path))
+                continue
+            if not dry_run:
+                store_raw('institutional', 'csv', content, stamp.date())
+            result['cached'] += 1
+        if not dry_run:
+            os.remove(path)
+    logger.info(f'舊版 CSV 原始內容: 轉存 {result["cached"]} 個，過期刪除 {result["expired"]} 個')
+    return result
+
+
+def count_files(directory):
+    total = 0
+    for _, _, files in os.walk(directory):
+        total += len(files)
+    return total
+
+
+def compact(raw_keep_days=RAW_KEEP_DAYS, dry_run=False):
+    """
+    執行合併與保留期限處理並寫入清單
+
+    Returns:
+        dict: 寫入 compaction_manifest.json 的內容
+    """
+    from taifex_raw_cache import RAW_DIR, prune
+
+    files_before = count_files(DATA_DIR)
+    json_files, raw_files = find_legacy_files()
+    merged, failed = merge_legacy_json(json_files, dry_run=dry_run)
+    raw_result = migrate_legacy_raw(raw_files, raw_keep_days, dry_run=dry_run)
+    if os.path.isdir(RAW_DIR):
+        cache_result = prune(raw_keep_days, dry_run=dry_run)
+    else:
+        cache_result = None
+
+    manifest = {
+        'compactedAt': taipei_now().isoformat(timespec='seconds'),
+        'dryRun': dry_run,
+        'rawKeepDays': raw_keep_days,
+        'legacyJson': merged,
+        'legacyRaw': raw_result,
+        'failed': failed,
+        'rawCache': cache_result,
+        'files': {
+            'before': files_before,
+            'after': count_files(DATA_DIR),
+            'topLevel': len([name for name in os.listdir(DATA_DIR) if os.path.isfile(os.path.join(DATA_DIR, name))])
+        }
+    }
+    if not dry_run:
+        atomic_write_json(manifest_path(), manifest)
+    logger.info(f'data/ 檔案數 {manifest["files"]["before"]} → {manifest["files"]["after"]}')
+    return manifest
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='合併舊版每次執行的輸出檔案並套用原始回應保留期限')
+    parser.add_argument('--raw-keep-days', type=int, default=RAW_KEEP_DAYS, help='原始回應保留天數')
+    parser.add_argument('--dry-run', action='store_true', help='只列出會處理的檔案，不修改任何檔案')
+    args = parser.parse_args()
+
+    result = compact(args.raw_keep_days, dry_run=args.dry_run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
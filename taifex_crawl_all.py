@@ -0,0 +1,164 @@
+"""
+期交所資料整合爬蟲
+在單一程序中以 asyncio 同時爬取 PC Ratio 與三大法人期貨淨部位資料，
+網路請求與表格解析交由工作執行緒處理，總耗時接近最慢的單一請求
+所有資料集都已是今日資料時只使用標準函式庫完成檢查，asyncio、requests 與 pandas 延後到需要爬取時才匯入
+"""
+
+import argparse
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import taifex_pc_ratio_crawler as pc_ratio
+import taifex_institutional_crawler as institutional
+from taifex_raw_cache import cached_entries, load_raw
+from taifex_run_report import get_report
+
+logger = logging.getLogger('taifex_crawl_all')
+
+# 各資料集與回應類型對應的解析與保存函數，供 --reparse 使用
+REPARSERS = {
+    ('pc_ratio', 'html'): (pc_ratio.parse_pc_ratio, pc_ratio.save_pc_ratio),
+    ('institutional', 'html'): (institutional.parse_institutional_html, institutional.save_institutional),
+    ('institutional', 'csv'): (
+        lambda content: institutional.parse_institutional_csv(content)[0],
+        institutional.save_institutional_csv
+    )
+}
+
+
+async def _run_in_thread(executor, func, *args):
+    """
+    在工作執行緒中執行阻塞函數 (網路請求、pandas 解析、檔案寫入)
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
+
+
+async def crawl_pc_ratio_async(executor):
+    """
+    爬取 PC Ratio 資料，回傳輸出檔案路徑；失敗時回傳 None
+    """
+    if pc_ratio.is_data_fresh():
+        return pc_ratio.LATEST_FILE
+
+    from taifex_http import NotModified
+
+    try:
+        try:
+            content, validators = await _run_in_thread(executor, pc_ratio.fetch_pc_ratio)
+        except NotModified:
+            return pc_ratio.skip_unchanged()
+        data = await _run_in_thread(executor, pc_ratio.parse_pc_ratio, content)
+        if data is None:
+            return None
+        return await _run_in_thread(executor, pc_ratio.save_pc_ratio, data, validators)
+    except Exception as e:
+        logger.error(f'爬取 PC Ratio 資料時發生錯誤: {str(e)}')
+        logger.error(traceback.format_exc())
+        return None
+
+
+async def crawl_institutional_async(executor):
+    """
+    爬取三大法人期貨淨部位資料，HTML 表格與 CSV 下載並行，採用先完成的有效結果；失敗時回傳 None
+    """
+    if institutional.is_data_fresh():
+        return institutional.LATEST_FILE
+    return await _run_in_thread(executor, institutional.crawl_hedged)
+
+
+async def crawl_all(max_workers=4):
+    """
+    同時爬取所有資料集
+
+    Returns:
+        dict: 資料集名稱對應輸出檔案路徑 (失敗者為 None)
+    """
+    import asyncio
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='taifex') as executor:
+        pc_ratio_file, institutional_file = await asyncio.gather(
+            crawl_pc_ratio_async(executor),
+            crawl_institutional_async(executor)
+        )
+    logger.info(f'全部資料集爬取完成，耗時 {time.perf_counter() - started:.2f} 秒')
+    return {
+        'pc_ratio': pc_ratio_file,
+        'institutional': institutional_file
+    }
+
+
+def reparse(datasets=('pc_ratio', 'institutional')):
+    """
+    不連網，從原始回應快取重新產生標準化輸出
+    重新解析的資料依自然鍵合併到既有的歷史資料集 (覆蓋相同日期的舊資料)，
+    快取中沒有原始回應的日期 (例如保留期限已過或由舊版輸出合併而來) 維持原狀；
+    最後以最新一筆快取重寫 *_latest.json 與清單
+
+    Returns:
+        dict: 資料集名稱對應最新資料檔案路徑 (沒有快取者為 None)
+    """
+    from taifex_history_store import append_history
+
+    results = {}
+    for dataset in datasets:
+        entries = cached_entries(dataset)
+        logger.info(f'{dataset} 開始從快取重新解析，共 {len(entries)} 筆原始回應')
+        latest = None
+        for entry in entries:
+            parse, _ = REPARSERS[(dataset, entry['kind'])]
+            try:
+                data = parse(load_raw(entry['sha256']))
+            except Exception as e:
+                logger.error(f"{dataset} 快取 {entry['start']} ~ {entry['end']} ({entry['sha256'][:12]}) 解析失敗: {str(e)}")
+                continue
+            if data:
+                append_history(dataset, data)
+                latest = (entry, data)
+
+        if latest is None:
+            logger.warning(f'{dataset} 快取中沒有可解析的資料')
+            results[dataset] = None
+            continue
+        entry, data = latest
+        _, save = REPARSERS[(dataset, entry['kind'])]
+        results[dataset] = save(data)
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='同時爬取期交所 PC Ratio 與三大法人期貨淨部位資料')
+    parser.add_argument('--reparse', action='store_true', help='不連網，從原始回應快取重新產生所有標準化輸出')
+    args = parser.parse_args()
+
+    if args.reparse:
+        results = reparse()
+        get_report().write()
+    elif pc_ratio.is_data_fresh() and institutional.is_data_fresh():
+        # 快速路徑：所有資料集都已是今日資料，不匯入任何爬取與解析模組
+        results = {
+            'pc_ratio': pc_ratio.LATEST_FILE,
+            'institutional': institutional.LATEST_FILE
+        }
+    else:
+        import asyncio
+        from taifex_http import get_client
+        results = asyncio.run(crawl_all())
+        get_client().log_stats()
+        get_report().write()
+
+    failed = [name for name, output_file in results.items() if not output_file]
+    for name, output_file in results.items():
+        if output_file:
+            logger.info(f'{name} 爬蟲完成，數據已保存至 {output_file}')
+            print(f'RESULT_FILE={output_file}')  # 輸出結果檔案路徑供 GitHub Actions 使用
+
+    if failed:
+        logger.error(f'爬蟲程序失敗: {", ".join(failed)}')
+        exit(1)  # 非零退出碼表示失敗
@@ -0,0 +1,164 @@
+"""
+期交所爬蟲常駐服務
+啟動一次後保留已載入的 pandas/lxml 與共用 HTTP 連線池，透過標準輸入/輸出接收 JSON-RPC 指令執行爬取，
+省去每次爬取都重新啟動 Python、匯入模組與建立連線的時間
+
+協定: 每行一個 JSON 物件
+    請求: {"id": 1, "method": "crawl", "params": {"type": "pc_ratio", "force": false}}
+    回應: {"id": 1, "result": {...}} 或 {"id": 1, "error": {"code": -32000, "message": "..."}}
+
+支援的方法:
+    ping      回傳程序 pid 與已執行秒數
+    crawl     執行爬蟲，type 為 pc_ratio 或 institutional；force 為 true 時略過新鮮度檢查
+    stats     回傳 HTTP 連線池統計
+    shutdown  結束服務
+
+標準輸出只用於回應，日誌一律寫入標準錯誤
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import taifex_pc_ratio_crawler as pc_ratio
+import taifex_institutional_crawler as institutional
+from taifex_http import get_client
+from taifex_run_report import reset_report
+
+logger = logging.getLogger('taifex_crawler_daemon')
+
+# 各爬蟲類型對應的 (檢查新鮮度後爬取, 強制爬取) 函數
+CRAWLERS = {
+    'pc_ratio': (pc_ratio.check_and_crawl, pc_ratio.crawl_pc_ratio),
+    'institutional': (institutional.check_and_crawl, institutional.crawl_hedged)
+}
+
+# JSON-RPC 錯誤代碼
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+CRAWL_FAILED = -32000
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class CrawlerDaemon:
+    """
+    讀取標準輸入的指令並回應到標準輸出
+    爬取工作依序在單一工作執行緒中執行 (每次爬取各自產生執行報告)，ping/stats 可在爬取進行中立即回應
+    """
+
+    def __init__(self, stdin=None, stdout=None):
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self._write_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='crawl')
+        self._started = time.monotonic()
+
+    def _send(self, message):
+        line = json.dumps(message, ensure_ascii=False)
+        with self._write_lock:
+            self.stdout.write(line + '\n')
+            self.stdout.flush()
+
+    def _reply(self, request_id, result=None, error=None):
+        message = {'jsonrpc': '2.0', 'id': request_id}
+        if error is not None:
+            message['error'] = {'code': error.code, 'message': error.message}
+        else:
+            message['result'] = result
+        self._send(message)
+
+    def crawl(self, params):
+        """執行單次爬取，回傳輸出檔案路徑、耗時與執行報告"""
+        crawl_type = params.get('type')
+        if crawl_type not in CRAWLERS:
+            raise RpcError(INVALID_PARAMS, f'未知的爬蟲類型: {crawl_type}')
+
+        check_and_crawl, force_crawl = CRAWLERS[crawl_type]
+        report = reset_report()
+        started = time.perf_counter()
+        output_file = force_crawl() if params.get('force') else check_and_crawl()
+        seconds = time.perf_counter() - started
+        report.write()
+
+        if not output_file:
+            raise RpcError(CRAWL_FAILED, f'{crawl_type} 爬蟲執行失敗')
+        logger.info(f'{crawl_type} 爬取完成，耗時 {seconds:.2f} 秒，數據已保存至 {output_file}')
+        return {
+            'type': crawl_type,
+            'file': output_file,
+            'seconds': round(seconds, 3),
+            'report': report.to_dict()
+        }
+
+    def _run_crawl(self, request_id, params):
+        try:
+            result = self.crawl(params)
+        except RpcError as e:
+            self._reply(request_id, error=e)
+        except Exception as e:
+            logger.error(f'爬取時發生錯誤: {str(e)}')
+            logger.error(traceback.format_exc())
+            self._reply(request_id, error=RpcError(CRAWL_FAILED, str(e)))
+        else:
+            self._reply(request_id, result=result)
+
+    def handle_line(self, line):
+        """處理一行請求，回傳 False 表示應結束服務"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self._reply(None, error=RpcError(PARSE_ERROR, '無法解析的 JSON'))
+            return True
+        if not isinstance(request, dict) or 'method' not in request:
+            self._reply(None, error=RpcError(INVALID_REQUEST, '請求缺少 method'))
+            return True
+
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+
+        if method == 'ping':
+            self._reply(request_id, {'pid': os.getpid(), 'uptime': round(time.monotonic() - self._started, 3)})
+        elif method == 'stats':
+            self._reply(request_id, get_client().connection_stats())
+        elif method == 'crawl':
+            self._executor.submit(self._run_crawl, request_id, params)
+        elif method == 'shutdown':
+            self._reply(request_id, {'ok': True})
+            return False
+        else:
+            self._reply(request_id, error=RpcError(METHOD_NOT_FOUND, f'未知的方法: {method}'))
+        return True
+
+    def serve(self):
+        """持續讀取標準輸入直到 shutdown 或輸入結束"""
+        logger.info('爬蟲常駐服務已啟動，等待指令')
+        self._send({'jsonrpc': '2.0', 'method': 'ready', 'params': {'pid': os.getpid()}})
+        try:
+            for line in self.stdin:
+                line = line.strip()
+                if line and not self.handle_line(line):
+                    break
+        finally:
+            # 等待進行中的爬取完成，避免寫到一半的輸出檔案
+            self._executor.shutdown(wait=True)
+            get_client().log_stats()
+            get_client().close()
+        logger.info('爬蟲常駐服務已結束')
+
+
+if __name__ == '__main__':
+    CrawlerDaemon().serve()
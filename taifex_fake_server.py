@@ -0,0 +1,345 @@
+"""
+期交所本機替身伺服器
+模擬 pcRatioExcel、futContractsDateExcel 與 futContractsDateDown 三個端點，
+讓爬蟲可以在沒有網路的 CI 中執行整合測試與效能量測
+
+回應來源:
+    1. 指定 --raw-cache 時，優先重播原始回應快取 (data/raw) 中相同查詢區間的紀錄
+    2. 否則以 taifex_synthetic 產生查詢區間內每個平日的資料 (同一查詢每次回應相同內容)
+
+模擬期交所的錯誤分支:
+    查詢日期晚於今日     CSV 端點回應 Big5 編碼的「日期時間錯誤」
+    區間內沒有交易日     CSV 端點回應 Big5 編碼的「查無資料」，HTML 端點回應沒有資料表的頁面
+
+可調整延遲、錯誤率與回應大小，回應帶有 ETag 並支援 If-None-Match (304)
+GET /__stats 回傳各端點的請求統計
+
+用法:
+    python taifex_fake_server.py --port 8800 --latency-ms 200 --error-rate 0.1
+    TAIFEX_BASE_URL=http://127.0.0.1:8800 python taifex_crawl_all.py
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from taifex_manifest import taipei_today
+from taifex_synthetic import render, weekdays
+
+logger = logging.getLogger('taifex_fake_server')
+
+DEFAULT_PORT = 8800
+
+# 端點路徑對應的 (資料集, 回應類型)，與原始回應快取的索引一致
+ENDPOINTS = {
+    '/cht/3/pcRatioExcel': ('pc_ratio', 'html'),
+    '/cht/3/futContractsDateExcel': ('institutional', 'html'),
+    '/cht/3/futContractsDateDown': ('institutional', 'csv')
+}
+
+# 期交所回應的錯誤訊息
+NO_DATA_MESSAGE = '查無資料'
+DATE_ERROR_MESSAGE = '日期時間錯誤'
+
+
+def parse_query_date(value):
+    """解析查詢參數的 YYYY/MM/DD 日期，空白時回傳 None"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    return datetime.strptime(value.replace('-', '/'), '%Y/%m/%d').date()
+
+
+def _html_message(message, encoding='utf-8'):
+    charset = 'big5' if encoding == 'big5' else 'utf-8'
+    return (
+        f'<html><head><meta charset="{charset}"></head><body>'
+        f'<div class="error">{message}</div></body></html>'
+    ).encode(encoding)
+
+
+def render_response(dataset, kind, days, contract_count=3):
+    """沒有交易日時 HTML 端點回應沒有資料表的頁面，CSV 端點回應 Big5 編碼的查無資料"""
+    if not days:
+        return _html_message(NO_DATA_MESSAGE, 'big5' if kind == 'csv' else 'utf-8')
+    return render(f'{dataset}_{kind}', days, contract_count)
+
+
+def load_recordings(raw_dir):
+    """
+    讀取原始回應快取索引
+
+    Returns:
+        dict: (資料集, 回應類型, 起始日期, 結束日期) 對應原始回應檔案路徑
+    """
+    recordings = {}
+    index_path = os.path.join(raw_dir, 'index.jsonl')
+    if not os.path.exists(index_path):
+        logger.warning(f'找不到原始回應快取索引 {index_path}，全部回應改為即時產生')
+        return recordings
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            key = (entry['dataset'], entry['kind'], entry['start'], entry['end'])
+            recordings[key] = os.path.join(raw_dir, 'objects', entry['sha256'][:2], entry['sha256'])
+    logger.info(f'已載入 {len(recordings)} 筆錄製的原始回應')
+    return recordings
+
+
+class FakeTaifex:
+    """
+    替身伺服器的回應邏輯與統計，與 HTTP 處理分開，方便在同一程序中直接呼叫
+
+    Args:
+        latency_ms: 每次回應前的平均延遲
+        jitter_ms: 延遲的隨機變動範圍 (正負)
+        error_rate: 回應 error_status 的機率
+        no_data_rate: 即使有交易日也回應查無資料的機率 (模擬資料尚未公布)
+        pad_bytes: 在回應後附加的填充位元組數，用來量測大型回應
+        contract_count: 產生三大法人資料時的契約數量
+        recordings: load_recordings 的結果
+        today: 視為今日的日期，晚於此日期的查詢回應日期時間錯誤
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=500, no_data_rate=0.0,
+                 pad_bytes=0, contract_count=3, recordings=None, today=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.no_data_rate = no_data_rate
+        self.pad_bytes = pad_bytes
+        self.contract_count = contract_count
+        self.recordings = recordings or {}
+        self.today = today
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, path, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(path, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {path: dict(counts) for path, counts in self._stats.items()}
+
+    def _chance(self, rate):
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def delay(self):
+        """本次回應的延遲秒數"""
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(self.latency_ms + jitter, 0) / 1000
+
+    def _pad(self, body, kind):
+        if not self.pad_bytes:
+            return body
+        if kind == 'csv':
+            # pandas 預設略過空白行，填充不影響解析結果
+            return body + b'\r\n' * (self.pad_bytes // 2)
+        return body + b'<!--' + b' ' * self.pad_bytes + b'-->'
+
+    def respond(self, path, form):
+        """
+        產生回應
+
+        Args:
+            path: 請求路徑
+            form: 查詢參數與表單欄位 {名稱: 值}
+
+        Returns:
+            tuple: (HTTP 狀態碼, Content-Type, 回應位元組)
+        """
+        if path not in ENDPOINTS:
+            self._count(path, 'not_found')
+            return 404, 'text/plain; charset=utf-8', b'not found'
+
+        if self._chance(self.error_rate):
+            self._count(path, 'error')
+            return self.error_status, 'text/plain; charset=utf-8', b'injected error'
+
+        dataset, kind = ENDPOINTS[path]
+        content_type = 'text/csv; charset=big5' if kind == 'csv' else 'text/html; charset=utf-8'
+        today = self.today or taipei_today()
+        start_date = parse_query_date(form.get('queryStartDate')) or today
+        end_date = parse_query_date(form.get('queryEndDate')) or start_date
+
+        if kind == 'csv' and (start_date > today or end_date > today or start_date > end_date):
+            self._count(path, 'date_error')
+            return 200, 'text/html; charset=big5', _html_message(DATE_ERROR_MESSAGE, 'big5')
+
+        recording = self.recordings.get((dataset, kind, start_date.isoformat(), end_date.isoformat()))
+        if recording is not None and os.path.exists(recording):
+            with open(recording, 'rb') as f:
+                body = f.read()
+            self._count(path, 'replayed')
+            return 200, content_type, self._pad(body, kind)
+
+        days = weekdays(start_date, min(end_date, today))
+        if days and self._chance(self.no_data_rate):
+            days = []
+        body = render_response(dataset, kind, days, self.contract_count)
+        if not days:
+            self._count(path, 'no_data')
+            if kind == 'csv':
+                content_type = 'text/html; charset=big5'
+        else:
+            self._count(path, 'ok')
+        return 200, content_type, self._pad(body, kind)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _form(self):
+        url = urlsplit(self.path)
+        fields = parse_qs(url.query)
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            fields.update(parse_qs(self.rfile.read(length).decode('utf-8')))
+        return url.path, {name: values[-1] for name, values in fields.items()}
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _handle(self):
+        fake = self.server.fake
+        path, form = self._form()
+        if path == '/__stats':
+            body = json.dumps(fake.stats(), ensure_ascii=False).encode('utf-8')
+            self._send(200, 'application/json; charset=utf-8', body)
+            return
+
+        time.sleep(fake.delay())
+        status, content_type, body = fake.respond(path, form)
+        if status != 200:
+            self._send(status, content_type, body)
+            return
+
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            fake._count(path, 'not_modified')
+            self._send(304, content_type, b'', {'ETag': etag})
+            return
+        self._send(200, content_type, body, {'ETag': etag})
+
+    do_GET = _handle
+    do_POST = _handle
+    do_HEAD = _handle
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+class FakeTaifexServer:
+    """
+    在背景執行緒中執行替身伺服器，port 為 0 時由系統指定可用埠
+
+    用法:
+        with FakeTaifexServer(latency_ms=50) as server:
+            crawler.PC_RATIO_URL = server.url('/cht/3/pcRatioExcel')
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.fake = FakeTaifex(**options)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self.fake
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path):
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-taifex', daemon=True)
+        self._thread.start()
+        logger.info(f'期交所替身伺服器已啟動: {self.base_url}')
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='期交所本機替身伺服器')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='監聽埠')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每次回應的平均延遲 (毫秒)')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='延遲的隨機變動範圍 (毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回應 HTTP 錯誤的機率 (0 ~ 1)')
+    parser.add_argument('--error-status', type=int, default=500, help='注入錯誤時的 HTTP 狀態碼')
+    parser.add_argument('--no-data-rate', type=float, default=0.0, help='回應查無資料的機率 (0 ~ 1)')
+    parser.add_argument('--pad-bytes', type=int, default=0, help='每個回應附加的填充位元組數')
+    parser.add_argument('--contracts', type=int, default=3, help='產生三大法人資料時的契約數量')
+    parser.add_argument('--raw-cache', help='重播此原始回應快取目錄中的錄製回應 (例如 data/raw)')
+    parser.add_argument('--today', type=lambda value: date.fromisoformat(value), help='視為今日的日期 (YYYY-MM-DD)')
+    parser.add_argument('--seed', type=int, help='錯誤注入與延遲的亂數種子')
+    args = parser.parse_args(argv)
+
+    server = FakeTaifexServer(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        no_data_rate=args.no_data_rate,
+        pad_bytes=args.pad_bytes,
+        contract_count=args.contracts,
+        recordings=load_recordings(args.raw_cache) if args.raw_cache else None,
+        today=args.today,
+        seed=args.seed
+    )
+    logger.info(f'期交所替身伺服器監聽 {server.base_url}，按 Ctrl+C 結束')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    exit(main())
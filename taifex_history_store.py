@@ -0,0 +1,255 @@
+"""
+期交所歷史資料儲存
+將標準化後的資料附加到依年/月分區的 Parquet 資料集 (data/history/<dataset>/year=YYYY/month=M/)，
+數值欄位以 int64/float64 儲存，並依自然鍵去除重複資料
+三大法人資料另以契約分區 (data/history/institutional/contract=<商品名稱>/year=YYYY/month=M/)，
+查詢單一契約時只需讀取該契約的分區
+"""
+
+import logging
+import os
+import shutil
+
+import pandas as pd
+
+from taifex_atomic import atomic_output
+from taifex_normalize import to_number
+
+logger = logging.getLogger('taifex_history_store')
+
+# 歷史資料根目錄
+HISTORY_DIR = 'data/history'
+
+# 各資料集的欄位定義
+# key: 自然鍵；int_columns/float_columns: 數值欄位型別；string_columns: 文字欄位
+# partition_column: 年/月之外再依此欄位分區 (None 表示只依年/月分區)
+SCHEMAS = {
+    'pc_ratio': {
+        'key': ['Date'],
+        'partition_column': None,
+        'string_columns': [],
+        'int_columns': ['CallVolume', 'PutVolume', 'CallOI', 'PutOI'],
+        'float_columns': ['PutCallVolumeRatio%', 'PutCallOIRatio%']
+    },
+    'institutional': {
+        'key': ['Date', 'ContractName', 'InvestorType'],
+        'partition_column': 'ContractName',
+        'string_columns': ['Contract', 'ContractName', 'InvestorType'],
+        'int_columns': [
+            'LongTradeVolume', 'LongTradeValue', 'ShortTradeVolume', 'ShortTradeValue',
+            'NetTradeVolume', 'NetTradeValue', 'LongOIVolume', 'LongOIValue',
+            'ShortOIVolume', 'ShortOIValue', 'NetOIVolume', 'NetOIValue'
+        ],
+        'float_columns': []
+    }
+}
+
+# 同一契約在 HTML 與 CSV 中的不同商品名稱，寫入前統一為 HTML 的名稱，
+# 讓自然鍵與契約分區一致 (例如 CSV 的「小型臺指」即 HTML 的「小型臺指期貨」)
+CONTRACT_ALIASES = {
+    '小型臺指': '小型臺指期貨'
+}
+
+# CSV 下載端點使用中文欄位名稱，寫入前統一轉為英文
+CSV_COLUMNS_MAPPING = {
+    '日期': 'Date',
+    '商品名稱': 'Contract',
+    '契約': 'Contract',
+    '身份別': 'InvestorType',
+    '多方交易口數': 'LongTradeVolume',
+    '多方交易契約金額(千元)': 'LongTradeValue',
+    '空方交易口數': 'ShortTradeVolume',
+    '空方交易契約金額(千元)': 'ShortTradeValue',
+    '多空交易口數淨額': 'NetTradeVolume',
+    '多空交易契約金額淨額(千元)': 'NetTradeValue',
+    '多方未平倉口數': 'LongOIVolume',
+    '多方未平倉契約金額(千元)': 'LongOIValue',
+    '空方未平倉口數': 'ShortOIVolume',
+    '空方未平倉契約金額(千元)': 'ShortOIValue',
+    '多空未平倉口數淨額': 'NetOIVolume',
+    '多空未平倉契約金額淨額(千元)': 'NetOIValue'
+}
+
+
+def _columns(dataset):
+    """資料集的完整欄位順序"""
+    schema = SCHEMAS[dataset]
+    columns = ['Date']
+    for column in schema['string_columns'] + schema['int_columns'] + schema['float_columns']:
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def to_frame(dataset, records):
+    """
+    將爬蟲輸出的字典列表轉換為固定欄位與型別的 DataFrame
+    """
+    schema = SCHEMAS[dataset]
+    df = pd.DataFrame(records)
+    if df.empty:
+        return pd.DataFrame(columns=_columns(dataset))
+
+    df.columns = [str(column).strip() for column in df.columns]
+    df = df.rename(columns=CSV_COLUMNS_MAPPING)
+
+    # 商品名稱取空白前的部分 (如：臺股期貨 TX → 臺股期貨)
+    if dataset == 'institutional' and 'ContractName' not in df.columns and 'Contract' in df.columns:
+        df['ContractName'] = df['Contract'].astype(str).str.split(' ').str[0]
+
+    df = df.reindex(columns=_columns(dataset))
+    df['Date'] = pd.to_datetime(df['Date'].astype(str).str.strip(), format='%Y/%m/%d', errors='coerce')
+    invalid = df['Date'].isna()
+    if invalid.any():
+        logger.warning(f'{dataset} 有 {int(invalid.sum())} 筆資料日期無法解析，已略過')
+        df = df[~invalid]
+
+    for column in schema['string_columns']:
+        df[column] = df[column].astype('string').str.strip()
+    if 'ContractName' in df.columns:
+        df['ContractName'] = df['ContractName'].replace(CONTRACT_ALIASES)
+    for column in schema['int_columns']:
+        df[column] = to_number(df[column]).round().astype('Int64')
+    for column in schema['float_columns']:
+        df[column] = to_number(df[column]).astype('float64')
+    return df.reset_index(drop=True)
+
+
+# 分區目錄名稱 (例如 contract=臺股期貨)
+PARTITION_DIRS = {
+    'ContractName': 'contract'
+}
+
+
+def _partition_file(base_dir, dataset, year, month, partition_value=None):
+    parts = [base_dir, dataset]
+    if partition_value is not None:
+        column = SCHEMAS[dataset]['partition_column']
+        parts.append(f'{PARTITION_DIRS[column]}={partition_value}')
+    parts += [f'year={year}', f'month={month}', 'part.parquet']
+    return os.path.join(*parts)
+
+
+def _migrate_legacy_layout(dataset, base_dir):
+    """
+    將只依年/月分區的舊版資料改寫為契約分區，舊目錄在改寫完成後移除
+    """
+    dataset_dir = os.path.join(base_dir, dataset)
+    if not os.path.isdir(dataset_dir):
+        return
+    legacy_dirs = [name for name in os.listdir(dataset_dir) if name.startswith('year=')]
+    if not legacy_dirs:
+        return
+
+    logger.info(f'{dataset} 歷史資料集改為依契約分區，轉換 {len(legacy_dirs)} 個年份目錄')
+    for name in legacy_dirs:
+        legacy_dir = os.path.join(dataset_dir, name)
+        year = int(name.split('=', 1)[1])
+        for month_dir in sorted(os.listdir(legacy_dir)):
+            legacy_file = os.path.join(legacy_dir, month_dir, 'part.parquet')
+            if os.path.exists(legacy_file):
+                _write_partitions(dataset, pd.read_parquet(legacy_file), base_dir)
+        shutil.rmtree(legacy_dir)
+        logger.info(f'{dataset} 已轉換 {year} 年的舊版分區')
+
+
+def _merge_alias_partitions(dataset, base_dir):
+    """
+    將以別名 (例如 contract=小型臺指) 寫入的舊分區合併到標準名稱的分區，合併完成後移除別名目錄
+    """
+    column = SCHEMAS[dataset]['partition_column']
+    for alias, canonical in CONTRACT_ALIASES.items():
+        alias_dir = os.path.join(base_dir, dataset, f'{PARTITION_DIRS[column]}={alias}')
+        if not os.path.isdir(alias_dir):
+            continue
+        logger.info(f'{dataset} 將 {alias} 分區合併到 {canonical}')
+        for root, _, files in os.walk(alias_dir):
+            if 'part.parquet' in files:
+                df = pd.read_parquet(os.path.join(root, 'part.parquet'))
+                df[column] = canonical
+                _write_partitions(dataset, df, base_dir)
+        shutil.rmtree(alias_dir)
+
+
+def _write_partitions(dataset, df, base_dir):
+    """依分區合併既有資料並寫入"""
+    schema = SCHEMAS[dataset]
+    key = schema['key']
+    group_columns = [df['Date'].dt.year, df['Date'].dt.month]
+    if schema['partition_column']:
+        group_columns.insert(0, df[schema['partition_column']].fillna(''))
+
+    for group, part in df.groupby(group_columns):
+        if schema['partition_column']:
+            partition_value, year, month = group
+        else:
+            partition_value, (year, month) = None, group
+        partition_file = _partition_file(base_dir, dataset, year, month, partition_value)
+        if os.path.exists(partition_file):
+            existing = pd.read_parquet(partition_file)
+            part = pd.concat([existing, part], ignore_index=True)
+        part = part.drop_duplicates(subset=key, keep='last').sort_values(key, kind='stable')
+
+        # 先寫入唯一的暫存檔 (以 . 開頭，讀取資料集時會被忽略)、fsync 後再原子替換，
+        # 避免中斷時留下損壞的分區，同時寫入的程序也不會覆蓋彼此的暫存檔
+        with atomic_output(partition_file) as temp_file:
+            part.to_parquet(temp_file, index=False)
+
+
+def append_history(dataset, records, base_dir=HISTORY_DIR):
+    """
+    將資料附加到歷史資料集，同一自然鍵以新資料覆蓋舊資料
+
+    Returns:
+        int: 寫入的資料筆數
+    """
+    df = to_frame(dataset, records)
+    if df.empty:
+        logger.warning(f'{dataset} 沒有可寫入歷史資料集的資料')
+        return 0
+
+    if SCHEMAS[dataset]['partition_column']:
+        _migrate_legacy_layout(dataset, base_dir)
+        _merge_alias_partitions(dataset, base_dir)
+    _write_partitions(dataset, df, base_dir)
+
+    logger.info(f'{dataset} 已寫入歷史資料集 {os.path.join(base_dir, dataset)}，共 {len(df)} 筆新資料')
+    return len(df)
+
+
+def read_history(dataset, start_date=None, end_date=None, columns=None, base_dir=HISTORY_DIR, contracts=None):
+    """
+    讀取歷史資料集，依契約與年份分區篩選後再以日期精確過濾
+
+    Args:
+        dataset: 資料集名稱
+        start_date: 起始日期 (datetime.date)，None 表示不限
+        end_date: 結束日期 (datetime.date)，None 表示不限
+        columns: 只讀取指定欄位 (Date 一定會包含)
+        contracts: 只讀取指定商品名稱 (例如 ['臺股期貨', '小型臺指期貨'])，僅適用依契約分區的資料集
+    """
+    dataset_dir = os.path.join(base_dir, dataset)
+    if not os.path.isdir(dataset_dir):
+        return pd.DataFrame(columns=columns or _columns(dataset))
+
+    filters = []
+    if contracts is not None:
+        column = SCHEMAS[dataset]['partition_column']
+        if column is None:
+            raise ValueError(f'{dataset} 沒有依契約分區')
+        contracts = [CONTRACT_ALIASES.get(contract, contract) for contract in contracts]
+        filters.append((PARTITION_DIRS[column], 'in', contracts))
+    if start_date is not None:
+        filters.append(('year', '>=', start_date.year))
+    if end_date is not None:
+        filters.append(('year', '<=', end_date.year))
+    if columns is not None and 'Date' not in columns:
+        columns = ['Date'] + list(columns)
+
+    df = pd.read_parquet(dataset_dir, columns=columns, filters=filters or None)
+    df = df.drop(columns=['year', 'month'] + list(PARTITION_DIRS.values()), errors='ignore')
+    if start_date is not None:
+        df = df[df['Date'] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[df['Date'] <= pd.Timestamp(end_date)]
+    return df.sort_values('Date', kind='stable').reset_index(drop=True)
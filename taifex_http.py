@@ -0,0 +1,290 @@
+"""
+期交所共用 HTTP 連線模組
+提供兩支 taifex_*_crawler.py 共用的 keep-alive requests.Session，
+避免每次請求都重新進行 DNS 查詢、TCP 與 TLS 連線
+並支援條件式請求：帶上前次回應的 ETag/Last-Modified，伺服器回應 304 或內容雜湊相同時視為未變更
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('taifex_http')
+
+# 期交所網站基礎 URL
+BASE_URL = 'https://www.taifex.com.tw'
+
+# 預設逾時設定 (連線逾時秒數, 讀取逾時秒數)
+DEFAULT_TIMEOUT = (5, 30)
+
+# 串流下載時每次讀取的位元組數
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 預設請求標頭
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; fin-data-bot/1.0)',
+    'Accept': 'text/html,application/xhtml+xml,text/csv,*/*;q=0.8',
+    'Accept-Language': 'zh-TW,zh;q=0.9',
+    'Connection': 'keep-alive'
+}
+
+
+class NotModified(Exception):
+    """條件式請求的回應與前次相同"""
+
+    def __init__(self, key, validators):
+        super().__init__(f'{key} 內容未變更')
+        self.key = key
+        self.validators = validators
+
+
+class Cancelled(Exception):
+    """請求已被取消 (例如並行路徑中落後的一方)"""
+
+
+class CancelScope:
+    """
+    可從其他執行緒取消的一組請求
+    cancel() 會立即關閉登記中的回應，讀取中的請求在下一段內容前拋出 Cancelled；
+    取消後才開始的請求不會送出
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses = set()
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            responses = list(self._responses)
+            self._responses.clear()
+        for response in responses:
+            response.close()
+
+    def check(self):
+        """已取消時拋出 Cancelled"""
+        if self.cancelled:
+            raise Cancelled()
+
+    def register(self, response):
+        with self._lock:
+            if not self.cancelled:
+                self._responses.add(response)
+                return
+        response.close()
+        raise Cancelled()
+
+    def release(self, response):
+        with self._lock:
+            self._responses.discard(response)
+
+
+def request_key(method, url, params=None, data=None):
+    """以方法、網址與查詢參數組成條件式請求的識別鍵"""
+    query = {'params': params or {}, 'data': data or {}}
+    return f"{method} {url} {json.dumps(query, ensure_ascii=False, sort_keys=True)}"
+
+
+class TaifexClient:
+    """
+    期交所 HTTP 用戶端
+    以單一 requests.Session 搭配調整過的連線池發送請求，並回傳原始位元組給解析器
+    """
+
+    def __init__(self, pool_connections=2, pool_maxsize=8, timeout=DEFAULT_TIMEOUT, headers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        # 期交所只有少數主機，pool_connections 控制主機數，pool_maxsize 控制每台主機的連線數
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        發送請求並回傳原始回應內容 (bytes)
+        HTTP 狀態碼錯誤時拋出 requests.HTTPError
+        """
+        response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        response.raise_for_status()
+        logger.info(f'{method} {url} 完成，狀態碼: {response.status_code}, 大小: {len(response.content)} bytes')
+        return response.content
+
+    def conditional_request(self, method, url, validators=None, timeout=None, cancel_scope=None, **kwargs):
+        """
+        發送條件式請求
+
+        Args:
+            validators: 前次回應的 {'etag', 'lastModified', 'sha256'}，None 表示第一次請求
+            cancel_scope: 指定時以串流逐段讀取回應，CancelScope 取消後立即關閉回應並停止下載
+
+        Returns:
+            tuple: (原始回應內容, 本次回應的 validators)
+
+        Raises:
+            NotModified: 伺服器回應 304，或回應內容的 SHA-256 與前次相同
+            Cancelled: cancel_scope 在下載完成前被取消
+        """
+        key = request_key(method, url, kwargs.get('params'), kwargs.get('data'))
+        validators = validators or {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('lastModified'):
+            headers['If-Modified-Since'] = validators['lastModified']
+
+        if cancel_scope is None:
+            response = self.session.request(method, url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+        else:
+            cancel_scope.check()
+            response = self.session.request(
+                method, url, headers=headers, stream=True, timeout=timeout or self.timeout, **kwargs
+            )
+            cancel_scope.register(response)
+        try:
+            if response.status_code == 304:
+                logger.info(f'{method} {url} 回應 304，內容未變更')
+                raise NotModified(key, validators)
+            response.raise_for_status()
+            content = response.content if cancel_scope is None else self._read_cancellable(response, cancel_scope)
+        finally:
+            if cancel_scope is not None:
+                cancel_scope.release(response)
+                response.close()
+
+        current = {
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+            'sha256': hashlib.sha256(content).hexdigest()
+        }
+        if validators.get('sha256') == current['sha256']:
+            logger.info(f'{method} {url} 內容雜湊與前次相同，視為未變更')
+            raise NotModified(key, current)
+        logger.info(f'{method} {url} 完成，狀態碼: {response.status_code}, 大小: {len(content)} bytes')
+        return content, current
+
+    @staticmethod
+    def _read_cancellable(response, cancel_scope):
+        """逐段讀取串流回應，每段之間檢查是否已取消；回應被其他執行緒關閉時同樣視為取消"""
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                cancel_scope.check()
+                chunks.append(chunk)
+        except Cancelled:
+            raise
+        except Exception:
+            cancel_scope.check()
+            raise
+        # 取消時先設定旗標再關閉回應，被截斷的內容不會被當成完整回應
+        cancel_scope.check()
+        return b''.join(chunks)
+
+    @contextmanager
+    def stream(self, method, url, chunk_size=STREAM_CHUNK_SIZE, timeout=None, **kwargs):
+        """
+        發送請求並逐段讀取回應內容，整個回應不會同時放在記憶體
+        HTTP 狀態碼錯誤時拋出 requests.HTTPError
+
+        用法:
+            with client.stream('POST', url, data=form) as chunks:
+                for chunk in chunks:
+                    ...
+        """
+        response = self.session.request(method, url, stream=True, timeout=timeout or self.timeout, **kwargs)
+        try:
+            response.raise_for_status()
+            logger.info(f'{method} {url} 開始串流，狀態碼: {response.status_code}')
+            yield response.iter_content(chunk_size=chunk_size)
+        finally:
+            response.close()
+
+    def get(self, url, params=None, timeout=None):
+        """以 GET 取得原始回應內容"""
+        return self.request('GET', url, params=params, timeout=timeout)
+
+    def post(self, url, data=None, timeout=None):
+        """以 POST 表單取得原始回應內容"""
+        return self.request('POST', url, data=data, timeout=timeout)
+
+    def connection_stats(self):
+        """
+        統計連線池使用狀況
+
+        Returns:
+            dict: requests 為總請求數，new_connections 為新建立的連線數，
+                  reused_connections 為重複使用既有連線的請求數
+        """
+        total_requests = 0
+        new_connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            'requests': total_requests,
+            'new_connections': new_connections,
+            'reused_connections': max(total_requests - new_connections, 0)
+        }
+
+    def log_stats(self):
+        """將連線池統計輸出到日誌"""
+        stats = self.connection_stats()
+        logger.info(
+            f"連線統計: 請求 {stats['requests']} 次, "
+            f"新建連線 {stats['new_connections']} 條, 重用連線 {stats['reused_connections']} 次"
+        )
+        return stats
+
+    def close(self):
+        """關閉 Session 與連線池"""
+        self.session.close()
+
+
+# 模組層級共用的用戶端
+_client = None
+
+
+def get_client():
+    """
+    取得共用的 TaifexClient，第一次呼叫時建立
+    """
+    global _client
+    if _client is None:
+        _client = TaifexClient()
+    return _client
+
+
+def fetch_if_changed(dataset, method, url, **kwargs):
+    """
+    以資料集清單中保存的 validators 發送條件式請求
+    本次回應的 validators 回傳給呼叫端，待資料成功保存時以 write_manifest(validators=...) 一併記錄，
+    解析或寫入失敗時直接捨棄，下次請求不會被誤判為未變更
+
+    Returns:
+        tuple: (原始回應內容, 清單記錄格式的 validators)
+
+    Raises:
+        NotModified: 回應內容與清單記錄的相同
+    """
+    from taifex_manifest import request_validators, stored_validators
+
+    key = request_key(method, url, kwargs.get('params'), kwargs.get('data'))
+    content, validators = get_client().conditional_request(method, url, stored_validators(dataset, key), **kwargs)
+    return content, request_validators(key, validators)
@@ -1,10 +1,17 @@
-import pandas as pd
-import json
-from datetime import datetime
 import os
 import logging
-import requests
 import io
+import queue
+import threading
+import time
+from taifex_atomic import atomic_write
+from taifex_output_formats import serialize_outputs
+from taifex_manifest import content_hash, is_fresh, mark_unchanged, read_manifest, taipei_today, write_manifest
+from taifex_raw_cache import store_raw
+from taifex_run_report import RunReport, get_report, use_report
+
+# requests、pandas 與 lxml 只在真正需要爬取或解析時才在函數內匯入，
+# 資料已是最新時只需標準函式庫即可完成新鮮度檢查並結束
 
 # 設定日誌
 logging.basicConfig(
@@ -13,287 +20,586 @@ logging.basicConfig(
 )
 logger = logging.getLogger('taifex_institutional_crawler')
 
+# 期交所網站，可用 TAIFEX_BASE_URL 環境變數指向本機替身伺服器 (taifex_fake_server.py)
+TAIFEX_BASE_URL = os.environ.get('TAIFEX_BASE_URL', 'https://www.taifex.com.tw')
+
+# 期交所三大法人期貨頁面 (HTML 表格) 與 CSV 下載端點
+HTML_URL = f'{TAIFEX_BASE_URL}/cht/3/futContractsDateExcel'
+CSV_URL = f'{TAIFEX_BASE_URL}/cht/3/futContractsDateDown'
+
+# 最新資料檔案（固定名稱）
+LATEST_FILE = 'data/institutional_latest.json'
+CSV_LATEST_FILE = 'data/institutional_csv_latest.json'
+
+# 查無資料與日期時間錯誤的 Big5 編碼
+NO_DATA_BIG5 = '查無資料'.encode('big5')
+DATE_ERROR_BIG5 = '日期時間錯誤'.encode('big5')
+
+# 串流下載 CSV 時每批交給 pd.read_csv 解析的字元數
+CSV_BATCH_CHARS = 1024 * 1024
+
+# 並行 HTML/CSV 路徑各自的 HTTP 逾時秒數，也是等待兩條路徑的總時間上限
+HEDGE_PATH_TIMEOUT = 20
+
+# 轉換欄位名稱為英文，與原本模型對應
+columns_mapping = {
+    '日期': 'Date',
+    '身份別': 'InvestorType',
+    '多方交易口數': 'LongTradeVolume',
+    '多方交易契約金額(千元)': 'LongTradeValue',
+    '空方交易口數': 'ShortTradeVolume',
+    '空方交易契約金額(千元)': 'ShortTradeValue',
+    '多空交易口數淨額': 'NetTradeVolume',
+    '多空交易契約金額淨額(千元)': 'NetTradeValue',
+    '多方未平倉口數': 'LongOIVolume',
+    '多方未平倉契約金額(千元)': 'LongOIValue',
+    '空方未平倉口數': 'ShortOIVolume',
+    '空方未平倉契約金額(千元)': 'ShortOIValue',
+    '多空未平倉口數淨額': 'NetOIVolume',
+    '多空未平倉契約金額淨額(千元)': 'NetOIValue',
+    '契約': 'Contract'
+}
+
+# CSV 下載端點以「商品名稱」表示契約，其餘欄位名稱與 HTML 表格相同
+csv_columns_mapping = dict(columns_mapping, **{'商品名稱': 'Contract'})
+
+# 口數與金額(千元)欄位皆為整數
+INT_COLUMNS = [
+    'LongTradeVolume', 'LongTradeValue', 'ShortTradeVolume', 'ShortTradeValue',
+    'NetTradeVolume', 'NetTradeValue', 'LongOIVolume', 'LongOIValue',
+    'ShortOIVolume', 'ShortOIValue', 'NetOIVolume', 'NetOIValue'
+]
+
+# 有效結果必須包含的欄位
+REQUIRED_COLUMNS = ['Date', 'InvestorType'] + INT_COLUMNS
+
+# 主要契約的商品名稱 (小型臺指在 HTML 與 CSV 中的名稱可能不同)
+TX_CONTRACT = '臺股期貨'
+MTX_CONTRACTS = ('小型臺指期貨', '小型臺指')
+
+def _query_form(start_date=None, end_date=None):
+    """
+    準備請求參數，模仿原始 TaifexScraper 中的參數設置
+    未指定日期時使用當天日期
+    """
+    # 取得當天日期（台北時間）作為查詢參數
+    today = taipei_today().strftime('%Y/%m/%d')
+    start = start_date.strftime('%Y/%m/%d') if start_date else today
+    end = (end_date or start_date).strftime('%Y/%m/%d') if start_date else today
+    return {
+        'queryStartDate': start,
+        'queryEndDate': end,
+        'commodityId': '' # 空白表示全部契約，一次下載即涵蓋臺股期貨、小型臺指等所有契約
+    }
+
+def fetch_institutional_html(timeout=None, cancel_scope=None):
+    """
+    以條件式請求向期交所請求三大法人期貨頁面，回傳 (原始 HTML 位元組, validators)；
+    內容與上次相同時拋出 NotModified，cancel_scope (taifex_http.CancelScope) 取消時拋出 Cancelled
+    """
+    from taifex_http import fetch_if_changed
+    
+    # 頁面預設顯示最新交易日的資料，以不帶參數的 GET 取得 (日期區間查詢使用 CSV 端點)
+    logger.info(f'正在請求最新資料，URL: {HTML_URL}')
+    
+    # 透過共用連線取得原始 HTML，並保存到原始回應快取
+    with get_report().stage('institutional', 'fetch'):
+        content, validators = fetch_if_changed(
+            'institutional', 'GET', HTML_URL, timeout=timeout, cancel_scope=cancel_scope
+        )
+    get_report().count('institutional', 'bytes_downloaded', len(content))
+    store_raw('institutional', 'html', content, taipei_today())
+    return content, validators
+
+def parse_institutional_html(content):
+    """
+    解析三大法人期貨頁面，回傳所有契約的字典列表；找不到資料表時回傳 None
+    """
+    from taifex_normalize import normalize_frame, to_records
+    from taifex_table_extractor import INSTITUTIONAL_LAYOUT, extract_table
+    
+    # 以 XPath 直接擷取資料表，版型不符時才退回 pd.read_html (解碼由 lxml 在解析時完成)
+    with get_report().stage('institutional', 'parse'):
+        df = extract_table(content, INSTITUTIONAL_LAYOUT)
+    
+    if df is None:
+        logger.error('未找到資料表')
+        return None
+    
+    get_report().count('institutional', 'rows_parsed', len(df))
+    logger.info(f'成功讀取表格，共 {len(df)} 筆資料')
+    
+    # 顯示表格的列名，以便診斷
+    logger.info(f'表格欄位: {df.columns.tolist()}')
+    
+    # 檢查列名是否在表格中
+    for ch_col, en_col in columns_mapping.items():
+        if ch_col not in df.columns:
+            logger.warning(f'欄位 {ch_col} 不在表格中')
+    
+    # 重命名欄位 (只重命名存在的欄位)
+    for ch_col, en_col in columns_mapping.items():
+        if ch_col in df.columns:
+            df = df.rename(columns={ch_col: en_col})
+    
+    # 標準化商品名稱
+    if 'Contract' in df.columns:
+        df['ContractName'] = df['Contract'].astype('string').str.split(' ').str[0].astype(object)
+    
+    # 整欄轉換日期（民國年轉西元年）與口數、金額欄位（移除千分位逗號）
+    with get_report().stage('institutional', 'normalize'):
+        df = normalize_frame(df, int_columns=INT_COLUMNS)
+    
+    # 保留所有契約，歷史資料集依契約分區保存，之後查詢單一契約不需重新下載
+    if 'ContractName' in df.columns:
+        contracts = df['ContractName'].dropna().unique().tolist()
+        logger.info(f'共 {len(contracts)} 種契約: {contracts}')
+        if TX_CONTRACT not in contracts:
+            logger.warning(f'找不到{TX_CONTRACT}資料')
+    
+    # 將 DataFrame 轉換為字典列表，數值欄位保留為數字
+    with get_report().stage('institutional', 'normalize'):
+        data = to_records(df)
+    
+    # 打印前 3 筆資料以便於檢查格式
+    logger.info("抽樣資料（前3筆）:")
+    for i, row in enumerate(data[:3]):
+        logger.info(f"資料 {i+1}: {row}")
+    
+    return data
+
+def save_institutional(data, source='html', validators=None, **manifest_extra):
+    """
+    將解析結果附加到歷史資料集，並保存最新資料 JSON，回傳最新資料檔案路徑
+    source 記錄資料來自 HTML 表格或 CSV 下載，validators 為取得這份資料的條件式請求 validators
+    """
+    from taifex_history_store import HISTORY_DIR, append_history
+    
+    # 確保目錄存在
+    os.makedirs('data', exist_ok=True)
+    
+    report = get_report()
+    with report.stage('institutional', 'serialize'):
+        # 依 TAIFEX_OUTPUT_FORMATS 產生 *_latest.json 與其他格式的輸出
+        outputs = serialize_outputs(data, LATEST_FILE, dataset='institutional')
+    
+    with report.stage('institutional', 'write'):
+        # 附加到依年/月分區的歷史資料集，取代每次執行產生的時間戳 JSON
+        append_history('institutional', data)
+        
+        # 同時保存最新的檔案（固定名稱）供直接讀取，以原子替換避免讀取端讀到寫到一半的檔案
+        for path, payload in outputs:
+            atomic_write(path, payload)
+        
+        # 更新新鮮度清單
+        write_manifest('institutional', data, validators=validators, source=source, **manifest_extra)
+    report.count('institutional', 'rows_written', len(data))
+    
+    logger.info(f'數據已保存至 {HISTORY_DIR}/institutional 和 {LATEST_FILE}')
+    return LATEST_FILE
+
+def skip_unchanged(dataset='institutional', latest_file=LATEST_FILE, validators=None):
+    """
+    期交所回應與上次相同：略過解析與寫入，只在清單標記未變更，回傳既有的最新資料檔案路徑
+    dataset 為 institutional_csv 時處理 CSV 下載輸出自己的清單
+    """
+    get_report().count('institutional', 'not_modified')
+    mark_unchanged(dataset, validators)
+    return latest_file
+
 def crawl_institutional_data():
     """
     爬取三大法人期貨淨部位資料
     參考原始 TaifexScraper.fetchFuturesInstitutional 方法
     """
+    from taifex_http import NotModified
+    
     logger.info('開始爬取三大法人期貨淨部位資料')
     
     try:
-        # 取得當天日期作為查詢參數
-        today = datetime.now().strftime('%Y/%m/%d')
-        
-        # 準備請求參數，模仿原始 TaifexScraper 中的參數設置
-        form_data = {
-            'queryStartDate': today,
-            'queryEndDate': today,
-            'commodityId': 'TXF' # 台指期貨
-        }
-        
-        # 直接發送請求獲取資料，使用與原始 TaifexScraper 相似的方式
-        url = 'https://www.taifex.com.tw/cht/3/futContractsDateExcel'
-        logger.info(f'正在請求資料，URL: {url}, 參數: {form_data}')
-        
-        # 使用 pandas 的 read_html 函數讀取 HTML 表格
-        tables = pd.read_html(url, encoding='utf-8')
-        
-        # 取得主要資料表
-        if len(tables) > 0:
-            df = tables[0]
-            logger.info(f'成功讀取表格，共 {len(df)} 筆資料')
-            
-            # 顯示表格的列名，以便診斷
-            logger.info(f'表格欄位: {df.columns.tolist()}')
-            
-            # 轉換欄位名稱為英文，與原本模型對應
-            columns_mapping = {
-                '日期': 'Date',
-                '身份別': 'InvestorType',
-                '多方交易口數': 'LongTradeVolume',
-                '多方交易契約金額(千元)': 'LongTradeValue',
-                '空方交易口數': 'ShortTradeVolume',
-                '空方交易契約金額(千元)': 'ShortTradeValue',
-                '多空交易口數淨額': 'NetTradeVolume',
-                '多空交易契約金額淨額(千元)': 'NetTradeValue',
-                '多方未平倉口數': 'LongOIVolume',
-                '多方未平倉契約金額(千元)': 'LongOIValue',
-                '空方未平倉口數': 'ShortOIVolume',
-                '空方未平倉契約金額(千元)': 'ShortOIValue',
-                '多空未平倉口數淨額': 'NetOIVolume',
-                '多空未平倉契約金額淨額(千元)': 'NetOIValue',
-                '契約': 'Contract'
-            }
-            
-            # 檢查列名是否在表格中
-            for ch_col, en_col in columns_mapping.items():
-                if ch_col not in df.columns:
-                    logger.warning(f'欄位 {ch_col} 不在表格中')
-            
-            # 重命名欄位 (只重命名存在的欄位)
-            for ch_col, en_col in columns_mapping.items():
-                if ch_col in df.columns:
-                    df = df.rename(columns={ch_col: en_col})
-            
-            # 標準化商品名稱
-            if 'Contract' in df.columns:
-                df['ContractName'] = df['Contract'].apply(lambda x: x.split(' ')[0] if isinstance(x, str) else x)
-            
-            # 過濾出台指期貨數據
-            tx_df = df[df['ContractName'] == '臺股期貨']
-            
-            if len(tx_df) > 0:
-                logger.info(f'找到臺股期貨資料，共 {len(tx_df)} 筆')
-            else:
-                logger.warning('找不到臺股期貨資料')
-                # 檢查所有不同的商品類型
-                if 'ContractName' in df.columns:
-                    unique_contracts = df['ContractName'].unique()
-                    logger.info(f'可用的商品類型: {unique_contracts}')
-                    # 若找不到臺股期貨，使用原始 DataFrame
-                    tx_df = df
-            
-            # 將 DataFrame 轉換為字典列表
-            data = tx_df.to_dict('records')
-            
-            # 日期格式轉換（處理中華民國年份格式）
-            for item in data:
-                if 'Date' in item and isinstance(item['Date'], str) and '/' in item['Date']:
-                    date_parts = item['Date'].split('/')
-                    if len(date_parts) == 3:
-                        try:
-                            roc_year = int(date_parts[0])
-                            # 中華民國年份轉西元年
-                            if roc_year < 1911:
-                                western_year = roc_year + 1911
-                                item['Date'] = f"{western_year}/{date_parts[1]}/{date_parts[2]}"
-                        except ValueError:
-                            logger.warning(f"無法解析日期: {item['Date']}")
-                
-                # 確保數值欄位正確處理
-                for key in ['LongTradeVolume', 'ShortTradeVolume', 'NetTradeVolume', 
-                           'LongOIVolume', 'ShortOIVolume', 'NetOIVolume']:
-                    if key in item and isinstance(item[key], str):
-                        try:
-                            # 刪除千分位逗號
-                            item[key] = item[key].replace(',', '')
-                        except AttributeError:
-                            # 如果不是字串，保持原值
-                            pass
-                
-                # 處理金額欄位
-                for key in ['LongTradeValue', 'ShortTradeValue', 'NetTradeValue',
-                           'LongOIValue', 'ShortOIValue', 'NetOIValue']:
-                    if key in item and isinstance(item[key], str):
-                        try:
-                            # 刪除千分位逗號
-                            item[key] = item[key].replace(',', '')
-                        except AttributeError:
-                            # 如果不是字串，保持原值
-                            pass
-            
-            # 打印前 3 筆資料以便於檢查格式
-            logger.info("抽樣資料（前3筆）:")
-            for i, row in enumerate(data[:3]):
-                logger.info(f"資料 {i+1}: {row}")
-            
-            # 生成時間戳作為檔案名的一部分
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            
-            # 確保目錄存在
-            os.makedirs('data', exist_ok=True)
-            
-            # 將數據保存為 JSON
-            output_file = f'data/institutional_{timestamp}.json'
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 同時保存最新的檔案（固定名稱）供直接讀取
-            latest_file = 'data/institutional_latest.json'
-            with open(latest_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f'數據已保存至 {output_file} 和 {latest_file}')
-            return output_file
-        else:
-            logger.error('未找到資料表')
+        try:
+            content, validators = fetch_institutional_html()
+        except NotModified:
+            return skip_unchanged()
+        data = parse_institutional_html(content)
+        if data is None:
             return None
+        return save_institutional(data, validators=validators)
     except Exception as e:
         logger.error(f'爬取資料時發生錯誤: {str(e)}')
         import traceback
         logger.error(traceback.format_exc())
         return None
 
+def fetch_institutional_csv(start_date=None, end_date=None, manifest_dataset='institutional', timeout=None,
+                            cancel_scope=None):
+    """
+    向期交所請求 CSV 格式的三大法人資料，回傳 (原始位元組, validators)
+    CSV 端點接受日期區間 (單次最多一個月)，未指定日期時以條件式請求查詢當天，內容與上次相同時拋出 NotModified；
+    指定日期區間時不使用條件式請求，validators 為 None
+    manifest_dataset 為讀取前次 validators 的清單 (CSV 單獨下載時為 institutional_csv)；
+    cancel_scope (taifex_http.CancelScope) 取消時拋出 Cancelled
+    """
+    from taifex_http import fetch_if_changed, get_client
+    
+    form_data = _query_form(start_date, end_date)
+    logger.info(f'正在請求 CSV 資料，URL: {CSV_URL}, 參數: {form_data}')
+    
+    # 透過共用連線發送請求，HTML 失敗後的備援請求可重用同一條連線
+    with get_report().stage('institutional', 'fetch'):
+        if start_date is None:
+            content, validators = fetch_if_changed(
+                manifest_dataset, 'POST', CSV_URL, data=form_data, timeout=timeout, cancel_scope=cancel_scope
+            )
+        else:
+            content, validators = get_client().post(CSV_URL, data=form_data, timeout=timeout), None
+    get_report().count('institutional', 'bytes_downloaded', len(content))
+    
+    # 保存到原始回應快取，相同內容只保存一份
+    store_raw('institutional', 'csv', content, start_date or taipei_today(), end_date)
+    return content, validators
+
+def _is_error_response(content):
+    """檢查回應是否為查無資料或日期時間錯誤的訊息"""
+    if NO_DATA_BIG5 in content:
+        logger.warning('期交所回應查無資料')
+        return True
+    if DATE_ERROR_BIG5 in content:
+        logger.warning('期交所回應日期時間錯誤')
+        return True
+    return False
+
+def _normalize_csv_frame(df):
+    """轉換 CSV 欄位名稱為英文並整欄標準化，輸出格式與 HTML 表格一致"""
+    from taifex_normalize import normalize_frame
+    
+    df.columns = [str(column).strip() for column in df.columns]
+    df = df.rename(columns=csv_columns_mapping)
+    if 'Contract' in df.columns:
+        df['Contract'] = df['Contract'].astype('string').str.strip().astype(object)
+        df['ContractName'] = df['Contract'].astype('string').str.split(' ').str[0].astype(object)
+    if 'InvestorType' in df.columns:
+        df['InvestorType'] = df['InvestorType'].astype('string').str.strip().astype(object)
+    return normalize_frame(df, int_columns=INT_COLUMNS)
+
+def parse_institutional_csv(content):
+    """
+    解析 Big5 編碼的 CSV 內容，回傳 (字典列表, CSV 文字)；期交所回應錯誤訊息時回傳 (None, None)
+    """
+    import pandas as pd
+    from taifex_normalize import to_records
+    
+    if _is_error_response(content):
+        return None, None
+    
+    report = get_report()
+    with report.stage('institutional', 'decode'):
+        # 解碼為 Big5 編碼的文本
+        csv_content = content.decode('big5', errors='ignore')
+    
+    with report.stage('institutional', 'parse'):
+        # 使用 pandas 讀取 CSV 內容
+        df = pd.read_csv(io.StringIO(csv_content))
+    report.count('institutional', 'rows_parsed', len(df))
+    
+    # 顯示表格的列名
+    logger.info(f'CSV 欄位: {df.columns.tolist()}')
+    
+    with report.stage('institutional', 'normalize'):
+        # 將 DataFrame 轉換為字典列表，數值欄位保留為數字
+        data = to_records(_normalize_csv_frame(df))
+    
+    # 打印前 3 筆資料以便於檢查格式
+    logger.info("CSV 抽樣資料（前3筆）:")
+    for i, row in enumerate(data[:3]):
+        logger.info(f"資料 {i+1}: {row}")
+    
+    return data, csv_content
+
+def _parse_csv_batch(header, block):
+    """解析一批完整的 CSV 行 (不含表頭)，回傳字典列表"""
+    import pandas as pd
+    from taifex_normalize import to_records
+    
+    report = get_report()
+    with report.stage('institutional', 'parse'):
+        df = pd.read_csv(io.StringIO(header + block))
+    report.count('institutional', 'rows_parsed', len(df))
+    with report.stage('institutional', 'normalize'):
+        return to_records(_normalize_csv_frame(df))
+
+def stream_institutional_csv(start_date, end_date=None, batch_chars=CSV_BATCH_CHARS):
+    """
+    以串流方式下載並解析日期區間的 CSV，適用於多月份的大範圍查詢
+    回應逐段寫入原始回應快取，同時以增量 Big5 解碼器解碼，累積到 batch_chars 個字元就在最後一個換行處切開
+    交給 pd.read_csv 解析；記憶體中只保留一批文字與解析後的資料，不會同時存在整份回應的位元組與文字副本
+    
+    Returns:
+        list: 字典列表；期交所回應錯誤訊息時回傳 None
+    """
+    import codecs
+    from taifex_http import get_client
+    from taifex_raw_cache import RawWriter
+    
+    form_data = _query_form(start_date, end_date)
+    logger.info(f'正在串流下載 CSV 資料，URL: {CSV_URL}, 參數: {form_data}')
+    
+    report = get_report()
+    decoder = codecs.getincrementaldecoder('big5')(errors='ignore')
+    header = None
+    pending = ''
+    data = []
+    failed = False
+    
+    with get_client().stream('POST', CSV_URL, data=form_data) as chunks, \
+            RawWriter('institutional', 'csv', start_date, end_date) as raw:
+        iterator = iter(chunks)
+        while True:
+            with report.stage('institutional', 'fetch'):
+                chunk = next(iterator, None)
+            if chunk is None:
+                break
+            raw.write(chunk)
+            report.count('institutional', 'bytes_downloaded', len(chunk))
+            
+            # 錯誤訊息頁面很小，只需檢查第一段；之後仍讀完回應，讓原始回應快取保存完整內容
+            if failed or (header is None and not pending and _is_error_response(chunk)):
+                failed = True
+                continue
+            
+            with report.stage('institutional', 'decode'):
+                pending += decoder.decode(chunk)
+            if header is None:
+                newline = pending.find('\n')
+                if newline < 0:
+                    continue
+                header, pending = pending[:newline + 1], pending[newline + 1:]
+            if len(pending) >= batch_chars:
+                cut = pending.rfind('\n') + 1
+                if cut > 0:
+                    data.extend(_parse_csv_batch(header, pending[:cut]))
+                    pending = pending[cut:]
+    
+    if failed:
+        return None
+    with report.stage('institutional', 'decode'):
+        pending += decoder.decode(b'', final=True)
+    if header is not None and pending.strip():
+        data.extend(_parse_csv_batch(header, pending))
+    logger.info(f'串流解析完成，共 {len(data)} 筆，下載 {raw.size} bytes')
+    return data
+
+def save_institutional_csv(data, validators=None):
+    """
+    將 CSV 解析結果附加到歷史資料集，並保存最新 JSON，回傳 JSON 輸出檔案路徑
+    原始 CSV 內容已由原始回應快取保存
+    """
+    from taifex_history_store import HISTORY_DIR, append_history
+    
+    # 確保目錄存在
+    os.makedirs('data', exist_ok=True)
+    
+    report = get_report()
+    output_file = CSV_LATEST_FILE
+    with report.stage('institutional', 'serialize'):
+        outputs = serialize_outputs(data, output_file, dataset='institutional')
+    
+    with report.stage('institutional', 'write'):
+        # 附加到依年/月分區的歷史資料集
+        append_history('institutional', data)
+        
+        # 將數據保存為 JSON（固定名稱）及其他設定的格式
+        for path, payload in outputs:
+            atomic_write(path, payload)
+        
+        # CSV 輸出有自己的清單，不影響 institutional_latest.json 的新鮮度判斷
+        write_manifest('institutional_csv', data, validators=validators, source='csv')
+    report.count('institutional', 'rows_written', len(data))
+    
+    logger.info(f'CSV 資料已保存至 {HISTORY_DIR}/institutional 和 {output_file}')
+    return output_file
+
 # 嘗試下載 CSV 格式的資料
 def download_csv_data():
     """
     嘗試直接下載 CSV 資料
     參考原始 TaifexScraper 使用 csvtojson 的方式
     """
+    from taifex_http import NotModified
+    
     logger.info('嘗試直接下載 CSV 格式的三大法人期貨淨部位資料')
     
     try:
-        # 取得當天日期作為查詢參數
-        today = datetime.now().strftime('%Y/%m/%d')
-        
-        # 準備請求參數，模仿原始 TaifexScraper 中的下載 CSV 的方式
-        form_data = {
-            'queryStartDate': today,
-            'queryEndDate': today,
-            'commodityId': 'TXF'  # 台指期貨
-        }
-        
-        # 發送請求獲取 CSV 資料
-        url = 'https://www.taifex.com.tw/cht/3/futContractsDateDown'
-        logger.info(f'正在請求 CSV 資料，URL: {url}, 參數: {form_data}')
-        
-        response = requests.post(url, data=form_data)
-        response.raise_for_status()
-        
-        # 檢查回應是否包含查無資料的訊息
-        if b'\xb7j\xb5L\xb8\xea\xae\xc6' in response.content:  # 查無資料的 Big5 編碼
-            logger.warning('期交所回應查無資料')
-            return None
-        
-        if b'\xa6\xdc\xb8\xb9\xae\xc9\xb6\xa1\xc3\xf8\xbf\xf2' in response.content:  # 日期時間錯誤的 Big5 編碼
-            logger.warning('期交所回應日期時間錯誤')
+        try:
+            content, validators = fetch_institutional_csv(manifest_dataset='institutional_csv')
+        except NotModified:
+            return skip_unchanged('institutional_csv', CSV_LATEST_FILE)
+        data, _ = parse_institutional_csv(content)
+        if data is None:
             return None
-        
-        # 解碼為 Big5 編碼的文本
-        csv_content = response.content.decode('big5', errors='ignore')
-        
-        # 使用 pandas 讀取 CSV 內容
-        df = pd.read_csv(io.StringIO(csv_content))
-        
-        # 顯示表格的列名
-        logger.info(f'CSV 欄位: {df.columns.tolist()}')
-        
-        # 將 DataFrame 轉換為字典列表
-        data = df.to_dict('records')
-        
-        # 打印前 3 筆資料以便於檢查格式
-        logger.info("CSV 抽樣資料（前3筆）:")
-        for i, row in enumerate(data[:3]):
-            logger.info(f"資料 {i+1}: {row}")
-        
-        # 生成時間戳作為檔案名的一部分
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        
-        # 確保目錄存在
-        os.makedirs('data', exist_ok=True)
-        
-        # 將數據保存為 JSON
-        output_file = f'data/institutional_csv_{timestamp}.json'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # 同時保存 CSV 原始內容，以便分析問題
-        csv_file = f'data/institutional_raw_{timestamp}.csv'
-        with open(csv_file, 'w', encoding='utf-8') as f:
-            f.write(csv_content)
-        
-        logger.info(f'CSV 資料已保存至 {output_file} 和 {csv_file}')
-        return output_file
+        return save_institutional_csv(data, validators)
     except Exception as e:
         logger.error(f'下載 CSV 資料時發生錯誤: {str(e)}')
         import traceback
         logger.error(traceback.format_exc())
         return None
 
+def is_valid_result(data):
+    """
+    檢查解析結果是否有資料且包含所有預期欄位
+    """
+    if not data:
+        return False
+    missing = [column for column in REQUIRED_COLUMNS if column not in data[0]]
+    if missing:
+        logger.warning(f'解析結果缺少欄位: {missing}')
+        return False
+    return True
+
+def _html_path(cancel_scope):
+    """HTML 表格路徑：下載完成且尚未被取消才解析，回傳 (字典列表, validators)"""
+    content, validators = fetch_institutional_html(timeout=HEDGE_PATH_TIMEOUT, cancel_scope=cancel_scope)
+    cancel_scope.check()
+    return parse_institutional_html(content), validators
+
+def _csv_path(cancel_scope):
+    """CSV 下載路徑：下載完成且尚未被取消才解析，回傳 (字典列表, validators)"""
+    content, validators = fetch_institutional_csv(timeout=HEDGE_PATH_TIMEOUT, cancel_scope=cancel_scope)
+    cancel_scope.check()
+    data, _ = parse_institutional_csv(content)
+    return data, validators
+
+def hedged_fetch(timeout=HEDGE_PATH_TIMEOUT):
+    """
+    同時啟動 HTML 表格與 CSV 下載兩條路徑，採用第一個通過欄位驗證的結果
+    兩條路徑在 daemon 執行緒中執行，勝出後立即取消落後的路徑：關閉其下載中的回應，已下載完成的也不再解析
+    
+    每條路徑各自記錄執行報告，只有勝出者的階段耗時與計數器併入本次執行的報告；
+    各路徑的耗時與結果記錄在報告的 hedgePaths 資訊
+    
+    Returns:
+        tuple: (勝出的路徑 html/csv, 字典列表, validators)；兩條路徑都失敗時回傳 (None, None, None)
+               validators 包含勝出路徑的，以及在勝出前已回應未變更的路徑的
+    
+    Raises:
+        NotModified: 沒有路徑取得有效資料，且至少一條路徑的回應與上次相同
+    """
+    from taifex_http import CancelScope, Cancelled, NotModified
+    from taifex_manifest import request_validators
+    
+    cancel_scope = CancelScope()
+    results = queue.Queue()
+    not_modified = None
+    unchanged_validators = {}
+    outcomes = {}
+    paths = {'html': _html_path, 'csv': _csv_path}
+    
+    def run(source, path):
+        report = RunReport()
+        started = time.perf_counter()
+        try:
+            with use_report(report):
+                data, validators = path(cancel_scope)
+            results.put((source, data, validators, None, report, time.perf_counter() - started))
+        except Exception as e:
+            results.put((source, None, None, e, report, time.perf_counter() - started))
+    
+    for source, path in paths.items():
+        threading.Thread(target=run, args=(source, path), name=f'hedged-{source}', daemon=True).start()
+    
+    shared_report = get_report()
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        for _ in paths:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                source, data, validators, error, report, seconds = results.get(timeout=remaining)
+            except queue.Empty:
+                logger.error(f'兩條路徑皆未在 {timeout} 秒內取得有效資料')
+                break
+            outcome = {'seconds': round(seconds, 6)}
+            outcomes[source] = outcome
+            if isinstance(error, NotModified):
+                logger.info(f'{source} 路徑內容未變更')
+                outcome['result'] = 'not_modified'
+                not_modified = error
+                unchanged_validators.update(request_validators(error.key, error.validators))
+                continue
+            if isinstance(error, Cancelled):
+                outcome['result'] = 'cancelled'
+                continue
+            if error is not None:
+                logger.warning(f'{source} 路徑失敗: {str(error)}')
+                outcome['result'] = 'failed'
+                continue
+            if is_valid_result(data):
+                logger.info(f'{source} 路徑先取得有效資料，共 {len(data)} 筆')
+                cancel_scope.cancel()
+                outcome['result'] = 'won'
+                shared_report.merge(report)
+                shared_report.set_info('institutional', 'source', source)
+                return source, data, {**unchanged_validators, **validators}
+            logger.warning(f'{source} 路徑的結果未通過驗證')
+            outcome['result'] = 'invalid'
+    finally:
+        cancel_scope.cancel()
+        shared_report.set_info('institutional', 'hedgePaths', outcomes)
+    if not_modified is not None:
+        raise not_modified
+    return None, None, None
+
+def crawl_hedged():
+    """
+    以並行的 HTML/CSV 路徑爬取三大法人期貨淨部位資料，回傳最新資料檔案路徑；失敗時回傳 None
+    """
+    from taifex_http import NotModified
+    
+    logger.info('開始並行爬取三大法人期貨淨部位資料 (HTML 與 CSV)')
+    
+    try:
+        try:
+            source, data, validators = hedged_fetch()
+        except NotModified:
+            return skip_unchanged()
+        if data is None:
+            return None
+        # 另一條路徑先前沒有 validators 時會完整下載，內容與已保存的資料相同則只記錄其 validators
+        if content_hash(data) == (read_manifest('institutional') or {}).get('contentHash'):
+            return skip_unchanged(validators=validators)
+        return save_institutional(data, source=source, validators=validators, fetchMode='hedged')
+    except Exception as e:
+        logger.error(f'爬取資料時發生錯誤: {str(e)}')
+        import traceback
+        logger.error(traceback.format_exc())
+        return None
+
+# 檢查既有資料是否已是今日資料
+def is_data_fresh():
+    """
+    讀取資料清單，若最新資料日期為今天（台北時間）則回傳 True
+    """
+    return is_fresh('institutional')
+
 # 檢查之前的資料並決定是否進行爬蟲
 def check_and_crawl():
     """
     檢查既有資料，如果沒有資料或資料過期，則進行爬蟲
     """
-    need_crawl = True
+    if is_data_fresh():
+        return LATEST_FILE
     
-    # 檢查最新數據文件是否存在
-    latest_file = 'data/institutional_latest.json'
-    if os.path.exists(latest_file):
-        try:
-            # 讀取最新數據
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if data and len(data) > 0:
-                # 尋找最新日期
-                latest_date = None
-                for item in data:
-                    if 'Date' in item and item['Date']:
-                        if latest_date is None or item['Date'] > latest_date:
-                            latest_date = item['Date']
-                
-                if latest_date:
-                    today = datetime.now().strftime('%Y/%m/%d')
-                    
-                    logger.info(f'既有資料日期: {latest_date}, 今日日期: {today}')
-                    
-                    # 如果最新資料日期是今天，則不需要爬蟲
-                    if latest_date == today:
-                        logger.info(f'已有今日 ({today}) 的資料，不需要重新爬取')
-                        need_crawl = False
-                    else:
-                        logger.info(f'最新資料日期 ({latest_date}) 不是今天 ({today})，將重新爬取')
-                else:
-                    logger.warning('無法從既有資料中找到日期')
-        except Exception as e:
-            logger.error(f'檢查既有資料時發生錯誤: {str(e)}')
-    else:
-        logger.info('找不到既有資料，將進行首次爬取')
-    
-    # 如果需要爬蟲，執行爬蟲
-    if need_crawl:
-        # 優先使用 HTML 表格爬取方式
-        result = crawl_institutional_data()
-        if result is None:
-            # 如果 HTML 表格爬取失敗，嘗試直接下載 CSV
-            logger.info('HTML 表格爬取失敗，嘗試直接下載 CSV 資料')
-            result = download_csv_data()
-        return result
-    return latest_file
+    # 同時嘗試 HTML 表格與 CSV 下載，避免 HTML 端點緩慢時拖累整體時間
+    return crawl_hedged()
 
 if __name__ == '__main__':
-    output_file = check_and_crawl()
+    if is_data_fresh():
+        # 快速路徑：不匯入任何爬取與解析模組
+        output_file = LATEST_FILE
+    else:
+        from taifex_http import get_client
+        output_file = crawl_hedged()
+        get_client().log_stats()
+        get_report().write()
     if output_file:
         logger.info(f'爬蟲程序完成，數據已保存至 {output_file}')
         print(f'RESULT_FILE={output_file}')  # 輸出結果檔案路徑供 GitHub Actions 使用
@@ -0,0 +1,390 @@
+"""
+可續傳的歷史回補工作佇列
+將 (資料集, 日期視窗) 工作保存在 data/backfill_jobs.sqlite，每個視窗下載完成後立即寫入歷史資料集並標記完成，
+程序中斷或 CI 逾時後再次執行會從尚未完成的視窗繼續，不必重新下載整段區間
+
+工作狀態: pending → running → done；下載失敗時回到 pending，嘗試次數達上限後為 failed
+running 的工作超過租約時間 (--lease) 仍未完成，視為執行中的程序已中斷，重新排入 pending
+
+用法:
+    python taifex_job_queue.py enqueue --from 2015-01-01 --to today
+    python taifex_job_queue.py run --workers 4 --max-seconds 3000
+    python taifex_job_queue.py status
+    python taifex_job_queue.py retry-failed
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from taifex_run_report import get_report
+
+logger = logging.getLogger('taifex_job_queue')
+
+# 工作佇列資料庫
+QUEUE_FILE = 'data/backfill_jobs.sqlite'
+
+# 單一視窗的最大嘗試次數
+MAX_ATTEMPTS = 3
+
+# running 工作的租約秒數，超過視為執行中的程序已中斷
+LEASE_SECONDS = 600
+
+STATES = ('pending', 'running', 'done', 'failed')
+
+# UPDATE ... RETURNING 需要 SQLite 3.35 以上；較舊的 libsqlite3 (例如部分 Python 3.9 發行版) 改在同一交易中先查詢再更新
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    records INTEGER,
+    result_sha256 TEXT,
+    error TEXT,
+    claimed_at REAL,
+    finished_at REAL,
+    UNIQUE (dataset, start, end)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, dataset, start);
+"""
+
+
+def result_hash(records):
+    """視窗結果的 SHA-256，可用來比對重新下載的資料是否有變動"""
+    payload = json.dumps(records, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class JobQueue:
+    """
+    SQLite 工作佇列，同一程序的多個工作執行緒共用一個連線 (以鎖序列化存取)，
+    不同程序之間以 SQLite 的交易保證同一工作只會被取得一次
+    """
+
+    def __init__(self, path=QUEUE_FILE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, statements):
+        """在單一 IMMEDIATE 交易中執行 [(SQL, 參數)]，回傳最後一個敘述的結果列"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = []
+                for sql, params in statements:
+                    rows = self._conn.execute(sql, params).fetchall()
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _update(self, assignments, params, where, where_params, returning):
+        """
+        在單一 IMMEDIATE 交易中更新符合條件的工作，回傳更新後的 returning 欄位
+        不支援 RETURNING 的 SQLite 先選出符合條件的工作 id，更新後再讀回；交易期間其他程序無法寫入，結果相同
+        """
+        if SUPPORTS_RETURNING:
+            return self._transaction([(
+                f'UPDATE jobs SET {assignments} WHERE {where} RETURNING {returning}',
+                list(params) + list(where_params)
+            )])
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row['id'] for row in self._conn.execute(f'SELECT id FROM jobs WHERE {where}', list(where_params))]
+                rows = []
+                if ids:
+                    placeholders = ', '.join('?' for _ in ids)
+                    self._conn.execute(f'UPDATE jobs SET {assignments} WHERE id IN ({placeholders})', list(params) + ids)
+                    rows = self._conn.execute(
+                        f'SELECT {returning} FROM jobs WHERE id IN ({placeholders}) ORDER BY id', ids
+                    ).fetchall()
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def enqueue(self, dataset, windows):
+        """
+        加入視窗工作，已存在的 (資料集, 視窗) 不重複加入
+
+        Returns:
+            int: 新加入的工作數
+        """
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO jobs (dataset, start, end) VALUES (?, ?, ?)',
+                [(dataset, start.isoformat(), end.isoformat()) for start, end in windows]
+            )
+            self._conn.execute('COMMIT')
+            added = self._conn.total_changes - before
+        logger.info(f'{dataset} 加入 {added} 個視窗工作 (共 {len(windows)} 個視窗)')
+        return added
+
+    def recover(self, lease_seconds=LEASE_SECONDS):
+        """將租約過期的 running 工作重新排入 pending，回傳重新排入的工作數"""
+        rows = self._update("state = 'pending'", (), "state = 'running' AND claimed_at <= ?", (time.time() - lease_seconds,), 'id')
+        if rows:
+            logger.warning(f'{len(rows)} 個執行中的工作租約已過期，重新排入佇列')
+        return len(rows)
+
+    def claim(self, datasets=None):
+        """
+        取得下一個 pending 工作 (依資料集與起始日期排序) 並標記為 running
+
+        Returns:
+            dict: 工作內容，沒有待處理的工作時回傳 None
+        """
+        condition = ''
+        params = []
+        if datasets:
+            condition = f' AND dataset IN ({", ".join("?" for _ in datasets)})'
+            params = list(datasets)
+        rows = self._update(
+            "state = 'running', attempts = attempts + 1, claimed_at = ?, error = NULL", [time.time()],
+            f"id = (SELECT id FROM jobs WHERE state = 'pending'{condition} ORDER BY dataset, start LIMIT 1)", params,
+            'id, dataset, start, end, attempts'
+        )
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job['start'] = date.fromisoformat(job['start'])
+        job['end'] = date.fromisoformat(job['end'])
+        return job
+
+    def complete(self, job_id, records, sha256):
+        self._transaction([(
+            "UPDATE jobs SET state = 'done', records = ?, result_sha256 = ?, finished_at = ? WHERE id = ?",
+            (records, sha256, time.time(), job_id)
+        )])
+
+    def fail(self, job_id, error, max_attempts=MAX_ATTEMPTS):
+        """記錄失敗，嘗試次數未達上限時重新排入 pending；回傳工作的新狀態"""
+        rows = self._update(
+            "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?, finished_at = ?",
+            (max_attempts, error, time.time()), 'id = ?', (job_id,), 'state'
+        )
+        return rows[0]['state'] if rows else None
+
+    def retry_failed(self):
+        """將 failed 工作重設為 pending 並清除嘗試次數，回傳重設的工作數"""
+        rows = self._update("state = 'pending', attempts = 0", (), "state = 'failed'", (), 'id')
+        return len(rows)
+
+    def stats(self):
+        """
+        佇列進度統計
+
+        Returns:
+            dict: 各狀態的工作數、已完成的資料筆數、平均每個視窗的處理秒數
+        """
+        with self._lock:
+            counts = self._conn.execute(
+                'SELECT dataset, state, COUNT(*) AS jobs, COALESCE(SUM(records), 0) AS records '
+                'FROM jobs GROUP BY dataset, state'
+            ).fetchall()
+            timing = self._conn.execute(
+                "SELECT COUNT(*) AS jobs, AVG(finished_at - claimed_at) AS seconds FROM jobs WHERE state = 'done'"
+            ).fetchone()
+
+        datasets = {}
+        for row in counts:
+            entry = datasets.setdefault(row['dataset'], {state: 0 for state in STATES})
+            entry[row['state']] = row['jobs']
+            if row['state'] == 'done':
+                entry['records'] = row['records']
+        total = {state: sum(entry[state] for entry in datasets.values()) for state in STATES}
+        return {
+            'datasets': datasets,
+            'total': total,
+            'avgSecondsPerWindow': round(timing['seconds'], 3) if timing['seconds'] is not None else None
+        }
+
+
+def enqueue_range(queue, dataset, start_date, end_date):
+    """將日期區間依期交所查詢上限切成視窗後加入佇列"""
+    from taifex_backfill import DATASETS, split_windows
+
+    windows = split_windows(start_date, end_date, DATASETS[dataset]['window_months'])
+    return queue.enqueue(dataset, windows)
+
+
+class QueueRunner:
+    """
+    以工作執行緒池消化佇列：下載在各執行緒平行進行，寫入歷史資料集以單一鎖序列化
+    每個視窗寫入後才標記為 done，中斷時最多只需重新下載執行中的視窗
+    """
+
+    def __init__(self, queue, datasets=None, max_workers=4, max_seconds=None, max_attempts=MAX_ATTEMPTS):
+        self.queue = queue
+        self.datasets = datasets
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.done = 0
+        self.failed = 0
+        self.records = 0
+        self._started = None
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _out_of_time(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _run_job(self, job):
+        from taifex_backfill import DATASETS
+        from taifex_history_store import append_history
+
+        dataset = job['dataset']
+        records = DATASETS[dataset]['fetch'](job['start'], job['end'])
+        with self._write_lock:
+            if records:
+                append_history(dataset, records)
+        self.queue.complete(job['id'], len(records), result_hash(records))
+        return len(records)
+
+    def _worker(self):
+        report = get_report()
+        while not self._out_of_time():
+            job = self.queue.claim(self.datasets)
+            if job is None:
+                return
+            label = f'{job["dataset"]} {job["start"]} ~ {job["end"]}'
+            try:
+                count = self._run_job(job)
+            except Exception as e:
+                state = self.queue.fail(job['id'], str(e), self.max_attempts)
+                logger.error(f'{label} 第 {job["attempts"]} 次嘗試失敗 ({state}): {str(e)}')
+                logger.debug(traceback.format_exc())
+                report.count(job['dataset'], 'queue_failures')
+                if state == 'failed':
+                    with self._stats_lock:
+                        self.failed += 1
+                continue
+
+            report.count(job['dataset'], 'queue_windows')
+            with self._stats_lock:
+                self.done += 1
+                self.records += count
+                logger.info(f'{label} 完成，{count} 筆 ({self.progress()})')
+
+    def progress(self):
+        """本次執行的進度與吞吐量摘要"""
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        pending = self.queue.stats()['total']['pending']
+        rate = self.done / elapsed
+        eta = f'{pending / rate:.0f} 秒' if rate > 0 else '未知'
+        return (
+            f'本次完成 {self.done} 個視窗、{self.records} 筆，'
+            f'{rate * 60:.1f} 視窗/分、{self.records / elapsed:.0f} 筆/秒，剩餘 {pending} 個，預估 {eta}'
+        )
+
+    def run(self, lease_seconds=LEASE_SECONDS):
+        """
+        消化佇列直到沒有待處理的工作或超過時間上限
+
+        Returns:
+            dict: 本次執行的統計
+        """
+        self.queue.recover(lease_seconds)
+        self._started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='queue') as executor:
+            for future in [executor.submit(self._worker) for _ in range(self.max_workers)]:
+                future.result()
+
+        elapsed = time.monotonic() - self._started
+        if self._out_of_time():
+            logger.warning('已達執行時間上限，未完成的視窗保留在佇列中，下次執行時繼續')
+        logger.info(self.progress())
+        return {
+            'done': self.done,
+            'failed': self.failed,
+            'records': self.records,
+            'seconds': round(elapsed, 3),
+            'windowsPerMinute': round(self.done / elapsed * 60, 2) if elapsed > 0 else None,
+            'recordsPerSecond': round(self.records / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+def main(argv=None):
+    from taifex_backfill import DATASETS, parse_date
+    from taifex_manifest import taipei_today
+
+    parser = argparse.ArgumentParser(description='可續傳的期交所歷史回補工作佇列')
+    parser.add_argument('--queue', default=QUEUE_FILE, help='工作佇列資料庫路徑')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='將日期區間加入佇列')
+    enqueue_parser.add_argument('--from', dest='start', type=parse_date, required=True, help='起始日期 (YYYY-MM-DD)')
+    enqueue_parser.add_argument('--to', dest='end', type=parse_date, default=taipei_today(), help='結束日期 (YYYY-MM-DD 或 today)')
+    enqueue_parser.add_argument('--dataset', choices=['all'] + list(DATASETS), default='all', help='資料集')
+
+    run_parser = subparsers.add_parser('run', help='消化佇列')
+    run_parser.add_argument('--dataset', choices=['all'] + list(DATASETS), default='all', help='只處理指定資料集')
+    run_parser.add_argument('--workers', type=int, default=4, help='同時下載的視窗數')
+    run_parser.add_argument('--max-seconds', type=float, help='執行時間上限，超過後不再取得新工作 (配合 CI 逾時)')
+    run_parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='單一視窗的最大嘗試次數')
+    run_parser.add_argument('--lease', type=float, default=LEASE_SECONDS, help='running 工作的租約秒數')
+
+    subparsers.add_parser('status', help='顯示佇列進度')
+    subparsers.add_parser('retry-failed', help='將失敗的工作重新排入佇列')
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue)
+    try:
+        if args.command == 'enqueue':
+            if args.start > args.end:
+                parser.error('--from 不可晚於 --to')
+            datasets = list(DATASETS) if args.dataset == 'all' else [args.dataset]
+            for dataset in datasets:
+                enqueue_range(queue, dataset, args.start, args.end)
+        elif args.command == 'run':
+            from taifex_http import get_client
+            datasets = None if args.dataset == 'all' else [args.dataset]
+            runner = QueueRunner(queue, datasets, args.workers, args.max_seconds, args.max_attempts)
+            print(json.dumps(runner.run(args.lease), ensure_ascii=False, indent=2))
+            get_client().log_stats()
+            get_report().write()
+        elif args.command == 'retry-failed':
+            logger.info(f'重新排入 {queue.retry_failed()} 個失敗的工作')
+
+        stats = queue.stats()
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return 1 if stats['total']['failed'] else 0
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    exit(main())
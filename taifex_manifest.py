@@ -0,0 +1,164 @@
+"""
+期交所資料新鮮度清單 (manifest)
+每次爬取後寫入一個小型 JSON 清單，記錄資料集、最新交易日期、筆數、內容雜湊與抓取時間，
+新鮮度檢查只需讀取清單，不必載入整份資料
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from taifex_atomic import atomic_write_json
+
+logger = logging.getLogger('taifex_manifest')
+
+# 台灣不實施日光節約時間，固定為 UTC+8，不需依賴系統時區資料庫
+TAIPEI_TZ = timezone(timedelta(hours=8), 'Asia/Taipei')
+
+# 清單檔案路徑
+MANIFEST_TEMPLATE = 'data/{dataset}_manifest.json'
+
+def taipei_now():
+    """取得台北時間的現在時刻"""
+    return datetime.now(TAIPEI_TZ)
+
+
+def taipei_today():
+    """取得台北時間的今日日期，避免執行環境使用 UTC 造成日期錯判"""
+    return taipei_now().date()
+
+
+def manifest_path(dataset):
+    return MANIFEST_TEMPLATE.format(dataset=dataset)
+
+
+def latest_date_of(records):
+    """
+    找出資料中最新的日期，回傳 YYYY-MM-DD 格式；找不到時回傳 None
+    同時支援英文 (Date) 與 CSV 中文 (日期) 欄位名稱
+    """
+    latest_date = None
+    for item in records:
+        value = item.get('Date') or item.get('日期')
+        if not value:
+            continue
+        value = str(value).strip().replace('/', '-')
+        if latest_date is None or value > latest_date:
+            latest_date = value
+    return latest_date
+
+
+def content_hash(records):
+    """計算資料內容的 SHA-256 雜湊"""
+    payload = json.dumps(records, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def write_manifest(dataset, records, validators=None, **extra):
+    """
+    寫入資料集清單
+
+    Args:
+        validators: 本次爬取條件式請求的 {端點: validators} (request_validators 的結果)，
+                    只有資料來自條件式請求時才傳入；取代清單中原有的 validators
+
+    Returns:
+        dict: 寫入的清單內容
+    """
+    manifest = {
+        'dataset': dataset,
+        'latestDate': latest_date_of(records),
+        'rowCount': len(records),
+        'contentHash': content_hash(records),
+        'fetchedAt': taipei_now().isoformat(timespec='seconds'),
+        'changed': True
+    }
+    # 只有資料來自條件式請求時才記錄 validators；回補或重新解析寫入的資料與最新回應無關，
+    # 不保留舊的 validators，下次請求會完整下載
+    # 其他端點先前的 validators 對應的是被取代的舊資料，不予保留，否則該端點之後回應未變更會被誤判為資料未變更
+    if validators:
+        manifest['validators'] = validators
+    manifest.update(extra)
+
+    atomic_write_json(manifest_path(dataset), manifest)
+    logger.info(f"{dataset} 清單已更新，最新日期: {manifest['latestDate']}, 筆數: {manifest['rowCount']}")
+    return manifest
+
+
+def read_manifest(dataset):
+    """讀取資料集清單，不存在或損壞時回傳 None"""
+    path = manifest_path(dataset)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f'讀取清單 {path} 時發生錯誤: {str(e)}')
+        return None
+
+
+def is_fresh(dataset):
+    """
+    檢查資料集的最新資料日期是否為台北時間的今天
+    """
+    manifest = read_manifest(dataset)
+    if manifest is None:
+        logger.info(f'找不到 {dataset} 清單，將進行爬取')
+        return False
+
+    latest_date = manifest.get('latestDate')
+    today = taipei_today().isoformat()
+    logger.info(f'既有資料日期: {latest_date}, 今日日期: {today}')
+
+    # 如果最新資料日期是今天，則不需要爬蟲
+    if latest_date == today:
+        logger.info(f'已有今日 ({today}) 的資料，不需要重新爬取')
+        return True
+    logger.info(f'最新資料日期 ({latest_date}) 不是今天 ({today})，將重新爬取')
+    return False
+
+
+def _endpoint(key):
+    """請求識別鍵 (方法 網址 查詢參數) 中的端點部分 (方法 網址)"""
+    return ' '.join(key.split(' ', 2)[:2])
+
+
+def stored_validators(dataset, key):
+    """
+    取得清單中記錄的請求 validators，沒有記錄時回傳 None
+    每個端點只記錄最近一次請求，查詢參數不同 (例如 CSV 的查詢日期換日) 時視為沒有記錄
+    """
+    manifest = read_manifest(dataset) or {}
+    entry = manifest.get('validators', {}).get(_endpoint(key))
+    if not entry or entry.get('request') != key:
+        return None
+    return {name: value for name, value in entry.items() if name != 'request'}
+
+
+def request_validators(key, validators):
+    """
+    將一次條件式請求的 validators 轉為清單記錄的格式 {端點: {'request': 請求識別鍵, ...validators}}
+    由爬取流程保留，資料成功保存時連同資料一起傳給 write_manifest
+    """
+    return {_endpoint(key): {'request': key, **validators}}
+
+
+def mark_unchanged(dataset, validators=None):
+    """
+    期交所回應與上次相同時只更新清單的檢查時間，並標記 changed 為 false，
+    讓 import_taifex_data.js 略過導入
+    validators 為本次確認內容未變更的端點 validators，併入清單中既有的紀錄
+    """
+    manifest = read_manifest(dataset)
+    if manifest is None:
+        return None
+    manifest['changed'] = False
+    if validators:
+        manifest['validators'] = {**manifest.get('validators', {}), **validators}
+    manifest['checkedAt'] = taipei_now().isoformat(timespec='seconds')
+    atomic_write_json(manifest_path(dataset), manifest)
+    logger.info(f"{dataset} 內容未變更，最新日期仍為 {manifest.get('latestDate')}")
+    return manifest
@@ -0,0 +1,414 @@
+"""
+期交所資料 MongoDB 寫入
+將標準化後的資料直接轉為 FuturesMarketData 文件格式，以 bulk_write 批次 upsert (以 date 為鍵)，
+取代 Python 寫 JSON、再由 import_taifex_data.js 重新讀取並逐筆寫入的流程
+
+欄位換算與 import_taifex_data.js 一致：金額 (千元) 除以 100000 換算為億元
+collection 參數接受任何相容 pymongo 的集合物件 (例如 mongomock)，方便在本機測試；
+--dry-run 改寫入記憶體中的 MemoryCollection (不需 pymongo 與資料庫)，並檢查每個日期只有一份文件、
+兩個資料集的 $set 欄位互不覆蓋
+
+用法:
+    python taifex_mongo_sink.py --dataset all --from 2024-01-01 --to today
+    python taifex_mongo_sink.py --dry-run --from 2024-01-01   # 只在記憶體中寫入並檢查
+"""
+
+import argparse
+import copy
+import logging
+import os
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from taifex_institutional_crawler import MTX_CONTRACTS, TX_CONTRACT
+from taifex_manifest import taipei_now, taipei_today
+
+logger = logging.getLogger('taifex_mongo_sink')
+
+# mongoose 依模型名稱 FuturesMarketData 產生的集合名稱
+COLLECTION_NAME = 'futuresmarketdatas'
+
+# 每批 bulk_write 的文件數
+DEFAULT_BATCH_SIZE = 500
+
+# 千元換算為億元
+THOUSAND_TO_HUNDRED_MILLION = 100000
+
+
+def standard_date(value):
+    """將 YYYY/MM/DD 字串、date 或 Timestamp 轉為 FuturesMarketData 使用的 YYYY-MM-DD"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    year, month, day = str(value).strip().replace('-', '/').split('/')
+    return f'{int(year):04d}-{int(month):02d}-{int(day):02d}'
+
+
+def _native(value):
+    """將 numpy/pandas 純量轉為 BSON 可寫入的 Python 型別"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y/%m/%d')
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _raw_row(item):
+    return {key: _native(value) for key, value in item.items()}
+
+
+def _group_by_date(records):
+    groups = {}
+    for item in records:
+        if item.get('Date') is None:
+            continue
+        groups.setdefault(standard_date(item['Date']), []).append(item)
+    return groups
+
+
+def _number(value, default=0):
+    """缺值或 NaN 時回傳預設值"""
+    if value is None or value != value:
+        return default
+    return _native(value)
+
+
+def pc_ratio_updates(records, now=None):
+    """
+    將 PC Ratio 資料轉為 {日期: $set 欄位} 對應
+
+    Returns:
+        dict: YYYY-MM-DD 對應要寫入的欄位 (以點號路徑表示，不覆蓋同一文件的其他資料)
+    """
+    now = now or taipei_now()
+    updates = {}
+    for day, rows in _group_by_date(records).items():
+        item = rows[0]
+        updates[day] = {
+            'putCallRatio': {
+                'putVolume': _number(item.get('PutVolume')),
+                'callVolume': _number(item.get('CallVolume')),
+                'volumeRatio': _number(item.get('PutCallVolumeRatio%')),
+                'putOI': _number(item.get('PutOI')),
+                'callOI': _number(item.get('CallOI')),
+                'oiRatio': _number(item.get('PutCallOIRatio%'))
+            },
+            'dataSources.putCallRatio': {'updated': True, 'updateTime': now},
+            'rawData.putCallRatio': [_raw_row(row) for row in rows]
+        }
+    return updates
+
+
+def _investors(rows):
+    """
+    依 import_taifex_data.js processInstitutionalData 的規則彙整單日三大法人資料
+    買賣超取自臺股期貨，外資另記錄小型臺指的未平倉 (mtxOI) 與增減 (mtxChange)
+    """
+    foreign = {}
+    investment = {}
+    dealer = {}
+    for item in rows:
+        contract = item.get('ContractName')
+        if contract in MTX_CONTRACTS:
+            if item.get('InvestorType') == '外資及陸資':
+                foreign['mtxOI'] = _number(item.get('NetOIVolume'))
+                foreign['mtxChange'] = _number(item.get('NetTradeVolume'))
+            continue
+        # 其他契約不列入買賣超 (沒有商品名稱的舊資料視為臺股期貨)
+        if contract is not None and contract != TX_CONTRACT:
+            continue
+        net_value = _number(item.get('NetTradeValue')) / THOUSAND_TO_HUNDRED_MILLION
+        investor_type = item.get('InvestorType')
+        if investor_type == '外資及陸資':
+            net_oi = _number(item.get('NetOIVolume'))
+            foreign.update({
+                'netBuySell': net_value,
+                'netOI': net_oi,
+                'txfOI': net_oi,
+                'txfChange': _number(item.get('NetTradeVolume'))
+            })
+        elif investor_type == '投信':
+            investment['netBuySell'] = net_value
+        elif investor_type == '自營商':
+            dealer['netBuySellTotal'] = net_value
+        elif investor_type == '自營商(自行買賣)':
+            dealer['netBuySellSelf'] = net_value
+        elif investor_type == '自營商(避險)':
+            dealer['netBuySellHedge'] = net_value
+
+    return {
+        'foreign': foreign,
+        'investment': investment,
+        'dealer': dealer,
+        'totalNetBuySell': (
+            foreign.get('netBuySell', 0) + investment.get('netBuySell', 0) + dealer.get('netBuySellTotal', 0)
+        )
+    }
+
+
+def institutional_updates(records, now=None):
+    """
+    將三大法人資料轉為 {日期: $set 欄位} 對應
+    """
+    now = now or taipei_now()
+    updates = {}
+    for day, rows in _group_by_date(records).items():
+        updates[day] = {
+            'institutionalInvestors': _investors(rows),
+            'dataSources.institutional': {'updated': True, 'updateTime': now},
+            'rawData.institutional': [_raw_row(row) for row in rows]
+        }
+    return updates
+
+
+# 各資料集的文件轉換函數
+CONVERTERS = {
+    'pc_ratio': pc_ratio_updates,
+    'institutional': institutional_updates
+}
+
+
+def get_collection(uri=None, collection_name=COLLECTION_NAME):
+    """
+    連線到 MONGODB_URI 指定的資料庫並回傳 FuturesMarketData 集合
+    URI 未指定資料庫時與 mongoose 相同使用 test
+    """
+    from pymongo import MongoClient
+
+    uri = uri or os.environ.get('MONGODB_URI')
+    if not uri:
+        raise ValueError('MongoDB 連接字串未設定，請在環境變數中定義 MONGODB_URI')
+    client = MongoClient(uri)
+    return client.get_default_database(default='test')[collection_name]
+
+
+class MemoryUpdateOne:
+    """未安裝 pymongo 時代替 pymongo.UpdateOne，欄位名稱與 pymongo 相同"""
+
+    def __init__(self, filter, update, upsert=False):
+        self._filter = filter
+        self._doc = update
+        self._upsert = upsert
+
+
+def _get_path(document, path):
+    """依點號路徑取值，路徑不存在時回傳 None"""
+    value = document
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _set_path(document, path, value):
+    """依點號路徑設定值，與 $set 相同只建立缺少的中間文件，不覆蓋同層的其他欄位"""
+    keys = path.split('.')
+    for key in keys[:-1]:
+        document = document.setdefault(key, {})
+    document[keys[-1]] = copy.deepcopy(value)
+
+
+class MemoryCollection:
+    """
+    記憶體中的 FuturesMarketData 集合，只實作本模組用到的 bulk_write (UpdateOne + $set/$setOnInsert + upsert)
+    與以欄位相等條件查詢的 find，供 --dry-run 檢查寫入結果
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    def find(self, filter=None):
+        filter = filter or {}
+        return [
+            copy.deepcopy(document) for document in self.documents
+            if all(_get_path(document, key) == value for key, value in filter.items())
+        ]
+
+    def count_documents(self, filter):
+        return len(self.find(filter))
+
+    def bulk_write(self, operations, ordered=True):
+        matched = modified = upserted = 0
+        for operation in operations:
+            update = operation._doc
+            documents = [
+                document for document in self.documents
+                if all(_get_path(document, key) == value for key, value in operation._filter.items())
+            ]
+            if documents:
+                document = documents[0]
+                matched += 1
+                before = copy.deepcopy(document)
+                for path, value in update.get('$set', {}).items():
+                    _set_path(document, path, value)
+                if document != before:
+                    modified += 1
+            elif operation._upsert:
+                document = copy.deepcopy(operation._filter)
+                for path, value in update.get('$setOnInsert', {}).items():
+                    _set_path(document, path, value)
+                for path, value in update.get('$set', {}).items():
+                    _set_path(document, path, value)
+                self.documents.append(document)
+                upserted += 1
+        return SimpleNamespace(matched_count=matched, modified_count=modified, upserted_count=upserted)
+
+
+def write_updates(collection, updates, batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    以 bulk_write 批次 upsert，每個日期一個 UpdateOne
+
+    Returns:
+        dict: matched/modified/upserted 文件數與批次數
+    """
+    try:
+        from pymongo import UpdateOne
+    except ImportError:
+        if not isinstance(collection, MemoryCollection):
+            raise
+        UpdateOne = MemoryUpdateOne
+
+    now = now or taipei_now()
+    operations = []
+    for day in sorted(updates):
+        fields = dict(updates[day])
+        fields['lastUpdated'] = now
+        operations.append(UpdateOne(
+            {'date': day},
+            {'$set': fields, '$setOnInsert': {'date': day, 'dataTimestamp': now}},
+            upsert=True
+        ))
+
+    totals = {'matched': 0, 'modified': 0, 'upserted': 0, 'batches': 0}
+    for start in range(0, len(operations), batch_size):
+        result = collection.bulk_write(operations[start:start + batch_size], ordered=False)
+        totals['matched'] += result.matched_count
+        totals['modified'] += result.modified_count
+        totals['upserted'] += result.upserted_count
+        totals['batches'] += 1
+    return totals
+
+
+def sink(dataset, records, collection=None, batch_size=DEFAULT_BATCH_SIZE, updates=None):
+    """
+    將資料集的標準化資料寫入 FuturesMarketData
+
+    Args:
+        dataset: pc_ratio 或 institutional
+        records: 字典列表 (爬蟲輸出或歷史資料集的列)
+        collection: pymongo 相容集合，預設連線到 MONGODB_URI
+        updates: 已轉換好的 {日期: $set 欄位}，指定時不再由 records 轉換
+    """
+    now = taipei_now()
+    if updates is None:
+        updates = CONVERTERS[dataset](records, now=now)
+    if not updates:
+        logger.warning(f'{dataset} 沒有可寫入的資料')
+        return {'matched': 0, 'modified': 0, 'upserted': 0, 'batches': 0}
+    if collection is None:
+        collection = get_collection()
+    totals = write_updates(collection, updates, batch_size=batch_size, now=now)
+    logger.info(
+        f"{dataset} 已寫入 {len(updates)} 個交易日 ({totals['batches']} 批): "
+        f"新增 {totals['upserted']}, 更新 {totals['modified']}, 相符 {totals['matched']}"
+    )
+    return totals
+
+
+def verify_collection(collection, expected):
+    """
+    檢查寫入結果：每個日期只有一份文件 (以 date 為 upsert 鍵)，且每個資料集寫入的欄位都完整保留，
+    沒有被另一個資料集的 $set 覆蓋
+
+    Args:
+        expected: {資料集: {日期: $set 欄位}}
+
+    Returns:
+        list: 問題描述，空列表表示通過
+    """
+    problems = []
+    days = set()
+    for updates in expected.values():
+        days.update(updates)
+    for day in sorted(days):
+        documents = list(collection.find({'date': day}))
+        if len(documents) != 1:
+            problems.append(f'{day} 有 {len(documents)} 份文件')
+            continue
+        for dataset, updates in expected.items():
+            for path, value in updates.get(day, {}).items():
+                if _get_path(documents[0], path) != value:
+                    problems.append(f'{day} 的 {dataset} 欄位 {path} 與寫入值不符')
+    return problems
+
+
+def dry_run(datasets, start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    將歷史資料集寫入 MemoryCollection 兩次並檢查結果，回傳問題描述列表
+    第二次寫入應全部相符而不新增文件，確認 upsert 以 date 為鍵
+    """
+    from taifex_history_store import read_history
+    from taifex_normalize import to_records
+
+    collection = MemoryCollection()
+    expected = {}
+    for dataset in datasets:
+        records = to_records(read_history(dataset, start, end))
+        expected[dataset] = CONVERTERS[dataset](records)
+        sink(dataset, records, collection=collection, batch_size=batch_size, updates=expected[dataset])
+
+    problems = []
+    for dataset in datasets:
+        totals = sink(dataset, [], collection=collection, batch_size=batch_size, updates=expected[dataset])
+        if totals['upserted'] or totals['matched'] != len(expected[dataset]):
+            problems.append(
+                f"{dataset} 重複寫入時新增 {totals['upserted']} 份文件、相符 {totals['matched']} 份 "
+                f"(應為 0 與 {len(expected[dataset])})"
+            )
+    problems.extend(verify_collection(collection, expected))
+    logger.info(f'試寫完成: 共 {len(collection.documents)} 份文件')
+    return problems
+
+
+def parse_date(value):
+    """解析命令列日期參數，支援 YYYY-MM-DD 與 today"""
+    if value == 'today':
+        return taipei_today()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    from taifex_history_store import read_history
+    from taifex_normalize import to_records
+
+    parser = argparse.ArgumentParser(description='將歷史資料集批次寫入 MongoDB FuturesMarketData')
+    parser.add_argument('--dataset', choices=['all'] + list(CONVERTERS), default='all', help='要寫入的資料集')
+    parser.add_argument('--from', dest='start', type=parse_date, help='起始日期 (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=parse_date, help='結束日期 (YYYY-MM-DD 或 today)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批 bulk_write 的文件數')
+    parser.add_argument('--dry-run', action='store_true', help='只寫入記憶體中的集合並檢查結果，不連線資料庫')
+    args = parser.parse_args(argv)
+
+    datasets = list(CONVERTERS) if args.dataset == 'all' else [args.dataset]
+    if args.dry_run:
+        problems = dry_run(datasets, args.start, args.end, batch_size=args.batch_size)
+        for problem in problems:
+            logger.error(problem)
+        if problems:
+            return 1
+        logger.info('試寫檢查通過: 每個日期一份文件，各資料集欄位互不覆蓋')
+        return 0
+
+    collection = get_collection()
+    for dataset in datasets:
+        df = read_history(dataset, args.start, args.end)
+        sink(dataset, to_records(df), collection=collection, batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    exit(main())
@@ -0,0 +1,104 @@
+"""
+期交所資料欄位標準化
+以整欄向量化運算處理民國/西元日期轉換與千分位數字，數值欄位一次轉為 int64/float64，
+取代逐筆資料的 Python 迴圈
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('taifex_normalize')
+
+# 日期格式：年/月/日，年份可為民國年 (2~3 位) 或西元年 (4 位)
+_DATE_PATTERN = r'^\s*(\d{2,4})/(\d{1,2})/(\d{1,2})\s*$'
+
+
+def _convert_dates(values):
+    """將不重複的日期值轉為西元 YYYY/MM/DD，無法解析者為缺值"""
+    parts = pd.Series(values, dtype='string').str.extract(_DATE_PATTERN)
+    year = pd.to_numeric(parts[0], errors='coerce')
+    year = year.where(year >= 1911, year + 1911)
+    return (
+        year.astype('Int64').astype('string') + '/'
+        + parts[1].str.zfill(2) + '/'
+        + parts[2].str.zfill(2)
+    )
+
+
+def roc_to_gregorian(series):
+    """
+    將日期欄位統一轉為西元 YYYY/MM/DD 字串
+    民國年份 (小於 1911) 加上 1911，無法解析的值保留原樣
+
+    Args:
+        series: pandas.Series，內容如 113/04/15 或 2024/04/15
+    """
+    # 同一交易日會重複出現在多筆資料中，只轉換不重複的值再依代碼展開
+    codes, uniques = pd.factorize(series)
+    converted = _convert_dates(uniques)
+    invalid = converted.isna().to_numpy()
+    if invalid.any():
+        logger.warning(f'無法解析日期: {list(uniques[invalid])[:5]}')
+    converted = np.array(converted.astype(object), dtype=object)
+    converted[invalid] = np.asarray(uniques, dtype=object)[invalid]
+
+    result = np.full(len(series), None, dtype=object)
+    valid = codes >= 0
+    result[valid] = converted[codes[valid]]
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def to_number(series):
+    """
+    移除千分位逗號、百分比符號與空白後轉為 float64，無法轉換者為 NaN
+    已是數值型別的欄位直接轉換
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    text = (
+        series.astype(str)
+        .str.replace(',', '', regex=False)
+        .str.replace('%', '', regex=False)
+        .str.strip()
+    )
+    try:
+        # 內容都是合法數字時直接轉型，比 pd.to_numeric 快
+        return text.astype('float64')
+    except ValueError:
+        return pd.to_numeric(text, errors='coerce').astype('float64')
+
+
+def to_int(series):
+    """轉為 int64，有缺值時使用可為空的 Int64"""
+    numbers = to_number(series)
+    if numbers.isna().any():
+        return numbers.round().astype('Int64')
+    return numbers.round().astype('int64')
+
+
+def normalize_frame(df, int_columns=(), float_columns=(), date_column='Date'):
+    """
+    標準化 DataFrame：日期轉為西元格式，數值欄位轉為 int64/float64
+    不存在的欄位略過
+    """
+    df = df.copy()
+    if date_column in df.columns:
+        df[date_column] = roc_to_gregorian(df[date_column])
+    for column in int_columns:
+        if column in df.columns:
+            df[column] = to_int(df[column])
+    for column in float_columns:
+        if column in df.columns:
+            df[column] = to_number(df[column])
+    return df
+
+
+def to_records(df):
+    """
+    將 DataFrame 轉為可直接 json.dump 的字典列表，缺值轉為 None
+    """
+    if not df.isna().to_numpy().any():
+        return df.to_dict('records')
+    return df.astype(object).where(df.notna(), None).to_dict('records')
@@ -0,0 +1,160 @@
+"""
+爬蟲輸出格式
+*_latest.json 預設維持原本的縮排 JSON；可用 TAIFEX_OUTPUT_FORMATS 環境變數 (逗號分隔) 改用緊湊 JSON，
+或另外輸出欄式 JSON (每個欄位一個陣列) 與 gzip/zstd 壓縮版本，依使用端選擇
+
+格式名稱為 <版型>[+<壓縮>]:
+    pretty             縮排 2 的 JSON (原本的格式)              data/pc_ratio_latest.json
+    compact            無空白的 JSON                           data/pc_ratio_latest.json
+    columnar           {"欄位": [值, ...]} 的欄式 JSON          data/pc_ratio_latest.columnar.json
+    compact+gzip       緊湊 JSON 以 gzip 壓縮                  data/pc_ratio_latest.json.gz
+    columnar+zstd      欄式 JSON 以 zstd 壓縮                  data/pc_ratio_latest.columnar.json.zst
+
+pretty 與 compact 都寫入原本的檔名 (兩者皆列出時以先列者為準)，兩者都未列出時仍以 pretty 寫入，
+讓 import_taifex_data.js 與 GitHub Pages 照常讀取
+有安裝 orjson 時 compact 與 columnar 以 orjson 序列化，否則使用標準函式庫 json；zstd 壓縮需要安裝 zstandard
+
+用法:
+    TAIFEX_OUTPUT_FORMATS=compact,columnar+gzip python taifex_crawl_all.py
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+
+from taifex_run_report import get_report
+
+logger = logging.getLogger('taifex_output_formats')
+
+LAYOUTS = ('pretty', 'compact', 'columnar')
+COMPRESSIONS = ('gzip', 'zstd')
+
+# 未設定環境變數時的輸出格式
+DEFAULT_FORMATS = ('pretty',)
+
+# 固定參數讓相同內容每次壓縮結果相同 (gzip 不寫入時間戳記)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def parse_formats(spec=None):
+    """
+    解析格式設定，未指定時讀取 TAIFEX_OUTPUT_FORMATS 環境變數
+
+    Returns:
+        list: (版型, 壓縮方式或 None) 的列表
+
+    Raises:
+        ValueError: 未知的版型或壓縮方式
+    """
+    if spec is None:
+        spec = os.environ.get('TAIFEX_OUTPUT_FORMATS') or ','.join(DEFAULT_FORMATS)
+    formats = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        layout, _, compression = item.partition('+')
+        if layout not in LAYOUTS:
+            raise ValueError(f'未知的輸出版型: {layout} (可用: {", ".join(LAYOUTS)})')
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError(f'未知的壓縮方式: {compression} (可用: {", ".join(COMPRESSIONS)})')
+        formats.append((layout, compression or None))
+    return formats
+
+
+def format_name(fmt):
+    layout, compression = fmt
+    return f'{layout}+{compression}' if compression else layout
+
+
+def to_columns(records):
+    """將字典列表轉為 {欄位: [值, ...]}，欄位順序依首次出現的順序，缺少的值為 null"""
+    columns = {}
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns[key] = None
+    return {key: [record.get(key) for record in records] for key in columns}
+
+
+def _dumps(obj, pretty):
+    # pretty 固定使用標準函式庫，確保預設輸出與原本逐位元組相同 (orjson 的浮點數與 NaN 表示不同)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(obj)
+
+
+def compress(payload, compression):
+    if compression is None:
+        return payload
+    if compression == 'gzip':
+        return gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd 壓縮需要安裝 zstandard 套件') from None
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+
+
+def serialize(records, fmt):
+    """依格式將字典列表序列化為位元組"""
+    layout, compression = fmt
+    if layout == 'columnar':
+        payload = _dumps(to_columns(records), pretty=False)
+    else:
+        payload = _dumps(records, pretty=layout == 'pretty')
+    return compress(payload, compression)
+
+
+def output_path(base_path, fmt):
+    """
+    依格式決定輸出檔名，base_path 為原本的 *_latest.json
+    """
+    layout, compression = fmt
+    root, extension = os.path.splitext(base_path)
+    path = f'{root}.columnar{extension}' if layout == 'columnar' else base_path
+    return path + _EXTENSIONS[compression] if compression else path
+
+
+def serialize_outputs(records, base_path, formats=None, dataset=None):
+    """
+    產生所有設定格式的輸出內容
+
+    Args:
+        formats: parse_formats 的結果，預設讀取環境變數
+        dataset: 指定時在執行報告中記錄各格式的位元組數 (bytes_<格式>) 與序列化秒數 (seconds_<格式>)
+
+    Returns:
+        list: (檔案路徑, 位元組) 的列表，第一筆為原本檔名的 JSON
+    """
+    formats = parse_formats() if formats is None else formats
+    primary = next((fmt for fmt in formats if fmt[0] in ('pretty', 'compact') and fmt[1] is None), ('pretty', None))
+    outputs = []
+    seen = set()
+    for fmt in [primary] + formats:
+        path = output_path(base_path, fmt)
+        if path in seen:
+            continue
+        seen.add(path)
+        started = time.perf_counter()
+        try:
+            payload = serialize(records, fmt)
+        except ImportError as e:
+            # 選用套件未安裝時略過該格式，不影響其他輸出
+            logger.warning(f'略過 {format_name(fmt)} 格式: {str(e)}')
+            continue
+        outputs.append((path, payload))
+        if dataset is not None:
+            report = get_report()
+            report.count(dataset, f'bytes_{format_name(fmt)}', len(payload))
+            report.count(dataset, f'seconds_{format_name(fmt)}', round(time.perf_counter() - started, 6))
+    return outputs
@@ -1,10 +1,13 @@
-import pandas as pd
-import json
-from datetime import datetime
 import os
 import logging
-import requests
-import re
+from taifex_atomic import atomic_write
+from taifex_output_formats import serialize_outputs
+from taifex_manifest import is_fresh, mark_unchanged, taipei_today, write_manifest
+from taifex_raw_cache import store_raw
+from taifex_run_report import get_report
+
+# requests、pandas 與 lxml 只在真正需要爬取或解析時才在函數內匯入，
+# 資料已是最新時只需標準函式庫即可完成新鮮度檢查並結束
 
 # 設定日誌
 logging.basicConfig(
@@ -13,173 +16,207 @@ logging.basicConfig(
 )
 logger = logging.getLogger('taifex_pc_ratio_crawler')
 
+# 期交所網站，可用 TAIFEX_BASE_URL 環境變數指向本機替身伺服器 (taifex_fake_server.py)
+TAIFEX_BASE_URL = os.environ.get('TAIFEX_BASE_URL', 'https://www.taifex.com.tw')
+
+# 期交所 Put/Call 比率頁面
+PC_RATIO_URL = f'{TAIFEX_BASE_URL}/cht/3/pcRatioExcel'
+
+# 最新資料檔案（固定名稱）
+LATEST_FILE = 'data/pc_ratio_latest.json'
+
+# 數值欄位：成交量與未平倉量為整數，比率為浮點數
+INT_COLUMNS = ['CallVolume', 'PutVolume', 'CallOI', 'PutOI']
+FLOAT_COLUMNS = ['PutCallVolumeRatio%', 'PutCallOIRatio%']
+
+def fetch_pc_ratio(start_date=None, end_date=None):
+    """
+    向期交所請求 Put/Call 比率頁面
+    未指定日期時以條件式請求取得頁面預設的最新資料，內容與上次相同時拋出 NotModified；
+    指定日期區間時以表單送出查詢 (單次最多一個月)
+    
+    Args:
+        start_date: 查詢起始日期 (datetime.date)
+        end_date: 查詢結束日期 (datetime.date)，預設與起始日期相同
+    
+    Returns:
+        tuple: (原始 HTML 位元組, 條件式請求的 validators；指定日期區間時為 None)
+    """
+    from taifex_http import fetch_if_changed, get_client
+    
+    if start_date is None:
+        # 頁面預設顯示最新資料，以不帶參數的 GET 取得；指定日期的查詢才以表單送出
+        logger.info(f'正在請求最新資料，URL: {PC_RATIO_URL}')
+        
+        # 透過共用連線以條件式請求取得原始 HTML，並保存到原始回應快取
+        with get_report().stage('pc_ratio', 'fetch'):
+            content, validators = fetch_if_changed('pc_ratio', 'GET', PC_RATIO_URL)
+        get_report().count('pc_ratio', 'bytes_downloaded', len(content))
+        store_raw('pc_ratio', 'html', content, taipei_today())
+        return content, validators
+    
+    form_data = {
+        'queryStartDate': start_date.strftime('%Y/%m/%d'),
+        'queryEndDate': (end_date or start_date).strftime('%Y/%m/%d')
+    }
+    logger.info(f'正在請求區間資料，URL: {PC_RATIO_URL}, 參數: {form_data}')
+    with get_report().stage('pc_ratio', 'fetch'):
+        content = get_client().post(PC_RATIO_URL, data=form_data)
+    get_report().count('pc_ratio', 'bytes_downloaded', len(content))
+    store_raw('pc_ratio', 'html', content, start_date, end_date)
+    return content, None
+
+def parse_pc_ratio(content):
+    """
+    解析 Put/Call 比率頁面，回傳字典列表；找不到資料表時回傳 None
+    """
+    from taifex_normalize import normalize_frame, to_records
+    from taifex_table_extractor import PC_RATIO_LAYOUT, extract_table
+    
+    # 以 XPath 直接擷取資料表，版型不符時才退回 pd.read_html (解碼由 lxml 在解析時完成)
+    with get_report().stage('pc_ratio', 'parse'):
+        df = extract_table(content, PC_RATIO_LAYOUT)
+    
+    if df is None:
+        logger.error('未找到資料表')
+        return None
+    
+    get_report().count('pc_ratio', 'rows_parsed', len(df))
+    logger.info(f'成功讀取表格，共 {len(df)} 筆資料')
+    
+    # 顯示表格的列名，以便診斷
+    logger.info(f'表格欄位: {df.columns.tolist()}')
+    
+    # 轉換欄位名稱為英文，與現有模型對應
+    columns_mapping = {
+        '日期': 'Date',
+        '買權成交量': 'CallVolume',
+        '賣權成交量': 'PutVolume',
+        '買賣權成交量比率%': 'PutCallVolumeRatio%',
+        '買權未平倉量': 'CallOI',
+        '賣權未平倉量': 'PutOI',
+        '買賣權未平倉量比率%': 'PutCallOIRatio%'
+    }
+    
+    # 檢查列名是否在表格中
+    for ch_col, en_col in columns_mapping.items():
+        if ch_col not in df.columns:
+            logger.warning(f'欄位 {ch_col} 不在表格中，可用欄位: {df.columns.tolist()}')
+    
+    # 重命名欄位
+    df = df.rename(columns=columns_mapping)
+    
+    with get_report().stage('pc_ratio', 'normalize'):
+        # 整欄轉換日期（民國年轉西元年）與數值欄位（移除千分位逗號與百分比符號）
+        df = normalize_frame(df, int_columns=INT_COLUMNS, float_columns=FLOAT_COLUMNS)
+        
+        # 將 DataFrame 轉換為字典列表，數值欄位保留為數字
+        data = to_records(df)
+    
+    # 打印前 3 筆資料以便於檢查格式
+    logger.info("抽樣資料（前3筆）:")
+    for i, row in enumerate(data[:3]):
+        logger.info(f"資料 {i+1}: {row}")
+    
+    return data
+
+def save_pc_ratio(data, validators=None):
+    """
+    將解析後的資料附加到歷史資料集，並保存最新資料 JSON，回傳最新資料檔案路徑
+    validators 為取得這份資料的條件式請求 validators，與資料一起寫入清單
+    """
+    from taifex_history_store import HISTORY_DIR, append_history
+    
+    # 確保目錄存在
+    os.makedirs('data', exist_ok=True)
+    
+    report = get_report()
+    with report.stage('pc_ratio', 'serialize'):
+        # 依 TAIFEX_OUTPUT_FORMATS 產生 *_latest.json 與其他格式的輸出
+        outputs = serialize_outputs(data, LATEST_FILE, dataset='pc_ratio')
+    
+    with report.stage('pc_ratio', 'write'):
+        # 附加到依年/月分區的歷史資料集，取代每次執行產生的時間戳 JSON
+        append_history('pc_ratio', data)
+        
+        # 同時保存最新的檔案（固定名稱）供直接讀取，以原子替換避免讀取端讀到寫到一半的檔案
+        for path, payload in outputs:
+            atomic_write(path, payload)
+        
+        # 更新新鮮度清單
+        write_manifest('pc_ratio', data, validators=validators)
+    report.count('pc_ratio', 'rows_written', len(data))
+    
+    # 輸出摘要資訊到日誌
+    if len(data) > 0:
+        logger.info(f'爬取到的最新資料日期: {data[0]["Date"]}')
+        logger.info(f'買權成交量: {data[0]["CallVolume"]}')
+        logger.info(f'賣權成交量: {data[0]["PutVolume"]}')
+        logger.info(f'成交量比率: {data[0]["PutCallVolumeRatio%"]}')
+        logger.info(f'買權未平倉量: {data[0]["CallOI"]}')
+        logger.info(f'賣權未平倉量: {data[0]["PutOI"]}')
+        logger.info(f'未平倉量比率: {data[0]["PutCallOIRatio%"]}')
+    
+    logger.info(f'數據已保存至 {HISTORY_DIR}/pc_ratio 和 {LATEST_FILE}')
+    return LATEST_FILE
+
+def skip_unchanged():
+    """
+    期交所回應與上次相同：略過解析與寫入，只在清單標記未變更，回傳既有的最新資料檔案路徑
+    """
+    get_report().count('pc_ratio', 'not_modified')
+    mark_unchanged('pc_ratio')
+    return LATEST_FILE
+
 def crawl_pc_ratio():
     """
     爬取台指選擇權 Put/Call 比率資料
     參考原始 TaifexScraper.fetchTxoPutCallRatio 方法
     """
+    from taifex_http import NotModified
+    
     logger.info('開始爬取台指選擇權 Put/Call 比率資料')
     
     try:
-        # 取得當天日期作為查詢參數
-        today = datetime.now().strftime('%Y/%m/%d')
-        
-        # 準備請求參數，模仿原始 TaifexScraper 中的參數設置
-        form_data = {
-            'queryStartDate': today,
-            'queryEndDate': today
-        }
-        
-        # 使用 pandas 讀取 HTML 表格
-        url = 'https://www.taifex.com.tw/cht/3/pcRatioExcel'
-        logger.info(f'正在請求資料，URL: {url}, 參數: {form_data}')
-        
-        # 使用 pandas 的 read_html 函數讀取 HTML 表格
-        tables = pd.read_html(url, encoding='utf-8')
-        
-        # 取得主要資料表（通常是第一個表格）
-        if len(tables) > 0:
-            df = tables[0]
-            logger.info(f'成功讀取表格，共 {len(df)} 筆資料')
-            
-            # 顯示表格的列名，以便診斷
-            logger.info(f'表格欄位: {df.columns.tolist()}')
-            
-            # 轉換欄位名稱為英文，與現有模型對應
-            columns_mapping = {
-                '日期': 'Date',
-                '買權成交量': 'CallVolume',
-                '賣權成交量': 'PutVolume',
-                '買賣權成交量比率%': 'PutCallVolumeRatio%',
-                '買權未平倉量': 'CallOI',
-                '賣權未平倉量': 'PutOI',
-                '買賣權未平倉量比率%': 'PutCallOIRatio%'
-            }
-            
-            # 檢查列名是否在表格中
-            for ch_col, en_col in columns_mapping.items():
-                if ch_col not in df.columns:
-                    logger.warning(f'欄位 {ch_col} 不在表格中，可用欄位: {df.columns.tolist()}')
-            
-            # 重命名欄位
-            df = df.rename(columns=columns_mapping)
-            
-            # 將 DataFrame 轉換為字典列表
-            data = df.to_dict('records')
-            
-            # 日期格式轉換（處理中華民國年份格式）
-            for item in data:
-                # 如果日期是中文格式（如：112/04/15），轉換為西元年格式
-                if isinstance(item['Date'], str) and '/' in item['Date']:
-                    date_parts = item['Date'].split('/')
-                    if len(date_parts) == 3:
-                        try:
-                            roc_year = int(date_parts[0])
-                            # 中華民國年份轉西元年
-                            if roc_year < 1911:
-                                western_year = roc_year + 1911
-                                item['Date'] = f"{western_year}/{date_parts[1]}/{date_parts[2]}"
-                        except ValueError:
-                            logger.warning(f"無法解析日期: {item['Date']}")
-                            
-                # 確保數值欄位正確處理
-                for key in ['CallVolume', 'PutVolume', 'CallOI', 'PutOI']:
-                    if key in item and isinstance(item[key], str):
-                        # 刪除千分位逗號
-                        item[key] = item[key].replace(',', '')
-                
-                # 處理百分比欄位
-                for key in ['PutCallVolumeRatio%', 'PutCallOIRatio%']:
-                    if key in item and isinstance(item[key], str):
-                        # 刪除千分位逗號和百分比符號
-                        value = item[key].replace(',', '').replace('%', '')
-                        try:
-                            item[key] = value
-                        except ValueError:
-                            logger.warning(f"無法解析百分比: {item[key]}")
-            
-            # 打印前 3 筆資料以便於檢查格式
-            logger.info("抽樣資料（前3筆）:")
-            for i, row in enumerate(data[:3]):
-                logger.info(f"資料 {i+1}: {row}")
-            
-            # 生成時間戳作為檔案名的一部分
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            
-            # 確保目錄存在
-            os.makedirs('data', exist_ok=True)
-            
-            # 將數據保存為 JSON
-            output_file = f'data/pc_ratio_{timestamp}.json'
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 同時保存最新的檔案（固定名稱）供直接讀取
-            latest_file = 'data/pc_ratio_latest.json'
-            with open(latest_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 輸出摘要資訊到日誌
-            if len(data) > 0:
-                logger.info(f'爬取到的最新資料日期: {data[0]["Date"]}')
-                logger.info(f'買權成交量: {data[0]["CallVolume"]}')
-                logger.info(f'賣權成交量: {data[0]["PutVolume"]}')
-                logger.info(f'成交量比率: {data[0]["PutCallVolumeRatio%"]}')
-                logger.info(f'買權未平倉量: {data[0]["CallOI"]}')
-                logger.info(f'賣權未平倉量: {data[0]["PutOI"]}')
-                logger.info(f'未平倉量比率: {data[0]["PutCallOIRatio%"]}')
-            
-            logger.info(f'數據已保存至 {output_file} 和 {latest_file}')
-            return output_file
-        else:
-            logger.error('未找到資料表')
+        try:
+            content, validators = fetch_pc_ratio()
+        except NotModified:
+            return skip_unchanged()
+        data = parse_pc_ratio(content)
+        if data is None:
             return None
+        return save_pc_ratio(data, validators)
     except Exception as e:
         logger.error(f'爬取資料時發生錯誤: {str(e)}')
         import traceback
         logger.error(traceback.format_exc())
         return None
 
+# 檢查既有資料是否已是今日資料
+def is_data_fresh():
+    """
+    讀取資料清單，若最新資料日期為今天（台北時間）則回傳 True
+    """
+    return is_fresh('pc_ratio')
+
 # 檢查之前的資料並決定是否進行爬蟲
 def check_and_crawl():
     """
     檢查既有資料，如果沒有資料或資料過期，則進行爬蟲
     """
-    need_crawl = True
-    
-    # 檢查最新數據文件是否存在
-    latest_file = 'data/pc_ratio_latest.json'
-    if os.path.exists(latest_file):
-        try:
-            # 讀取最新數據
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if data and len(data) > 0:
-                # 檢查資料日期是否為今天
-                latest_date = data[0]['Date']
-                today = datetime.now().strftime('%Y/%m/%d')
-                
-                logger.info(f'既有資料日期: {latest_date}, 今日日期: {today}')
-                
-                # 如果最新資料日期是今天，則不需要爬蟲
-                if latest_date == today:
-                    logger.info(f'已有今日 ({today}) 的資料，不需要重新爬取')
-                    need_crawl = False
-                else:
-                    logger.info(f'最新資料日期 ({latest_date}) 不是今天 ({today})，將重新爬取')
-        except Exception as e:
-            logger.error(f'檢查既有資料時發生錯誤: {str(e)}')
-    else:
-        logger.info('找不到既有資料，將進行首次爬取')
-    
-    # 如果需要爬蟲，執行爬蟲
-    if need_crawl:
-        return crawl_pc_ratio()
-    return latest_file
+    if is_data_fresh():
+        return LATEST_FILE
+    return crawl_pc_ratio()
 
 if __name__ == '__main__':
-    output_file = check_and_crawl()
+    if is_data_fresh():
+        # 快速路徑：不匯入任何爬取與解析模組
+        output_file = LATEST_FILE
+    else:
+        from taifex_http import get_client
+        output_file = crawl_pc_ratio()
+        get_client().log_stats()
+        get_report().write()
     if output_file:
         logger.info(f'爬蟲程序完成，數據已保存至 {output_file}')
         print(f'RESULT_FILE={output_file}')  # 輸出結果檔案路徑供 GitHub Actions 使用
@@ -0,0 +1,273 @@
+"""
+期交所原始回應快取
+每個 HTML/CSV 原始回應依 SHA-256 只保存一份 (data/raw/objects/<前兩碼>/<雜湊>)，
+並以 data/raw/index.jsonl 記錄 (資料集, 回應類型, 查詢日期區間) 對應的雜湊，
+解析規則修正後可直接從快取重新解析，不必再向期交所請求
+超過保留期限的紀錄與物件由 prune 清除 (見 taifex_compact.py)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from taifex_atomic import atomic_write
+from taifex_manifest import taipei_now
+
+logger = logging.getLogger('taifex_raw_cache')
+
+# 原始回應快取目錄
+RAW_DIR = 'data/raw'
+
+# 多個工作執行緒可能同時寫入快取
+_lock = threading.Lock()
+
+# 索引的記憶體副本，第一次使用時載入
+_index = None
+
+
+def _index_path():
+    return os.path.join(RAW_DIR, 'index.jsonl')
+
+
+def _object_path(sha256):
+    return os.path.join(RAW_DIR, 'objects', sha256[:2], sha256)
+
+
+def _index_key(dataset, kind, start_date, end_date):
+    return (dataset, kind, start_date, end_date)
+
+
+def _load_index():
+    """載入索引，同一查詢以最後一筆紀錄為準"""
+    global _index
+    if _index is None:
+        _index = {}
+        if os.path.exists(_index_path()):
+            with open(_index_path(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    key = _index_key(entry['dataset'], entry['kind'], entry['start'], entry['end'])
+                    _index[key] = entry
+    return _index
+
+
+def _record(dataset, kind, sha256, size, start_date, end_date):
+    """更新索引 (呼叫端需持有 _lock)，相同查詢的雜湊未變時不重複記錄"""
+    start = start_date.isoformat()
+    end = (end_date or start_date).isoformat()
+    index = _load_index()
+    key = _index_key(dataset, kind, start, end)
+    if key in index and index[key]['sha256'] == sha256:
+        logger.info(f'{dataset} {kind} {start} ~ {end} 原始回應與快取相同 ({sha256[:12]})')
+        return False
+
+    entry = {
+        'dataset': dataset,
+        'kind': kind,
+        'start': start,
+        'end': end,
+        'sha256': sha256,
+        'size': size,
+        'fetchedAt': taipei_now().isoformat(timespec='seconds')
+    }
+    with open(_index_path(), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    index[key] = entry
+    return True
+
+
+def store_raw(dataset, kind, content, start_date, end_date=None):
+    """
+    保存原始回應並更新索引
+
+    Args:
+        dataset: 資料集名稱 (pc_ratio / institutional)
+        kind: 回應類型 (html / csv)
+        content: 原始回應位元組
+        start_date: 查詢起始日期 (datetime.date)
+        end_date: 查詢結束日期 (datetime.date)，預設與起始日期相同
+
+    Returns:
+        str: 內容的 SHA-256 雜湊
+    """
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    with _lock:
+        object_path = _object_path(sha256)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = object_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, object_path)
+        if not _record(dataset, kind, sha256, len(content), start_date, end_date):
+            return sha256
+
+    logger.info(f'{dataset} {kind} {start_date} ~ {end_date or start_date} 原始回應已快取 ({sha256[:12]}, {len(content)} bytes)')
+    return sha256
+
+
+class RawWriter:
+    """
+    逐段保存串流下載的原始回應，不需把整個回應放在記憶體
+    內容先寫入暫存檔並同時計算 SHA-256，正常結束時才移入物件目錄並更新索引；
+    發生例外時捨棄暫存檔
+
+    用法:
+        with RawWriter('institutional', 'csv', start_date, end_date) as raw:
+            for chunk in chunks:
+                raw.write(chunk)
+        raw.sha256
+    """
+
+    def __init__(self, dataset, kind, start_date, end_date=None):
+        self.dataset = dataset
+        self.kind = kind
+        self.start_date = start_date
+        self.end_date = end_date
+        self.size = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._temp_path = None
+
+    def __enter__(self):
+        temp_dir = os.path.join(RAW_DIR, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        self._file = os.fdopen(fd, 'wb')
+        return self
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._temp_path)
+            return False
+
+        self.sha256 = self._hash.hexdigest()
+        with _lock:
+            object_path = _object_path(self.sha256)
+            if os.path.exists(object_path):
+                os.remove(self._temp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(self._temp_path, object_path)
+            recorded = _record(self.dataset, self.kind, self.sha256, self.size, self.start_date, self.end_date)
+        if recorded:
+            logger.info(
+                f'{self.dataset} {self.kind} {self.start_date} ~ {self.end_date or self.start_date} '
+                f'原始回應已快取 ({self.sha256[:12]}, {self.size} bytes)'
+            )
+        return False
+
+
+def load_raw(sha256):
+    """依雜湊讀取原始回應位元組"""
+    with open(_object_path(sha256), 'rb') as f:
+        return f.read()
+
+
+def cached_entries(dataset=None):
+    """
+    列出快取索引中每個查詢的最新紀錄，依抓取時間排序
+    """
+    with _lock:
+        entries = list(_load_index().values())
+    if dataset is not None:
+        entries = [entry for entry in entries if entry['dataset'] == dataset]
+    return sorted(entries, key=lambda entry: (entry['fetchedAt'], entry['start']))
+
+
+def prune(keep_days, dry_run=False):
+    """
+    套用保留期限並壓縮索引
+    index.jsonl 改寫為每個查詢只保留最新一筆，抓取時間超過 keep_days 天的查詢一併移除，
+    但每個 (資料集, 回應類型) 最新抓取的一筆不論新舊都保留，讓 --reparse 仍能重寫 *_latest.json；
+    不再被任何紀錄引用的物件與中斷下載遺留超過一天的暫存檔會被刪除
+
+    移除的只是原始回應，已寫入歷史資料集的資料列不受影響：--reparse 依自然鍵合併，
+    快取中沒有原始回應的日期 (超過保留期限或由舊版輸出合併而來) 維持原本的解析結果，
+    但解析規則修正後也無法再以新規則重新解析這些日期
+
+    Args:
+        keep_days: 保留天數
+        dry_run: 只統計不刪除
+
+    Returns:
+        dict: 處理前後的紀錄數、刪除的物件數與釋放的位元組數
+    """
+    cutoff = taipei_now() - timedelta(days=keep_days)
+
+    with _lock:
+        index = _load_index()
+        if os.path.exists(_index_path()):
+            with open(_index_path(), 'r', encoding='utf-8') as f:
+                lines_before = sum(1 for line in f if line.strip())
+        else:
+            lines_before = 0
+        newest = {}
+        for key, entry in index.items():
+            kind = (entry['dataset'], entry['kind'])
+            if kind not in newest or entry['fetchedAt'] > index[newest[kind]]['fetchedAt']:
+                newest[kind] = key
+        kept = {
+            key: entry for key, entry in index.items()
+            if datetime.fromisoformat(entry['fetchedAt']) >= cutoff or key in newest.values()
+        }
+        referenced = {entry['sha256'] for entry in kept.values()}
+
+        removed_objects = 0
+        freed_bytes = 0
+        objects_dir = os.path.join(RAW_DIR, 'objects')
+        for root, _, files in os.walk(objects_dir, topdown=False):
+            for name in files:
+                if name in referenced:
+                    continue
+                path = os.path.join(root, name)
+                removed_objects += 1
+                freed_bytes += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+            if not dry_run and root != objects_dir and not os.listdir(root):
+                os.rmdir(root)
+
+        temp_dir = os.path.join(RAW_DIR, 'tmp')
+        if os.path.isdir(temp_dir):
+            stale = time.time() - 86400
+            for name in os.listdir(temp_dir):
+                path = os.path.join(temp_dir, name)
+                if os.path.getmtime(path) < stale:
+                    freed_bytes += os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+
+        if not dry_run and lines_before:
+            entries = sorted(kept.values(), key=lambda entry: (entry['fetchedAt'], entry['start']))
+            atomic_write(_index_path(), ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+            index.clear()
+            index.update(kept)
+
+    logger.info(
+        f'原始回應快取保留 {keep_days} 天: 索引 {lines_before} → {len(kept)} 筆，'
+        f'刪除 {removed_objects} 個物件 ({freed_bytes} bytes)'
+    )
+    return {
+        'keepDays': keep_days,
+        'indexLinesBefore': lines_before,
+        'indexLinesAfter': len(kept),
+        'objectsRemoved': removed_objects,
+        'bytesFreed': freed_bytes
+    }
@@ -0,0 +1,157 @@
+"""
+爬蟲執行報告
+記錄每個資料集各階段 (fetch、decode、parse、normalize、serialize、write) 的耗時與計數器
+(下載位元組、解析筆數、寫入筆數、重試次數)，執行結束後輸出 data/run_report.json 供工作流程上傳
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from taifex_atomic import atomic_write_json
+from taifex_manifest import taipei_now
+
+logger = logging.getLogger('taifex_run_report')
+
+# 報告輸出路徑
+REPORT_FILE = 'data/run_report.json'
+
+# 固定的階段順序，方便比較不同次執行的報告
+STAGES = ['fetch', 'decode', 'parse', 'normalize', 'serialize', 'write']
+
+
+class RunReport:
+    """
+    單次執行的階段計時與計數器，可在多個工作執行緒中同時使用
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.started_at = taipei_now().isoformat(timespec='seconds')
+        self.datasets = {}
+
+    def _dataset(self, dataset):
+        if dataset not in self.datasets:
+            self.datasets[dataset] = {'stages': {}, 'counters': {}, 'info': {}}
+        return self.datasets[dataset]
+
+    @contextmanager
+    def stage(self, dataset, name):
+        """計時一個階段，同一階段多次執行時累加"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stages = self._dataset(dataset)['stages']
+                entry = stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+                entry['seconds'] += elapsed
+                entry['calls'] += 1
+
+    def count(self, dataset, name, value=1):
+        """累加計數器"""
+        with self._lock:
+            counters = self._dataset(dataset)['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    def set_info(self, dataset, key, value):
+        """記錄非數值資訊，例如勝出的抓取路徑"""
+        with self._lock:
+            self._dataset(dataset)['info'][key] = value
+
+    def merge(self, other):
+        """將另一份報告的階段耗時、計數器與資訊累加到本報告 (例如並行路徑中勝出者的報告)"""
+        with other._lock:
+            datasets = {
+                dataset: {
+                    'stages': {name: dict(stage) for name, stage in entry['stages'].items()},
+                    'counters': dict(entry['counters']),
+                    'info': dict(entry['info'])
+                }
+                for dataset, entry in other.datasets.items()
+            }
+        with self._lock:
+            for dataset, entry in datasets.items():
+                target = self._dataset(dataset)
+                for name, stage in entry['stages'].items():
+                    merged = target['stages'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+                    merged['seconds'] += stage['seconds']
+                    merged['calls'] += stage['calls']
+                for name, value in entry['counters'].items():
+                    target['counters'][name] = target['counters'].get(name, 0) + value
+                target['info'].update(entry['info'])
+
+    def to_dict(self):
+        with self._lock:
+            datasets = {}
+            for dataset, entry in self.datasets.items():
+                stages = {
+                    name: {
+                        'seconds': round(entry['stages'][name]['seconds'], 6),
+                        'calls': entry['stages'][name]['calls']
+                    }
+                    for name in STAGES + sorted(set(entry['stages']) - set(STAGES))
+                    if name in entry['stages']
+                }
+                datasets[dataset] = {
+                    'stages': stages,
+                    'counters': dict(entry['counters']),
+                    'info': dict(entry['info'])
+                }
+            return {
+                'startedAt': self.started_at,
+                'finishedAt': taipei_now().isoformat(timespec='seconds'),
+                'wallSeconds': round(time.perf_counter() - self._started, 6),
+                'datasets': datasets
+            }
+
+    def write(self, path=REPORT_FILE):
+        """輸出報告 JSON，回傳檔案路徑"""
+        report = self.to_dict()
+        atomic_write_json(path, report)
+        for dataset, entry in report['datasets'].items():
+            summary = ', '.join(f"{name} {stage['seconds'] * 1000:.0f}ms" for name, stage in entry['stages'].items())
+            logger.info(f'{dataset} 階段耗時: {summary}; 計數: {entry["counters"]}')
+        logger.info(f'執行報告已保存至 {path}')
+        return path
+
+
+# 模組層級共用的報告
+_report = None
+
+# 個別執行緒暫時使用的報告 (use_report)
+_local = threading.local()
+
+
+def get_report():
+    """取得目前執行緒使用的 RunReport，預設為本次執行共用的報告，第一次呼叫時建立"""
+    global _report
+    report = getattr(_local, 'report', None)
+    if report is not None:
+        return report
+    if _report is None:
+        _report = RunReport()
+    return _report
+
+
+@contextmanager
+def use_report(report):
+    """
+    在目前執行緒中暫時改用另一份報告，例如並行路徑各自計時，結束後只合併勝出者的報告
+    """
+    previous = getattr(_local, 'report', None)
+    _local.report = report
+    try:
+        yield report
+    finally:
+        _local.report = previous
+
+
+def reset_report():
+    """開始新的一份報告並回傳，供常駐程序在每次爬取前重設"""
+    global _report
+    _report = RunReport()
+    return _report
@@ -0,0 +1,139 @@
+"""
+依交易日曆排程的期交所爬蟲
+非交易日直接結束；交易日從期交所通常公布資料的時間開始輪詢，
+每次只爬取尚未更新的資料集，間隔逐步拉長，直到所有資料集都取得今日資料或超過截止時間
+
+用法:
+    python taifex_scheduler.py
+    python taifex_scheduler.py --publish-time 15:00 --deadline 18:00
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+
+import taifex_pc_ratio_crawler as pc_ratio
+import taifex_institutional_crawler as institutional
+from taifex_calendar import is_trading_day, load_holidays
+from taifex_manifest import TAIPEI_TZ, taipei_now
+from taifex_run_report import get_report
+
+logger = logging.getLogger('taifex_scheduler')
+
+# 期交所通常在下午 3 點後公布當日盤後資料
+PUBLISH_TIME = '15:00'
+DEADLINE = '18:00'
+
+# 輪詢間隔 (秒)：從 INITIAL_INTERVAL 開始，每次乘以 BACKOFF，最多 MAX_INTERVAL
+INITIAL_INTERVAL = 30
+MAX_INTERVAL = 300
+BACKOFF = 1.5
+
+DATASETS = {
+    'pc_ratio': pc_ratio,
+    'institutional': institutional
+}
+
+
+def _today_at(hhmm, now):
+    hour, minute = (int(part) for part in hhmm.split(':'))
+    return datetime.combine(now.date(), datetime.min.time(), TAIPEI_TZ).replace(hour=hour, minute=minute)
+
+
+def pending_datasets():
+    """尚未取得今日資料的資料集"""
+    return [name for name, module in DATASETS.items() if not module.is_data_fresh()]
+
+
+def crawl_pending():
+    """爬取所有尚未更新的資料集 (已是今日資料者由 crawl_all 略過)"""
+    import asyncio
+    from taifex_crawl_all import crawl_all
+
+    return asyncio.run(crawl_all())
+
+
+def poll_until_fresh(publish_at, deadline, initial_interval=INITIAL_INTERVAL, max_interval=MAX_INTERVAL,
+                     backoff=BACKOFF, sleep=time.sleep, now=taipei_now):
+    """
+    在 publish_at 與 deadline 之間輪詢，直到所有資料集都是今日資料
+
+    Returns:
+        bool: 是否在截止時間前取得所有資料集的今日資料
+    """
+    wait = (publish_at - now()).total_seconds()
+    if wait > 0:
+        logger.info(f'等待 {wait:.0f} 秒至公布時間 {publish_at:%H:%M}')
+        sleep(wait)
+
+    interval = initial_interval
+    attempt = 0
+    while True:
+        pending = pending_datasets()
+        if not pending:
+            return True
+
+        attempt += 1
+        get_report().count('scheduler', 'polls')
+        logger.info(f'第 {attempt} 次輪詢，尚未更新: {", ".join(pending)}')
+        crawl_pending()
+        pending = pending_datasets()
+        if not pending:
+            return True
+
+        remaining = (deadline - now()).total_seconds()
+        if remaining <= 0:
+            logger.error(f'超過截止時間 {deadline:%H:%M}，仍未取得今日資料: {", ".join(pending)}')
+            return False
+        delay = min(interval, remaining)
+        logger.info(f'期交所尚未公布今日資料，{delay:.0f} 秒後重試')
+        sleep(delay)
+        interval = min(interval * backoff, max_interval)
+
+
+def _set_output(name, value):
+    """在 GitHub Actions 中設定步驟輸出"""
+    output_file = os.environ.get('GITHUB_OUTPUT')
+    if output_file:
+        with open(output_file, 'a', encoding='utf-8') as f:
+            f.write(f'{name}={value}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='依交易日曆排程的期交所爬蟲')
+    parser.add_argument('--publish-time', default=PUBLISH_TIME, help='開始輪詢的時間 (台北時間 HH:MM)')
+    parser.add_argument('--deadline', default=DEADLINE, help='停止輪詢的時間 (台北時間 HH:MM)')
+    parser.add_argument('--interval', type=float, default=INITIAL_INTERVAL, help='第一次重試前等待的秒數')
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help='重試間隔上限 (秒)')
+    parser.add_argument('--refresh-calendar', action='store_true', help='忽略快取，重新下載休市日期表')
+    args = parser.parse_args(argv)
+
+    now = taipei_now()
+    holidays = load_holidays(refresh=args.refresh_calendar)
+    if not is_trading_day(now.date(), holidays):
+        reason = holidays.get(now.date().isoformat(), '週末')
+        logger.info(f'今日 {now.date()} 非交易日 ({reason})，不執行爬蟲')
+        _set_output('trading_day', 'false')
+        return 0
+    _set_output('trading_day', 'true')
+
+    fresh = poll_until_fresh(
+        _today_at(args.publish_time, now),
+        _today_at(args.deadline, now),
+        initial_interval=args.interval,
+        max_interval=args.max_interval
+    )
+
+    if fresh:
+        logger.info('所有資料集皆已取得今日資料')
+    get_report().write()
+    for name, module in DATASETS.items():
+        if module.is_data_fresh():
+            print(f'RESULT_FILE={module.LATEST_FILE}')  # 輸出結果檔案路徑供 GitHub Actions 使用
+    return 0 if fresh else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,302 @@
+"""
+期交所合成資料產生器
+依任意日期區間與契約數量，產生與 pcRatioExcel、futContractsDateExcel 頁面相同版型的 HTML，
+以及 futContractsDateDown 的 Big5 CSV，表頭與爬蟲的 columns_mapping 一致，
+供解析器、歷史資料集與查詢路徑在遠超過正式資料量的規模下做壓力測試
+
+數值以 (契約, 身份別) 為單位做隨機漫步：未平倉口數逐日延續，契約金額依價格與每點價值換算，
+同一組參數與種子每次產生相同內容；大型輸出以區塊逐段寫入，不需把整份內容放在記憶體
+
+用法:
+    python taifex_synthetic.py --from 2005-01-01 --to 2024-12-31 --contracts 40 --out data/synthetic
+    python taifex_synthetic.py --from 2024-01-01 --to 2024-12-31 --split month --kind institutional_csv
+"""
+
+import argparse
+import logging
+import os
+import random
+from datetime import date, timedelta
+
+from taifex_institutional_crawler import columns_mapping
+
+logger = logging.getLogger('taifex_synthetic')
+
+PC_RATIO_COLUMNS = [
+    '日期', '賣權成交量', '買權成交量', '買賣權成交量比率%',
+    '賣權未平倉量', '買權未平倉量', '買賣權未平倉量比率%'
+]
+
+# 三大法人表格的數值欄位，順序與期交所頁面相同
+INSTITUTIONAL_VALUE_COLUMNS = [name for name in columns_mapping if name not in ('日期', '身份別', '契約')]
+
+INSTITUTIONAL_HTML_COLUMNS = ['日期', '契約', '身份別'] + INSTITUTIONAL_VALUE_COLUMNS
+INSTITUTIONAL_CSV_COLUMNS = ['日期', '商品名稱', '身份別'] + INSTITUTIONAL_VALUE_COLUMNS
+
+# 期交所實際的期貨契約: (頁面契約名稱, CSV 商品名稱, 起始價格, 每點價值(元))
+KNOWN_CONTRACTS = [
+    ('臺股期貨', '臺股期貨', 17000, 200),
+    ('電子期貨', '電子期貨', 900, 4000),
+    ('金融期貨', '金融期貨', 1800, 1000),
+    ('小型臺指期貨', '小型臺指', 17000, 50),
+    ('臺灣50期貨', '臺灣50期貨', 14000, 100),
+    ('櫃買期貨', '櫃買期貨', 250, 4000),
+    ('非金電期貨', '非金電期貨', 11000, 100),
+    ('小型電子期貨', '小型電子期貨', 900, 500),
+    ('小型金融期貨', '小型金融期貨', 1800, 250),
+    ('美國道瓊期貨', '美國道瓊期貨', 38000, 20),
+    ('美國標普500期貨', '美國標普500期貨', 5000, 200),
+    ('美國那斯達克100期貨', '美國那斯達克100期貨', 17000, 50)
+]
+
+INVESTOR_TYPES = ['自營商', '投信', '外資及陸資']
+
+# 每個區塊包含的交易日數，控制逐段寫入時的記憶體用量
+CHUNK_DAYS = 20
+
+# 可產生的輸出: 名稱對應 (端點檔名, 副檔名)
+KINDS = {
+    'pc_ratio_html': ('pcRatioExcel', 'html'),
+    'institutional_html': ('futContractsDateExcel', 'html'),
+    'institutional_csv': ('futContractsDateDown', 'csv')
+}
+
+
+def contracts(count):
+    """
+    前 len(KNOWN_CONTRACTS) 個使用期交所實際契約名稱，其餘以「合成期貨NNN」補足
+    """
+    result = list(KNOWN_CONTRACTS[:count])
+    for n in range(len(result), count):
+        name = f'合成期貨{n + 1:03d}'
+        result.append((name, name, 100 + n * 10, 1000))
+    return result
+
+
+def weekdays(start_date, end_date):
+    """區間內的平日 (合成資料不處理國定假日)"""
+    days = []
+    current = start_date
+    while current <= end_date:
+        if current.weekday() < 5:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def _roc(day):
+    return f'{day.year - 1911}/{day.month:02d}/{day.day:02d}'
+
+
+def pc_ratio_rows(days, seed=0):
+    """
+    產生 PC Ratio 資料列 (字串)，依期交所頁面由新到舊排列
+    未平倉量以隨機漫步逐日延續
+    """
+    rng = random.Random(f'pc_ratio|{seed}')
+    put_oi, call_oi = 150_000, 150_000
+    rows = []
+    for day in days:
+        put_volume = rng.randint(150_000, 700_000)
+        call_volume = rng.randint(150_000, 700_000)
+        put_oi = max(put_oi + rng.randint(-15_000, 15_000), 20_000)
+        call_oi = max(call_oi + rng.randint(-15_000, 15_000), 20_000)
+        rows.append([
+            day.strftime('%Y/%m/%d'),
+            f'{put_volume:,}', f'{call_volume:,}', f'{put_volume / call_volume * 100:.2f}',
+            f'{put_oi:,}', f'{call_oi:,}', f'{put_oi / call_oi * 100:.2f}'
+        ])
+    rows.reverse()
+    return rows
+
+
+class InstitutionalWalk:
+    """
+    三大法人各契約、各身份別的隨機漫步狀態
+    依序呼叫 rows(day) 即可逐日產生資料，區塊之間狀態延續
+    """
+
+    def __init__(self, contract_count=3, seed=0):
+        self.contracts = contracts(contract_count)
+        self._rng = random.Random(f'institutional|{contract_count}|{seed}')
+        self._prices = {name: float(price) for name, _, price, _ in self.contracts}
+        self._oi = {
+            (name, investor): [self._rng.randint(1_000, 40_000), self._rng.randint(1_000, 40_000)]
+            for name, _, _, _ in self.contracts
+            for investor in INVESTOR_TYPES
+        }
+
+    def rows(self, day):
+        """
+        產生單日資料列
+
+        Returns:
+            list: (日期, 頁面契約名稱, CSV 商品名稱, 身份別, 12 個整數) 的列表
+        """
+        rng = self._rng
+        result = []
+        for name, csv_name, _, point_value in self.contracts:
+            price = self._prices[name] = max(self._prices[name] * (1 + rng.gauss(0, 0.012)), 1.0)
+            unit = price * point_value / 1000
+            for investor in INVESTOR_TYPES:
+                oi = self._oi[(name, investor)]
+                long_trade = rng.randint(100, 60_000)
+                short_trade = rng.randint(100, 60_000)
+                oi[0] = max(oi[0] + rng.randint(-2_000, 2_000), 0)
+                oi[1] = max(oi[1] + rng.randint(-2_000, 2_000), 0)
+                long_value, short_value = round(long_trade * unit), round(short_trade * unit)
+                long_oi_value, short_oi_value = round(oi[0] * unit), round(oi[1] * unit)
+                result.append((day, name, csv_name, investor, [
+                    long_trade, long_value, short_trade, short_value,
+                    long_trade - short_trade, long_value - short_value,
+                    oi[0], long_oi_value, oi[1], short_oi_value,
+                    oi[0] - oi[1], long_oi_value - short_oi_value
+                ]))
+        return result
+
+
+def _chunks(days):
+    for start in range(0, len(days), CHUNK_DAYS):
+        yield days[start:start + CHUNK_DAYS]
+
+
+_PAGE_HEAD = (
+    '<html><head><meta charset="utf-8"></head><body>'
+    '<table class="layout"><tr><td><table><tr><td>選單</td></tr></table></td></tr>'
+    '<tr><td><table class="table_f">'
+)
+_PAGE_TAIL = '</table></td></tr></table></body></html>'
+
+
+def _header_row(columns):
+    return '<tr>' + ''.join(f'<th>{name}</th>' for name in columns) + '</tr>'
+
+
+def iter_pc_ratio_html(days, seed=0):
+    """逐段產生 pcRatioExcel 版型的 HTML (bytes)"""
+    yield (_PAGE_HEAD + _header_row(PC_RATIO_COLUMNS)).encode('utf-8')
+    rows = pc_ratio_rows(days, seed)
+    for start in range(0, len(rows), CHUNK_DAYS):
+        yield ''.join(
+            '<tr>' + ''.join(f'<td>{cell}</td>' for cell in row) + '</tr>'
+            for row in rows[start:start + CHUNK_DAYS]
+        ).encode('utf-8')
+    yield _PAGE_TAIL.encode('utf-8')
+
+
+def iter_institutional_html(days, contract_count=3, seed=0):
+    """逐段產生 futContractsDateExcel 版型的 HTML (bytes)，契約欄以 rowspan 合併各身份別"""
+    walk = InstitutionalWalk(contract_count, seed)
+    yield (_PAGE_HEAD + _header_row(INSTITUTIONAL_HTML_COLUMNS)).encode('utf-8')
+    for chunk in _chunks(days):
+        parts = []
+        for day in chunk:
+            for _, name, _, investor, values in walk.rows(day):
+                parts.append(f'<tr><td>{_roc(day)}</td>')
+                if investor == INVESTOR_TYPES[0]:
+                    parts.append(f'<td rowspan="{len(INVESTOR_TYPES)}">{name}</td>')
+                parts.append(f'<td>{investor}</td>')
+                parts.append(''.join(f'<td>{value:,}</td>' for value in values))
+                parts.append('</tr>')
+        yield ''.join(parts).encode('utf-8')
+    yield _PAGE_TAIL.encode('utf-8')
+
+
+def iter_institutional_csv(days, contract_count=3, seed=0):
+    """逐段產生 futContractsDateDown 的 Big5 CSV (bytes)"""
+    walk = InstitutionalWalk(contract_count, seed)
+    yield (','.join(INSTITUTIONAL_CSV_COLUMNS) + '\r\n').encode('big5')
+    for chunk in _chunks(days):
+        lines = []
+        for day in chunk:
+            for _, _, csv_name, investor, values in walk.rows(day):
+                lines.append(','.join([day.strftime('%Y/%m/%d'), csv_name, investor] + [str(value) for value in values]))
+        yield ('\r\n'.join(lines) + '\r\n').encode('big5')
+
+
+def iter_kind(kind, days, contract_count=3, seed=0):
+    """依輸出類型 (KINDS 的鍵) 逐段產生內容"""
+    if kind == 'pc_ratio_html':
+        return iter_pc_ratio_html(days, seed)
+    if kind == 'institutional_html':
+        return iter_institutional_html(days, contract_count, seed)
+    if kind == 'institutional_csv':
+        return iter_institutional_csv(days, contract_count, seed)
+    raise ValueError(f'未知的輸出類型: {kind}')
+
+
+def render(kind, days, contract_count=3, seed=0):
+    """一次產生完整內容 (bytes)"""
+    return b''.join(iter_kind(kind, days, contract_count, seed))
+
+
+def _periods(start_date, end_date, split):
+    """依 split (none/year/month) 切分日期區間"""
+    if split == 'none':
+        return [(start_date, end_date)]
+    periods = []
+    current = start_date
+    while current <= end_date:
+        if split == 'year':
+            boundary = date(current.year, 12, 31)
+        else:
+            boundary = date(current.year + current.month // 12, current.month % 12 + 1, 1) - timedelta(days=1)
+        periods.append((current, min(boundary, end_date)))
+        current = min(boundary, end_date) + timedelta(days=1)
+    return periods
+
+
+def write_files(out_dir, start_date, end_date, kinds=tuple(KINDS), contract_count=3, split='none', seed=0):
+    """
+    產生並寫入檔案，檔名為 <端點>_<起始日>_<結束日>.<副檔名>
+
+    Returns:
+        list: (檔案路徑, 位元組數) 的列表
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for kind in kinds:
+        endpoint, extension = KINDS[kind]
+        for period_start, period_end in _periods(start_date, end_date, split):
+            path = os.path.join(out_dir, f'{endpoint}_{period_start:%Y%m%d}_{period_end:%Y%m%d}.{extension}')
+            size = 0
+            with open(path, 'wb') as f:
+                for chunk in iter_kind(kind, weekdays(period_start, period_end), contract_count, seed):
+                    f.write(chunk)
+                    size += len(chunk)
+            written.append((path, size))
+            logger.info(f'已產生 {path} ({size:,} bytes)')
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='期交所合成資料產生器')
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, required=True, help='起始日期 (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, required=True, help='結束日期 (YYYY-MM-DD)')
+    parser.add_argument('--contracts', type=int, default=len(KNOWN_CONTRACTS), help='三大法人資料的契約數量')
+    parser.add_argument('--kind', action='append', choices=list(KINDS), help='要產生的輸出 (可重複指定，預設全部)')
+    parser.add_argument('--split', choices=['none', 'year', 'month'], default='none', help='依年或月分成多個檔案')
+    parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+    parser.add_argument('--out', default='data/synthetic', help='輸出目錄')
+    args = parser.parse_args(argv)
+
+    written = write_files(
+        args.out, args.start, args.end,
+        kinds=args.kind or list(KINDS),
+        contract_count=args.contracts,
+        split=args.split,
+        seed=args.seed
+    )
+    days = len(weekdays(args.start, args.end))
+    total = sum(size for _, size in written)
+    print(f'交易日 {days} 天，契約 {args.contracts} 種，三大法人 {days * args.contracts * len(INVESTOR_TYPES):,} 筆')
+    print(f'共產生 {len(written)} 個檔案，{total / 1024 / 1024:.1f} MiB')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    exit(main())
@@ -0,0 +1,175 @@
+"""
+期交所表格擷取器
+針對 futContractsDateExcel 與 pcRatioExcel 頁面，以預先編譯的 XPath 直接定位資料表，
+並逐欄建立具型別的陣列；頁面版型與預期不符時才退回 pd.read_html
+"""
+
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from taifex_normalize import to_int, to_number
+
+logger = logging.getLogger('taifex_table_extractor')
+
+# 各頁面的版型定義
+# anchor: 用來定位資料表的表頭文字；columns: 預期的表頭 (版型指紋)；
+# int_columns/float_columns: 需轉為數值的欄位，其餘欄位保留為字串
+PC_RATIO_LAYOUT = {
+    'name': 'pcRatioExcel',
+    'anchor': '日期',
+    'columns': [
+        '日期', '賣權成交量', '買權成交量', '買賣權成交量比率%',
+        '賣權未平倉量', '買權未平倉量', '買賣權未平倉量比率%'
+    ],
+    'int_columns': ['賣權成交量', '買權成交量', '賣權未平倉量', '買權未平倉量'],
+    'float_columns': ['買賣權成交量比率%', '買賣權未平倉量比率%']
+}
+
+INSTITUTIONAL_LAYOUT = {
+    'name': 'futContractsDateExcel',
+    'anchor': '身份別',
+    'columns': [
+        '日期', '契約', '身份別',
+        '多方交易口數', '多方交易契約金額(千元)', '空方交易口數', '空方交易契約金額(千元)',
+        '多空交易口數淨額', '多空交易契約金額淨額(千元)',
+        '多方未平倉口數', '多方未平倉契約金額(千元)', '空方未平倉口數', '空方未平倉契約金額(千元)',
+        '多空未平倉口數淨額', '多空未平倉契約金額淨額(千元)'
+    ],
+    'int_columns': [
+        '多方交易口數', '多方交易契約金額(千元)', '空方交易口數', '空方交易契約金額(千元)',
+        '多空交易口數淨額', '多空交易契約金額淨額(千元)',
+        '多方未平倉口數', '多方未平倉契約金額(千元)', '空方未平倉口數', '空方未平倉契約金額(千元)',
+        '多空未平倉口數淨額', '多空未平倉契約金額淨額(千元)'
+    ],
+    'float_columns': []
+}
+
+# 預先編譯的 XPath
+# 最內層 (不含子表格) 且包含錨點表頭的表格
+_FIND_TABLE = etree.XPath('//table[not(.//table)][.//*[self::th or self::td][normalize-space(.)=$anchor]]')
+_ROWS = etree.XPath('./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr')
+_CELLS = etree.XPath('./th | ./td')
+_TEXT = etree.XPath('normalize-space(.)')
+_HAS_ROWSPAN = etree.XPath('boolean(./*[@rowspan > 1])')
+
+_HTML_PARSER = etree.HTMLParser(encoding='utf-8', remove_comments=True)
+
+
+def _build_frame(header, values_by_column, layout):
+    """依欄位建立具型別的 DataFrame，數值欄位以整欄運算轉換"""
+    columns = {}
+    for name, values in zip(header, values_by_column):
+        if name in layout['int_columns']:
+            columns[name] = to_int(pd.Series(values, dtype=object)).array
+        elif name in layout['float_columns']:
+            columns[name] = to_number(pd.Series(values, dtype=object)).to_numpy()
+        else:
+            columns[name] = np.array(values, dtype=object)
+    return pd.DataFrame(columns, columns=header)
+
+
+def _rowspan(cell):
+    try:
+        return max(int(cell.get('rowspan', 1)), 1)
+    except ValueError:
+        return 1
+
+
+def _expand_rowspans(cells, texts, carried):
+    """
+    將前幾列 rowspan 延伸下來的儲存格補回本列 (例如多個身份別共用一格契約名稱)
+
+    Args:
+        cells: 本列的儲存格元素
+        texts: 本列儲存格文字
+        carried: {欄位位置: [文字, 剩餘列數]}，會就地更新
+    """
+    row = []
+    pending = list(zip(cells, texts))
+    column = 0
+    while pending or any(position >= column for position in carried):
+        if column in carried:
+            text, remaining = carried[column]
+            row.append(text)
+            if remaining <= 1:
+                del carried[column]
+            else:
+                carried[column][1] = remaining - 1
+        elif pending:
+            cell, text = pending.pop(0)
+            row.append(text)
+            span = _rowspan(cell)
+            if span > 1:
+                carried[column] = [text, span - 1]
+        else:
+            break
+        column += 1
+    return row
+
+
+def _extract_with_xpath(content, layout):
+    """
+    以 XPath 擷取資料表；版型指紋不符時回傳 None
+    """
+    root = etree.fromstring(content, _HTML_PARSER)
+    if root is None:
+        return None
+
+    tables = _FIND_TABLE(root, anchor=layout['anchor'])
+    if not tables:
+        return None
+
+    header = None
+    values_by_column = None
+    carried = {}
+    for row in _ROWS(tables[0]):
+        elements = _CELLS(row)
+        cells = [_TEXT(cell) for cell in elements]
+        if header is None:
+            if layout['anchor'] in cells:
+                header = cells
+                # 版型指紋：表頭必須包含所有預期欄位
+                if not set(layout['columns']).issubset(header):
+                    return None
+                values_by_column = [[] for _ in header]
+            continue
+        if carried or _HAS_ROWSPAN(row):
+            cells = _expand_rowspans(elements, cells, carried)
+        # 只保留欄位數與表頭相同的資料列 (略過合計列與空白列)，直接依欄位累積
+        if len(cells) == len(header):
+            for values, cell in zip(values_by_column, cells):
+                values.append(cell)
+
+    if header is None:
+        return None
+    return _build_frame(header, values_by_column, layout)
+
+
+def extract_table(content, layout):
+    """
+    從期交所頁面擷取資料表
+
+    Args:
+        content: 原始 HTML 位元組
+        layout: PC_RATIO_LAYOUT 或 INSTITUTIONAL_LAYOUT
+
+    Returns:
+        pandas.DataFrame: 資料表；頁面沒有任何表格時回傳 None
+    """
+    df = _extract_with_xpath(content, layout)
+    if df is not None:
+        logger.info(f"{layout['name']} 以 XPath 擷取表格，共 {len(df)} 筆資料")
+        return df
+
+    # 版型不符時退回 pd.read_html，取第一個表格
+    logger.warning(f"{layout['name']} 頁面版型與預期不符，改用 pd.read_html 解析")
+    try:
+        tables = pd.read_html(io.BytesIO(content), encoding='utf-8', flavor='lxml')
+    except (ValueError, etree.XMLSyntaxError):
+        # 頁面沒有任何表格或內容為空
+        return None
+    return tables[0] if len(tables) > 0 else None